@@ -7,11 +7,36 @@ import pandas as pd
 import psycopg2
 import psycopg2.extras
 import sys
+import io
 import warnings
 import time
 import socket
+from psycopg2 import sql
 from app.utils.mlflow_wrapper import mlflow_tracker
+from app.utils.series_matrix import SeriesMatrix
+from app.utils.series_characteristics import characterize_series_matrix
+from app.utils.shared_series import SharedSeriesStore, attach_worker_store, worker_series
+from app.utils.global_xgboost import fit_global_xgboost
+from app.utils.arima_order_cache import load_arima_orders, save_arima_orders
+from app.utils.holt_winters_vectorized import VectorizedHoltWinters, fit_batch_holt_winters
+from app.utils.forecast_writer import ForecastWriter
+from app.utils.run_state import load_completed_series, mark_series_completed
+from app.utils.run_ledger import create_series_ledger_table, load_series_ledger, save_series_ledger, select_series_to_refresh, series_fingerprint
+from app.utils.product_classification import classify_items, resolve_classifications
+from app.utils.model_win_rates import load_win_rates, prune_models, record_model_outcomes
+from app.utils.work_scheduler import (
+    estimate_costs, load_series_costs, pack_batches_lpt, save_series_costs, simulate_makespan
+)
+from app.utils.run_metrics import (
+    create_run_metrics_table, log_metrics_artifact, save_run_metrics, series_metric_rows
+)
+from app.utils.time_budget import TimeBudget
+from app.utils.batch_runner import BatchTimeoutError, run_batches
+from app.utils.intermittent_demand import (
+    fit_batch_intermittent, intermittent_forecast_matrix, triage_series_matrix, zero_forecasts
+)
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from itertools import islice
 from scipy import stats
@@ -46,6 +71,76 @@ FORECAST_TASK_RUNNING = False
 # Variável de versão para rastrear qual script criou o forecast
 MODEL_VERSION = "20251009_V1"
 
+# Busca stepwise do ARIMA: limites de p/q, máximo de ajustes por busca e
+# piora tolerada de AIC por observação (0.2 ~ desvio do resíduo 10% maior) antes de
+# refazer a busca a partir da ordem em cache
+ARIMA_MAX_P = 2
+ARIMA_MAX_Q = 2
+ARIMA_MAX_FITS = 12
+ARIMA_REFIT_TOLERANCE = 0.2
+
+# Modo de execução do ajuste dos modelos: 'thread' (padrão) ou 'process'
+FORECAST_EXECUTION_MODE = os.getenv('FORECAST_EXECUTION_MODE', 'thread')
+# Workers do modo 'process' (0 = núcleos disponíveis - 1)
+FORECAST_PROCESS_WORKERS = int(os.getenv('FORECAST_PROCESS_WORKERS', '0'))
+# Batches por worker antes de reciclá-lo (limita o crescimento de memória do Prophet/Stan)
+FORECAST_MAX_TASKS_PER_CHILD = int(os.getenv('FORECAST_MAX_TASKS_PER_CHILD', '50'))
+# XGBoost: 'local' (um booster por série) ou 'global' (um booster por execução/segmento)
+FORECAST_XGBOOST_MODE = os.getenv('FORECAST_XGBOOST_MODE', 'local')
+# Segmentação do XGBoost global: '' (execução inteira), 'store' ou 'category'
+FORECAST_XGBOOST_SEGMENT = os.getenv('FORECAST_XGBOOST_SEGMENT', '')
+# Holt-Winters: 'statsmodels' (um ajuste por série) ou 'numpy' (vetorizado, todas as séries de uma vez)
+FORECAST_HW_ENGINE = os.getenv('FORECAST_HW_ENGINE', 'statsmodels')
+# Execução incremental (opt-in): só reajusta séries cujas vendas mudaram desde a última execução.
+# O ledger é gravado mesmo desligado, então a primeira execução com FORECAST_INCREMENTAL=True já compara
+FORECAST_INCREMENTAL = os.getenv('FORECAST_INCREMENTAL', 'False') == 'True'
+# Séries inalteradas há mais de N dias são reajustadas mesmo assim (previsão envelhece)
+FORECAST_STALE_DAYS = int(os.getenv('FORECAST_STALE_DAYS', '7'))
+# Ajuste único por modelo: a previsão final reaproveita o ajuste do backtest
+# (atualização de estado no ARIMA/Holt-Winters, boosting continuado no XGBoost, warm start no Prophet)
+FORECAST_SINGLE_FIT = os.getenv('FORECAST_SINGLE_FIT', 'False') == 'True'
+# Rodadas extras de boosting ao atualizar o XGBoost com a janela de teste
+XGBOOST_UPDATE_ROUNDS = 20
+# Gravação contínua: batches concluídos aguardando gravação (fila limitada) e linhas por gravação
+FORECAST_WRITER_QUEUE_SIZE = int(os.getenv('FORECAST_WRITER_QUEUE_SIZE', '8'))
+FORECAST_WRITER_FLUSH_ROWS = int(os.getenv('FORECAST_WRITER_FLUSH_ROWS', '20000'))
+# Poda por segmento: pula modelos com taxa de vitória abaixo do limite no segmento
+# (sazonalidade, preço, loja), após um mínimo de avaliações; uma fração das séries
+# roda a seleção completa (exploração) para manter o histórico atualizado
+FORECAST_MODEL_PRUNING = os.getenv('FORECAST_MODEL_PRUNING', 'False') == 'True'
+FORECAST_PRUNING_MIN_WIN_RATE = float(os.getenv('FORECAST_PRUNING_MIN_WIN_RATE', '0.1'))
+FORECAST_PRUNING_MIN_SAMPLES = int(os.getenv('FORECAST_PRUNING_MIN_SAMPLES', '30'))
+FORECAST_PRUNING_EXPLORE_RATE = float(os.getenv('FORECAST_PRUNING_EXPLORE_RATE', '0.1'))
+# Triagem antes da seleção de modelos: séries paradas (sem venda nos últimos N dias)
+# recebem previsão zero e séries esparsas (proporção de zeros acima do limite ou média
+# diária abaixo do mínimo) vão para Croston/SBA/TSB/média móvel em lote
+FORECAST_TRIAGE = os.getenv('FORECAST_TRIAGE', 'False') == 'True'
+FORECAST_TRIAGE_ZERO_DAYS = int(os.getenv('FORECAST_TRIAGE_ZERO_DAYS', '56'))
+FORECAST_TRIAGE_SPARSE_RATIO = float(os.getenv('FORECAST_TRIAGE_SPARSE_RATIO', '0.7'))
+FORECAST_TRIAGE_MIN_DAILY_MEAN = float(os.getenv('FORECAST_TRIAGE_MIN_DAILY_MEAN', '0.2'))
+# Montagem dos batches: 'fixed' (padrão, 20 em ordem de item) ou 'lpt' (custo histórico por série,
+# mais caros primeiro). O custo é gravado em toda execução, então 'lpt' já parte com histórico
+FORECAST_SCHEDULING = os.getenv('FORECAST_SCHEDULING', 'fixed')
+# Métricas por série/modelo: além de forecast_run_metrics, anexa Parquet ao run do MLflow
+FORECAST_METRICS_PARQUET = os.getenv('FORECAST_METRICS_PARQUET', 'False') == 'True'
+# Orçamentos de tempo em segundos (0 = sem limite, padrão): por série (todos os modelos) e por
+# modelo (backtest + previsão final). ARIMA e XGBoost param entre etapas ao estourar; Prophet e
+# Holt-Winters não são interrompidos no meio de um ajuste, mas quem estoura no backtest não
+# faz o ajuste final. A série passa ao próximo modelo ou, sem nenhuma previsão, à média móvel
+FORECAST_SERIES_TIME_BUDGET = float(os.getenv('FORECAST_SERIES_TIME_BUDGET', '0'))
+FORECAST_MODEL_TIME_BUDGET = float(os.getenv('FORECAST_MODEL_TIME_BUDGET', '0'))
+# Prazo rígido por série no modo 'process' (0 = sem prazo; padrão: 2x o orçamento da série).
+# Um batch que passa de séries x prazo (+ partida do worker) tem o pool terminado e é refeito
+# série a série; a série que estoura sozinha é descartada (app/utils/batch_runner.py)
+FORECAST_SERIES_HARD_LIMIT = float(os.getenv('FORECAST_SERIES_HARD_LIMIT', str(2 * FORECAST_SERIES_TIME_BUDGET)))
+FORECAST_WORKER_START_SECONDS = 30
+# Teto de iterações do otimizador (0 = padrão da biblioteca): limita um ajuste que não converge,
+# inclusive no modo 'thread', onde o prazo rígido não se aplica
+FORECAST_PROPHET_MAX_ITER = int(os.getenv('FORECAST_PROPHET_MAX_ITER', '0'))
+FORECAST_HW_MAX_ITER = int(os.getenv('FORECAST_HW_MAX_ITER', '0'))
+# Baseline das séries sem previsão após estourar o orçamento
+FORECAST_BUDGET_FALLBACK_MODEL = 'Moving-Average'
+
 # Tentar importar Prophet
 try:
     from prophet import Prophet
@@ -116,85 +211,280 @@ def load_data(pg_conn_str, store_ids=None):
     
     print(f"   ✅ {len(sales)} registros carregados")
     print(f"   ✅ Lojas únicas: {sorted(data['store_id'].unique().tolist())}")
-    
+
     return data
 
-def save_forecasts_to_db(df, pg_conn_str):
+# Linhas buscadas por ida ao servidor no cursor server-side de load_active_series
+SERIES_FETCH_SIZE = 50000
+
+SERIES_COLUMNS = [
+    'date', 'store_id', 'item_id', 'category', 'brand',
+    'quantity', 'unit_price', 'is_holiday', 'holiday_name'
+]
+
+def load_active_series(pg_conn_str, active_items, load_timings=None):
     """
-    Salva forecasts usando BULK INSERT (100x mais rápido)
+    Carrega o histórico de TODAS as séries ativas com uma única query
+    (streamed via cursor server-side) por loja e particiona em memória.
+
+    Substitui a query por (item_id, store_id) que era feita dentro de
+    process_items_batch_safe: O(lojas) queries em vez de O(pares).
+
+    Args:
+        pg_conn_str: String de conexão PostgreSQL
+        active_items: Lista de tuplas (item_id, store_id)
+        load_timings: dict opcional preenchido com {(item_id, store_id): segundos} -
+                      tempo da query da loja rateado pelos registros de cada série
+
+    Returns:
+        dict {(item_id, store_id): dict de arrays numpy por coluna}
+    """
+    items_by_store = {}
+    for item_id, store_id in active_items:
+        items_by_store.setdefault(int(store_id), []).append(int(item_id))
+
+    series_data = {}
+    conn = psycopg2.connect(pg_conn_str)
+
+    try:
+        for store_id, item_ids in sorted(items_by_store.items()):
+            store_start = time.time()
+
+            # Cursor nomeado = server-side, o resultado chega em blocos
+            cur = conn.cursor(name=f"series_store_{store_id}")
+            cur.itersize = SERIES_FETCH_SIZE
+            cur.execute("""
+                SELECT s.date, s.store_id, s.item_id, i.nivel3 as category, i.brand,
+                       SUM(s.quantity)::float8 AS quantity,
+                       ROUND(SUM(s.quantity * s.price) / NULLIF(SUM(s.quantity), 0), 0)::float8 AS unit_price,
+                       c.is_holiday, c.holiday_name
+                FROM public.sales_sale AS s
+                JOIN public.items_item AS i ON s.item_id = i.code::int
+                LEFT JOIN public.sales_calendar c ON s.date = c.date
+                WHERE s.store_id = %s
+                  AND s.item_id = ANY(%s)
+                  AND i.is_disabled_purchase = false
+                GROUP BY s.date, s.store_id, s.item_id, i.nivel3, i.brand, c.is_holiday, c.holiday_name
+                ORDER BY s.item_id, s.date
+            """, (store_id, item_ids))
+
+            # Cada bloco vira DataFrame na hora: só um bloco de tuplas Python vive por vez
+            frames = []
+            while True:
+                chunk = cur.fetchmany(SERIES_FETCH_SIZE)
+                if not chunk:
+                    break
+                frames.append(pd.DataFrame.from_records(chunk, columns=SERIES_COLUMNS))
+            cur.close()
+
+            if not frames:
+                continue
+
+            store_df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            del frames
+
+            columns = {
+                'date': pd.to_datetime(store_df['date']).to_numpy(),
+                'item_id': store_df['item_id'].to_numpy(),
+                'category': store_df['category'].to_numpy(),
+                'brand': store_df['brand'].to_numpy(),
+                'quantity': store_df['quantity'].to_numpy(dtype=np.float64, na_value=np.nan),
+                'unit_price': store_df['unit_price'].to_numpy(dtype=np.float64, na_value=np.nan),
+                'is_holiday': store_df['is_holiday'].fillna(False).to_numpy(dtype=bool),
+                'holiday_name': store_df['holiday_name'].to_numpy(),
+            }
+
+            # Resultado ordenado por item_id: fronteiras onde o item muda
+            item_col = columns['item_id']
+            bounds = np.flatnonzero(item_col[1:] != item_col[:-1]) + 1
+            starts = np.concatenate(([0], bounds))
+            ends = np.concatenate((bounds, [len(item_col)]))
+
+            for start, end in zip(starts, ends):
+                key = (int(item_col[start]), store_id)
+                series_data[key] = {
+                    'date': columns['date'][start:end],
+                    'quantity': columns['quantity'][start:end],
+                    'unit_price': columns['unit_price'][start:end],
+                    'is_holiday': columns['is_holiday'][start:end],
+                    'holiday_name': columns['holiday_name'][start:end],
+                    'category': columns['category'][start],
+                    'brand': columns['brand'][start],
+                }
+
+            store_time = time.time() - store_start
+            if load_timings is not None:
+                for start, end in zip(starts, ends):
+                    load_timings[(int(item_col[start]), store_id)] = store_time * (end - start) / len(item_col)
+
+            print(f"   📥 Loja {store_id}: {len(starts)} séries, {len(item_col)} registros "
+                  f"({store_time:.1f}s)")
+    finally:
+        conn.close()
+
+    return series_data
+
+FORECAST_DB_COLUMNS = [
+    'store_id', 'item_id', 'forecast_date',
+    'prophet_prediction', 'arima_prediction', 'holt_winters_prediction', 
+    'xgboost_prediction', 'linear_regression_prediction', 'random_forest_prediction',     
+    'croston_prediction', 'sba_prediction', 'tsb_prediction',
+    'best_model', 'best_prediction',
+    'model_rmse', 'model_mape', 'model_mae',
+    'brand', 'category', 'model_version'
+]
+
+FORECAST_METRIC_COLUMNS = ['model_rmse', 'model_mape', 'model_mae']
+
+
+def _forecast_upsert_sql(table, source):
+    """INSERT ... ON CONFLICT de sales_salesforecast (source = VALUES ou SELECT da staging)"""
+    return sql.SQL("""
+        INSERT INTO {table} (
+            store_id, item_id, forecast_date,
+            prophet_prediction, arima_prediction, holt_winters_prediction, 
+            xgboost_prediction, linear_regression_prediction, random_forest_prediction,     
+            croston_prediction, sba_prediction, tsb_prediction,
+            best_model, best_prediction,
+            model_rmse, model_mape, model_mae,
+            brand, category, model_version,
+            is_active, created_at, updated_at
+        )
+        {source}
+        ON CONFLICT (store_id, item_id, forecast_date)
+        DO UPDATE SET
+            prophet_prediction = EXCLUDED.prophet_prediction,
+            arima_prediction = EXCLUDED.arima_prediction,
+            holt_winters_prediction = EXCLUDED.holt_winters_prediction,
+            xgboost_prediction = EXCLUDED.xgboost_prediction,
+            linear_regression_prediction = EXCLUDED.linear_regression_prediction, 
+            random_forest_prediction = EXCLUDED.random_forest_prediction,       
+            croston_prediction = EXCLUDED.croston_prediction,
+            sba_prediction = EXCLUDED.sba_prediction,
+            tsb_prediction = EXCLUDED.tsb_prediction,
+            best_model = EXCLUDED.best_model,
+            best_prediction = EXCLUDED.best_prediction,
+            model_rmse = EXCLUDED.model_rmse,
+            model_mape = EXCLUDED.model_mape,
+            model_mae = EXCLUDED.model_mae,
+            brand = EXCLUDED.brand,
+            category = EXCLUDED.category,
+            model_version = EXCLUDED.model_version,
+            is_active = EXCLUDED.is_active,
+            updated_at = NOW();
+    """).format(table=sql.Identifier(table), source=source)
+
+
+def _forecast_copy_buffer(df):
+    """
+    CSV ('|') das colunas de forecast montado de forma vetorizada (to_csv em C).
+    Métricas vão como texto de float ('nan' incluso, como no caminho antigo);
+    previsões ausentes (None) viram NULL.
+    """
+    out = pd.DataFrame({col: df[col] for col in FORECAST_DB_COLUMNS})
+    for col in FORECAST_METRIC_COLUMNS:
+        out[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64).astype(str)
+    # Ordem de entrada: em chaves repetidas vale a última linha (igual ao execute_batch)
+    out['row_seq'] = np.arange(len(out))
+
+    buffer = io.StringIO()
+    out.to_csv(buffer, sep='|', header=False, index=False, na_rep='')
+    buffer.seek(0)
+    return buffer
+
+
+def save_forecasts_to_db(df, pg_conn_str, method='copy', table='sales_salesforecast'):
+    """
+    Salva forecasts com upsert em (store_id, item_id, forecast_date).
+
+    method:
+        'copy'  (padrão) - colunas montadas vetorizadas, COPY para uma tabela
+                 temporária (sem WAL) e um único INSERT ... SELECT ... ON CONFLICT
+        'batch' - caminho antigo: iterrows + execute_batch (page_size=1000)
+    table: tabela de destino (o benchmark usa uma cópia de sales_salesforecast)
     """
     if df.empty:
         print("DataFrame de previsões está vazio.")
         return
     
-    conn = psycopg2.connect(pg_conn_str)
-    cur = conn.cursor()
-    
-    # Colunas esperadas
-    required_columns = [
-        'store_id', 'item_id', 'forecast_date',
-        'prophet_prediction', 'arima_prediction', 'holt_winters_prediction', 
-        'xgboost_prediction', 'linear_regression_prediction', 'random_forest_prediction',     
-        'best_model', 'best_prediction',
-        'model_rmse', 'model_mape', 'model_mae',
-        'brand', 'category', 'model_version'
-    ]
-    
     # Garantir que todas colunas existam
-    for col in required_columns:
+    for col in FORECAST_DB_COLUMNS:
         if col not in df.columns:
             df[col] = None
     
     df['model_version'] = MODEL_VERSION
     
-    # ✅ BULK INSERT - Preparar dados em lote
-    records = []
-    for _, row in df.iterrows():
-        records.append((
-            row['store_id'], row['item_id'], row['forecast_date'],
-            row['prophet_prediction'], row['arima_prediction'], 
-            row['holt_winters_prediction'], row['xgboost_prediction'],
-            row['linear_regression_prediction'], row['random_forest_prediction'],
-            row['best_model'], row['best_prediction'],
-            str(row['model_rmse']), str(row['model_mape']), str(row['model_mae']),
-            row['brand'], row['category'], row['model_version']
-        ))
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
     
     try:
-        # ✅ EXECUTEMANY - Insere TODOS de uma vez
-        psycopg2.extras.execute_batch(cur, """
-            INSERT INTO sales_salesforecast (
-                store_id, item_id, forecast_date,
-                prophet_prediction, arima_prediction, holt_winters_prediction, 
-                xgboost_prediction, linear_regression_prediction, random_forest_prediction,     
-                best_model, best_prediction,
-                model_rmse, model_mape, model_mae,
-                brand, category, model_version,
-                is_active, created_at, updated_at
+        if method == 'batch':
+            # BULK INSERT - Preparar dados em lote
+            records = []
+            for _, row in df.iterrows():
+                records.append((
+                    row['store_id'], row['item_id'], row['forecast_date'],
+                    row['prophet_prediction'], row['arima_prediction'], 
+                    row['holt_winters_prediction'], row['xgboost_prediction'],
+                    row['linear_regression_prediction'], row['random_forest_prediction'],
+                    row['croston_prediction'], row['sba_prediction'], row['tsb_prediction'],
+                    row['best_model'], row['best_prediction'],
+                    str(row['model_rmse']), str(row['model_mape']), str(row['model_mae']),
+                    row['brand'], row['category'], row['model_version']
+                ))
+            
+            values = sql.SQL("VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, True, NOW(), NOW())")
+            psycopg2.extras.execute_batch(cur, _forecast_upsert_sql(table, values).as_string(conn), records, page_size=1000)
+            total = len(records)
+        else:
+            # ✅ COPY para staging temporária + um único upsert set-based
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS tmp_salesforecast (
+                    store_id INTEGER,
+                    item_id BIGINT,
+                    forecast_date DATE,
+                    prophet_prediction DOUBLE PRECISION,
+                    arima_prediction DOUBLE PRECISION,
+                    holt_winters_prediction DOUBLE PRECISION,
+                    xgboost_prediction DOUBLE PRECISION,
+                    linear_regression_prediction DOUBLE PRECISION,
+                    random_forest_prediction DOUBLE PRECISION,
+                    croston_prediction DOUBLE PRECISION,
+                    sba_prediction DOUBLE PRECISION,
+                    tsb_prediction DOUBLE PRECISION,
+                    best_model TEXT,
+                    best_prediction DOUBLE PRECISION,
+                    model_rmse DOUBLE PRECISION,
+                    model_mape DOUBLE PRECISION,
+                    model_mae DOUBLE PRECISION,
+                    brand TEXT,
+                    category TEXT,
+                    model_version TEXT,
+                    row_seq BIGINT
+                ) ON COMMIT DROP;
+            """)
+            cur.copy_expert(
+                "COPY tmp_salesforecast FROM STDIN WITH (FORMAT CSV, DELIMITER '|')",
+                _forecast_copy_buffer(df)
             )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, True, NOW(), NOW()) 
-            ON CONFLICT (store_id, item_id, forecast_date)
-            DO UPDATE SET
-                prophet_prediction = EXCLUDED.prophet_prediction,
-                arima_prediction = EXCLUDED.arima_prediction,
-                holt_winters_prediction = EXCLUDED.holt_winters_prediction,
-                xgboost_prediction = EXCLUDED.xgboost_prediction,
-                linear_regression_prediction = EXCLUDED.linear_regression_prediction, 
-                random_forest_prediction = EXCLUDED.random_forest_prediction,       
-                best_model = EXCLUDED.best_model,
-                best_prediction = EXCLUDED.best_prediction,
-                model_rmse = EXCLUDED.model_rmse,
-                model_mape = EXCLUDED.model_mape,
-                model_mae = EXCLUDED.model_mae,
-                brand = EXCLUDED.brand,
-                category = EXCLUDED.category,
-                model_version = EXCLUDED.model_version,
-                is_active = EXCLUDED.is_active,
-                updated_at = NOW();
-        """, records, page_size=1000)  # ✅ 1000 registros por batch
+            select = sql.SQL("""
+                SELECT DISTINCT ON (store_id, item_id, forecast_date)
+                    store_id, item_id, forecast_date,
+                    prophet_prediction, arima_prediction, holt_winters_prediction,
+                    xgboost_prediction, linear_regression_prediction, random_forest_prediction,
+                    croston_prediction, sba_prediction, tsb_prediction,
+                    best_model, best_prediction,
+                    model_rmse, model_mape, model_mae,
+                    brand, category, model_version,
+                    True, NOW(), NOW()
+                FROM tmp_salesforecast
+                ORDER BY store_id, item_id, forecast_date, row_seq DESC
+            """)
+            cur.execute(_forecast_upsert_sql(table, select))
+            total = len(df)
         
         conn.commit()
-        print(f"✅ {len(records)} forecasts salvos com sucesso (bulk insert)")
+        print(f"✅ {total} forecasts salvos com sucesso ({'COPY + upsert' if method == 'copy' else 'bulk insert'})")
         
     except Exception as e:
         conn.rollback()
@@ -281,9 +571,9 @@ class ModelSelector:
             'SAZONAL_MEDIO': ['Prophet', 'Holt-Winters', 'ARIMA'],
             'SAZONAL_CARO': ['Prophet', 'ARIMA', 'XGBoost'],
             
-            'INTERMITENTE_BARATO': ['XGBoost', 'Prophet'],
-            'INTERMITENTE_MEDIO': ['XGBoost', 'Prophet'],
-            'INTERMITENTE_CARO': ['Prophet', 'XGBoost']
+            'INTERMITENTE_BARATO': ['SBA', 'TSB', 'Croston'],
+            'INTERMITENTE_MEDIO': ['SBA', 'TSB', 'XGBoost'],
+            'INTERMITENTE_CARO': ['TSB', 'SBA', 'Prophet']
         }
         
     def get_recommended_models(self, seasonality_category, price_category):
@@ -294,8 +584,23 @@ class ForecastingModels:
     """Classe para gerenciar múltiplos modelos de forecasting"""
     # ... (métodos internos: prepare_data_for_item, analyze_time_series_characteristics, select_best_models_for_item, prophet_model, arima_model, holt_winters_model, xgboost_model)
     
-    def __init__(self):
+    def __init__(self, hints=None):
         self.model_selector = ModelSelector()
+        # Estado reaproveitado entre ajustes/execuções (ex: {'arima': {'order': (p,d,q), 'aic_per_obs': x}})
+        self.hints = dict(hints or {})
+        # Prazo do ajuste em andamento (definido por process_item_forecast a cada modelo)
+        self.budget = TimeBudget()
+        # Tempo acumulado de ajuste e de previsão (zerado por process_item_forecast a cada modelo)
+        self.stage_seconds = {'fit': 0.0, 'predict': 0.0}
+    
+    @contextmanager
+    def _timed(self, stage):
+        """Soma a duração do bloco em stage_seconds[stage] ('fit' ou 'predict')"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - start
         
     def prepare_data_for_item(self, df, item_id, store_id=None):
         """Prepara dados de quantidade para um item específico, garantindo série completa."""
@@ -331,63 +636,156 @@ class ForecastingModels:
         characteristics['is_intermittent'] = zero_ratio > 0.3
         return characteristics
     
-    def select_best_models_for_item(self, ts, item_characteristics):
-        """Seleciona os melhores modelos para um item baseado em suas características"""
-        ts_characteristics = self.analyze_time_series_characteristics(ts)
+    def select_best_models_for_item(self, ts, item_characteristics, ts_characteristics=None):
+        """
+        Seleciona os melhores modelos para um item baseado em suas características.
+        ts_characteristics: resultado de characterize_series_matrix para a série (se None, é calculado aqui)
+        """
+        if ts_characteristics is None:
+            ts_characteristics = self.analyze_time_series_characteristics(ts)
         recommended_models = self.model_selector.get_recommended_models(
             item_characteristics.get('seasonality_category', 'ESTAVEL'),
             item_characteristics.get('price_category', 'MEDIO')
         )
         if ts_characteristics.get('is_intermittent', False):
-            recommended_models = ['XGBoost', 'Prophet'] + [m for m in recommended_models if m not in ['XGBoost', 'Prophet']]
+            recommended_models = ['SBA', 'TSB'] + [m for m in recommended_models if m not in ['SBA', 'TSB']]
         if ts_characteristics.get('weekly_seasonality', 0) > 0.5 and 'Prophet' not in recommended_models[:2]:
             recommended_models = ['Prophet'] + [m for m in recommended_models if m != 'Prophet']
         return recommended_models[:3]
         
     
-    def prophet_model(self, ts, periods=28):
-        """Modelo Prophet"""
+    def prophet_model(self, ts, periods=28, init=None):
+        """Modelo Prophet (init: parâmetros iniciais do Stan para warm start)"""
         if not PROPHET_AVAILABLE: return None, None
         df_prophet = ts.reset_index()[['date', 'quantity']]
         df_prophet.columns = ['ds', 'y']
+        fit_kwargs = {'iter': FORECAST_PROPHET_MAX_ITER} if FORECAST_PROPHET_MAX_ITER > 0 else {}
+        if init is not None:
+            fit_kwargs['init'] = init
         try:
             model = Prophet(yearly_seasonality=True, weekly_seasonality=True, daily_seasonality=False, changepoint_prior_scale=0.05)
-            model.fit(df_prophet)
-            future = model.make_future_dataframe(periods=periods)
-            forecast = model.predict(future)
+            with self._timed('fit'):
+                model.fit(df_prophet, **fit_kwargs)
+            with self._timed('predict'):
+                future = model.make_future_dataframe(periods=periods)
+                forecast = model.predict(future)
             return model, forecast[['ds', 'yhat']].tail(periods).set_index('ds')['yhat']
         except Exception:
             return None, None
 
+    def prophet_update(self, fitted_model, ts, periods=28):
+        """Reajusta o Prophet em ts partindo dos parâmetros do ajuste do backtest (warm start)"""
+        try:
+            init = {name: fitted_model.params[name][0][0] for name in ('k', 'm', 'sigma_obs')}
+            init.update({name: fitted_model.params[name][0] for name in ('delta', 'beta')})
+        except Exception:
+            return None
+        _, forecast = self.prophet_model(ts, periods, init=init)
+        return forecast
+
+    def _arima_differencing(self, values):
+        """Ordem de diferenciação (0 ou 1) pelo teste KPSS, como no Hyndman-Khandakar"""
+        try:
+            from statsmodels.tsa.stattools import kpss
+            p_value = kpss(values, regression='c', nlags='auto')[1]
+            return 1 if p_value < 0.05 else 0
+        except Exception:
+            return 1
+
+    def _stepwise_arima_search(self, fit, fits, d, start_order=None):
+        """Busca stepwise (Hyndman-Khandakar): parte de poucos modelos e anda para vizinhos enquanto o AIC melhora"""
+        candidates = [(2, d, 2), (0, d, 0), (1, d, 0), (0, d, 1)]
+        if start_order is not None:
+            candidates.insert(0, start_order)
+
+        best_order, best_aic = None, np.inf
+        for order in candidates:
+            if best_order is not None and self.budget.expired():
+                return best_order
+            fitted = fit(order)
+            if fitted is not None and fitted.aic < best_aic:
+                best_order, best_aic = order, fitted.aic
+
+        improved = best_order is not None
+        # Orçamento estourado: fica com a melhor ordem encontrada até aqui
+        while improved and len(fits) < ARIMA_MAX_FITS and not self.budget.expired():
+            improved = False
+            p, d, q = best_order
+            for dp, dq in ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1)):
+                order = (p + dp, d, q + dq)
+                if not (0 <= order[0] <= ARIMA_MAX_P and 0 <= order[2] <= ARIMA_MAX_Q) or order in fits:
+                    continue
+                fitted = fit(order)
+                if fitted is not None and fitted.aic < best_aic:
+                    best_order, best_aic = order, fitted.aic
+                    improved = True
+                    break
+                if len(fits) >= ARIMA_MAX_FITS:
+                    break
+
+        return best_order
+
     def arima_model(self, ts, periods=28):
-        """Modelo Auto ARIMA (simplified)"""
+        """Modelo Auto ARIMA (busca stepwise + ordem em cache por série)"""
         try:
             from statsmodels.tsa.arima.model import ARIMA
         except ImportError:
             return None, None
-            
-        best_aic = np.inf
-        best_order = (1,1,1)
-        for p in range(3):
-            for d in range(2):
-                for q in range(3):
-                    try:
-                        model = ARIMA(ts.values, order=(p,d,q))
-                        fitted_model = model.fit(disp=False)
-                        if fitted_model.aic < best_aic:
-                            best_aic = fitted_model.aic
-                            best_order = (p,d,q)
-                    except:
-                        continue
+        
+        values = ts.values
+        n_obs = len(values)
+        fits = {}
+        
+        def fit(order):
+            if order not in fits:
+                try:
+                    with self._timed('fit'):
+                        fits[order] = ARIMA(values, order=order).fit()
+                except Exception:
+                    fits[order] = None
+            return fits[order]
+        
+        hint = self.hints.get('arima')
+        best_order = None
+        
+        if hint:
+            # ✅ Ordem da última execução: aceita sem busca se o ajuste não piorou
+            cached_order = tuple(hint['order'])
+            fitted = fit(cached_order)
+            cached_aic = hint.get('aic_per_obs')
+            if fitted is not None and cached_aic is not None and fitted.aic / n_obs - cached_aic <= ARIMA_REFIT_TOLERANCE:
+                best_order = cached_order
+            else:
+                best_order = self._stepwise_arima_search(fit, fits, cached_order[1], start_order=cached_order)
+        else:
+            best_order = self._stepwise_arima_search(fit, fits, self._arima_differencing(values))
+        
+        if best_order is None or fits.get(best_order) is None:
+            return None, None
         
         try:
-            model = ARIMA(ts.values, order=best_order)
-            fitted_model = model.fit(disp=False)
-            forecast = fitted_model.forecast(steps=periods)
+            fitted_model = fits[best_order]
+            self.hints['arima'] = {'order': best_order, 'aic_per_obs': float(fitted_model.aic / n_obs)}
+            with self._timed('predict'):
+                forecast = fitted_model.forecast(steps=periods)
             return fitted_model, pd.Series(forecast, index=pd.date_range(start=ts.index[-1] + timedelta(days=1), periods=periods))
         except:
             return None, None
 
+    def arima_update(self, fitted_model, ts, periods=28):
+        """Estende o ajuste do backtest com as observações novas de ts (filtro de Kalman, sem reotimizar)"""
+        n_new = len(ts) - int(fitted_model.nobs)
+        if n_new < 0:
+            return None
+        try:
+            with self._timed('fit'):
+                updated = fitted_model.append(ts.values[-n_new:], refit=False) if n_new else fitted_model
+            with self._timed('predict'):
+                forecast = updated.forecast(steps=periods)
+            return pd.Series(forecast, index=pd.date_range(start=ts.index[-1] + timedelta(days=1), periods=periods))
+        except Exception:
+            return None
+
     def holt_winters_model(self, ts, periods=28):
         """Modelo Holt-Winters (Exponential Smoothing)"""
         seasonal_periods = 7 if len(ts) >= 2 * 7 else None
@@ -398,17 +796,105 @@ class ForecastingModels:
             else:
                 model = ExponentialSmoothing(ts, trend='add', seasonal=None)
             
-            fitted_model = model.fit()
-            forecast = fitted_model.forecast(periods)
+            with self._timed('fit'):
+                if FORECAST_HW_MAX_ITER > 0:
+                    fitted_model = model.fit(minimize_kwargs={'options': {'maxiter': FORECAST_HW_MAX_ITER}})
+                else:
+                    fitted_model = model.fit()
+            with self._timed('predict'):
+                forecast = fitted_model.forecast(periods)
             
             return fitted_model, forecast
         except Exception:
             return None, None
     
-    def xgboost_model(self, ts, periods=28):
-        """Modelo XGBoost para Time Series"""
-        if not XGBOOST_AVAILABLE: return None, None
-            
+    def holt_winters_update(self, fitted_model, ts, periods=28):
+        """
+        Reaplica parâmetros e estados iniciais do ajuste do backtest a ts (mesmo início),
+        só rodando a recursão até o fim - sem nova otimização.
+        """
+        if isinstance(fitted_model, VectorizedHoltWinters):
+            try:
+                with self._timed('fit'):
+                    updated = fitted_model.update(ts.values.astype(float)[None, :])
+                with self._timed('predict'):
+                    forecast = updated.forecast(periods)[0]
+                return pd.Series(forecast, index=pd.date_range(start=ts.index[-1] + timedelta(days=1), periods=periods))
+            except Exception:
+                return None
+        
+        try:
+            params = fitted_model.params
+            seasonal_periods = fitted_model.model.seasonal_periods
+            fit_start = time.perf_counter()
+            if seasonal_periods:
+                model = ExponentialSmoothing(
+                    ts, trend='add', seasonal='add', seasonal_periods=seasonal_periods,
+                    initialization_method='known', initial_level=params['initial_level'],
+                    initial_trend=params['initial_trend'], initial_seasonal=params['initial_seasons']
+                )
+                updated = model.fit(
+                    smoothing_level=params['smoothing_level'], smoothing_trend=params['smoothing_trend'],
+                    smoothing_seasonal=params['smoothing_seasonal'], optimized=False
+                )
+            else:
+                model = ExponentialSmoothing(
+                    ts, trend='add', seasonal=None, initialization_method='known',
+                    initial_level=params['initial_level'], initial_trend=params['initial_trend']
+                )
+                updated = model.fit(
+                    smoothing_level=params['smoothing_level'], smoothing_trend=params['smoothing_trend'], optimized=False
+                )
+            self.stage_seconds['fit'] += time.perf_counter() - fit_start
+            with self._timed('predict'):
+                return updated.forecast(periods)
+        except Exception:
+            return None
+    
+    def holt_winters_vectorized_model(self, ts, periods=28):
+        """Modelo Holt-Winters aditivo (sazonalidade 7) do motor NumPy vetorizado"""
+        if len(ts) < 2 * 7:
+            return self.holt_winters_model(ts, periods)
+        try:
+            with self._timed('fit'):
+                model = VectorizedHoltWinters().fit(ts.values.astype(float)[None, :])
+            with self._timed('predict'):
+                forecast = model.forecast(periods)[0]
+            return model, pd.Series(forecast, index=pd.date_range(start=ts.index[-1] + timedelta(days=1), periods=periods))
+        except Exception:
+            return None, None
+    
+    def _intermittent_model(self, variant, ts, periods):
+        """Croston/SBA/TSB em uma série (mesmo motor vetorizado da triagem, com 1 linha)"""
+        try:
+            # Estimação e previsão saem da mesma recursão: conta tudo como ajuste
+            with self._timed('fit'):
+                forecast = intermittent_forecast_matrix([ts.values.astype(float)], periods, models=(variant,))[variant][0]
+            return {'variant': variant}, pd.Series(forecast, index=pd.date_range(start=ts.index[-1] + timedelta(days=1), periods=periods))
+        except Exception:
+            return None, None
+    
+    def croston_model(self, ts, periods=28):
+        """Croston: demanda média por ocorrência / intervalo médio entre ocorrências"""
+        return self._intermittent_model('Croston', ts, periods)
+    
+    def sba_model(self, ts, periods=28):
+        """Syntetos-Boylan: Croston com correção de viés (1 - alpha/2)"""
+        return self._intermittent_model('SBA', ts, periods)
+    
+    def tsb_model(self, ts, periods=28):
+        """Teunter-Syntetos-Babai: probabilidade de demanda atualizada todo dia (acompanha obsolescência)"""
+        return self._intermittent_model('TSB', ts, periods)
+    
+    def intermittent_update(self, fitted_model, ts, periods=28):
+        """Croston/SBA/TSB não guardam estado caro: reajusta na série completa"""
+        _, forecast = self._intermittent_model(fitted_model['variant'], ts, periods)
+        return forecast
+    
+    XGBOOST_FEATURES = ['lag_1', 'lag_7', 'lag_14', 'rolling_mean_7', 'dayofweek', 'month', 'day', 'is_weekend']
+    
+    def _xgboost_training_frame(self, ts):
+        """Features de lag/calendário da série para treino do XGBoost"""
         df = ts.reset_index()
         df.columns = ['date', 'quantity']
         df['lag_1'] = df['quantity'].shift(1)
@@ -417,17 +903,11 @@ class ForecastingModels:
         df['rolling_mean_7'] = df['quantity'].rolling(7).mean()
         df = create_time_features(df)
         
-        df = df.dropna()
-        
-        if len(df) < 30: return None, None
-        
-        feature_cols = ['lag_1', 'lag_7', 'lag_14', 'rolling_mean_7', 'dayofweek', 'month', 'day', 'is_weekend']
-        X_train = df[feature_cols]
-        y_train = df['quantity']
-        
-        model = xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42, objective='reg:squarederror')
-        model.fit(X_train, y_train)
-        
+        return df.dropna()
+    
+    def _xgboost_recursive_forecast(self, model, ts, periods):
+        """Previsão recursiva: cada passo usa as previsões anteriores como lags (None se o orçamento estourar)"""
+        feature_cols = self.XGBOOST_FEATURES
         last_date = ts.index[-1]
         future_dates = pd.date_range(start=last_date + timedelta(days=1), periods=periods)
         forecasts = []
@@ -435,6 +915,8 @@ class ForecastingModels:
         current_data.columns = ['date', 'quantity']
         
         for i in range(periods):
+            if self.budget.expired():
+                return None
             row_date = future_dates[i]
             X_pred = {
                 'dayofweek': row_date.dayofweek,
@@ -457,17 +939,72 @@ class ForecastingModels:
             pred = max(0, pred)
             forecasts.append(pred)
         
-        return model, pd.Series(forecasts, index=future_dates)
+        return pd.Series(forecasts, index=future_dates)
+    
+    def xgboost_model(self, ts, periods=28):
+        """Modelo XGBoost para Time Series"""
+        if not XGBOOST_AVAILABLE: return None, None
+        
+        df = self._xgboost_training_frame(ts)
+        
+        if len(df) < 30: return None, None
+        
+        X_train = df[self.XGBOOST_FEATURES]
+        y_train = df['quantity']
+        
+        model = xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42, objective='reg:squarederror')
+        with self._timed('fit'):
+            model.fit(X_train, y_train)
+        
+        with self._timed('predict'):
+            return model, self._xgboost_recursive_forecast(model, ts, periods)
+    
+    def xgboost_update(self, fitted_model, ts, periods=28):
+        """Boosting continuado: XGBOOST_UPDATE_ROUNDS árvores a mais sobre o booster do backtest, com ts inteira"""
+        if not XGBOOST_AVAILABLE: return None
+        
+        df = self._xgboost_training_frame(ts)
+        try:
+            model = xgb.XGBRegressor(n_estimators=XGBOOST_UPDATE_ROUNDS, max_depth=6, learning_rate=0.1, random_state=42, objective='reg:squarederror')
+            with self._timed('fit'):
+                model.fit(df[self.XGBOOST_FEATURES], df['quantity'], xgb_model=fitted_model.get_booster())
+            with self._timed('predict'):
+                return self._xgboost_recursive_forecast(model, ts, periods)
+        except Exception:
+            return None
 
-def process_item_forecast(df_item, item_group, forecast_periods=60):
+def process_item_forecast(df_item, item_group, forecast_periods=60, precomputed=None, model_hints=None, ts=None,
+                          ts_characteristics=None, item_char=None, segment_stats=None, models=None, hw_engine=None):
     """Processa o forecasting para um item (ou item/loja) específico, 
     com lógica para ignorar ou adaptar para séries curtas.
+    
+    ts: série diária já montada (view de SeriesMatrix.series); se None, é
+    construída a partir de df_item com prepare_data_for_item.
+    ts_characteristics: características da série já calculadas em lote (characterize_series_matrix).
+    item_char: dict com category, brand, price_category e seasonality_category já
+    resolvidos na execução; se None, lidos da primeira linha de df_item.
+    
+    precomputed: dict opcional {model_name: {'test': Series|None, 'final': Series}}
+    com previsões já geradas fora do item (ex: XGBoost global); esses modelos
+    não são reajustados aqui.
+    model_hints: dict opcional com estado de execuções anteriores (ex: ordem ARIMA);
+    o estado atualizado volta em output_df.attrs['model_hints'].
+    segment_stats: dict {modelo: (vitórias, avaliações)} do segmento da série; com
+    FORECAST_MODEL_PRUNING, modelos que raramente vencem não são ajustados. O
+    resultado do backtest volta em output_df.attrs['model_selection'].
+    models: lista fixa de modelos definida na triagem (ex: Croston/SBA/TSB já em
+    precomputed); substitui a seleção e a poda.
+    hw_engine: motor do Holt-Winters resolvido na execução ('statsmodels' ou 'numpy');
+    None = FORECAST_HW_ENGINE.
     """
     item_id, store_id = item_group
-    item_char = df_item.iloc[0][['category', 'brand', 'price_category', 'seasonality_category']].to_dict()
+    hw_engine = hw_engine or FORECAST_HW_ENGINE
+    if item_char is None:
+        item_char = df_item.iloc[0][['category', 'brand', 'price_category', 'seasonality_category']].to_dict()
     
-    fm = ForecastingModels()
-    ts = fm.prepare_data_for_item(df_item, item_id, store_id=store_id)['quantity']
+    fm = ForecastingModels(hints=model_hints)
+    if ts is None:
+        ts = fm.prepare_data_for_item(df_item, item_id, store_id=store_id)['quantity']
     ts_full = ts.copy()
     ts_len = len(ts_full.dropna())
 
@@ -497,33 +1034,100 @@ def process_item_forecast(df_item, item_group, forecast_periods=60):
     
     # if len(ts_train_val.dropna()) < 60: return None # Linha removida/substituída pela lógica acima
     
-    recommended_models = fm.select_best_models_for_item(ts_train, item_char)
+    if models:
+        recommended_models = list(models)
+    else:
+        recommended_models = fm.select_best_models_for_item(ts_train, item_char, ts_characteristics)
+    
+    # Poda pelo histórico de vitórias do segmento (exceto nas séries de exploração)
+    pruned_models, explored = [], False
+    if FORECAST_MODEL_PRUNING and segment_stats and not models:
+        explored = np.random.random() < FORECAST_PRUNING_EXPLORE_RATE
+        if not explored:
+            recommended_models, pruned_models = prune_models(
+                recommended_models, segment_stats, FORECAST_PRUNING_MIN_WIN_RATE, FORECAST_PRUNING_MIN_SAMPLES
+            )
     results = {}
+    model_fits = 0
+    model_timings = {}
+    model_metrics = {}
     
     model_map = {
         'Prophet': fm.prophet_model, 'ARIMA': fm.arima_model, 
-        'Holt-Winters': fm.holt_winters_model, 'XGBoost': fm.xgboost_model
+        'Holt-Winters': fm.holt_winters_vectorized_model if hw_engine == 'numpy' else fm.holt_winters_model,
+        'XGBoost': fm.xgboost_model,
+        'Croston': fm.croston_model, 'SBA': fm.sba_model, 'TSB': fm.tsb_model
+    }
+    # Atualização do ajuste do backtest com a janela restante (FORECAST_SINGLE_FIT)
+    update_map = {
+        'Prophet': fm.prophet_update, 'ARIMA': fm.arima_update,
+        'Holt-Winters': fm.holt_winters_update, 'XGBoost': fm.xgboost_update,
+        'Croston': fm.intermittent_update, 'SBA': fm.intermittent_update, 'TSB': fm.intermittent_update
     }
     
+    precomputed = precomputed or {}
+    series_budget = TimeBudget(FORECAST_SERIES_TIME_BUDGET)
+    budget_events = []
+    
     for model_name in recommended_models:
-        if model_name in model_map:
+        if model_name in model_map or model_name in precomputed:
+            model_start = time.time()
+            pre = precomputed.get(model_name)
+            fitted_test = None
+            
+            # Orçamento da série esgotado: modelos ainda não ajustados são pulados
+            if pre is None and series_budget.expired():
+                budget_events.append({'model': model_name, 'event': 'series_budget'})
+                model_metrics[model_name] = {
+                    'backtest_seconds': 0.0, 'final_seconds': 0.0, 'fit_seconds': 0.0, 'predict_seconds': 0.0,
+                    'status': 'skipped', 'failure_reason': 'orçamento da série esgotado',
+                }
+                continue
+            fm.budget = series_budget.child(FORECAST_MODEL_TIME_BUDGET)
+            fm.stage_seconds = {'fit': 0.0, 'predict': 0.0}
             
             # --- Treinamento e Avaliação (Backtest Condicional) ---
+            failure_reason = None
             if do_backtest:
                 # Treinar e prever no período de teste para avaliação (usando ts_train)
-                _, forecast_test_series = model_map[model_name](ts_train, periods=forecast_periods)
+                if pre is not None:
+                    forecast_test_series = pre.get('test')
+                else:
+                    fitted_test, forecast_test_series = model_map[model_name](ts_train, periods=forecast_periods)
+                    model_fits += 1
                 
                 if forecast_test_series is not None and len(forecast_test_series) == forecast_periods:
                     metrics = calculate_metrics(ts_test.values, forecast_test_series.values)
                 else:
                     metrics = {'RMSE': 999999.0, 'MAPE': 999999.0} # Penaliza modelos que falham no backtest
+                    failure_reason = 'backtest sem previsão'
             else:
                 # Sem backtesting, métricas são zeradas (indicando falta de avaliação)
                 metrics = {'RMSE': 0.0, 'MAPE': 0.0} 
             
+            backtest_seconds = time.time() - model_start
+            
+            # Orçamento do modelo estourado no backtest: não gasta outro ajuste na previsão final
+            timed_out = pre is None and do_backtest and fm.budget.expired()
+            if timed_out:
+                budget_events.append({'model': model_name, 'event': 'model_budget'})
+            
             # --- Previsão Final (Sempre usa ts_full) ---
             # Previsão final: Treinar em TODOS os dados disponíveis (ts_full) e prever o futuro
-            _, final_forecast = model_map[model_name](ts_full, periods=forecast_periods)
+            final_forecast = None
+            if not timed_out:
+                if pre is not None:
+                    final_forecast = pre.get('final')
+                elif FORECAST_SINGLE_FIT and fitted_test is not None:
+                    # Ajuste único: estende o modelo do backtest em vez de treinar do zero
+                    final_forecast = update_map[model_name](fitted_test, ts_full, periods=forecast_periods)
+                
+                if final_forecast is None and pre is None:
+                    _, final_forecast = model_map[model_name](ts_full, periods=forecast_periods)
+                    model_fits += 1
+                    if final_forecast is None and fm.budget.expired():
+                        budget_events.append({'model': model_name, 'event': 'model_budget'})
+                        timed_out = True
             
             if final_forecast is not None:
                 results[model_name] = {
@@ -531,15 +1135,65 @@ def process_item_forecast(df_item, item_group, forecast_periods=60):
                     'prediction': final_forecast.values.tolist(),
                     'forecast_dates': final_forecast.index.strftime('%Y-%m-%d').tolist()
                 }
+            model_timings[model_name] = time.time() - model_start
+            if timed_out:
+                status, failure_reason = 'timeout', 'orçamento do modelo esgotado'
+            elif pre is not None:
+                status = 'precomputed'
+            elif final_forecast is not None:
+                status = 'ok'
+            else:
+                status, failure_reason = 'failed', 'previsão final não gerada'
+            model_metrics[model_name] = {
+                'backtest_seconds': backtest_seconds,
+                'final_seconds': model_timings[model_name] - backtest_seconds,
+                # Precomputados são ajustados fora da série (lote/global): sem tempo próprio
+                'fit_seconds': None if pre is not None else fm.stage_seconds['fit'],
+                'predict_seconds': None if pre is not None else fm.stage_seconds['predict'],
+                'status': status,
+                'failure_reason': failure_reason,
+            }
+    
+    # ✅ Nenhuma previsão após estourar o orçamento: baseline barato (média móvel)
+    if not results and budget_events:
+        fallback_start = time.time()
+        fm.stage_seconds = {'fit': 0.0, 'predict': 0.0}
+        fallback = FORECAST_BUDGET_FALLBACK_MODEL
+        metrics = {'RMSE': 0.0, 'MAPE': 0.0, 'MAE': 0.0}
+        if do_backtest:
+            _, forecast_test_series = fm._intermittent_model(fallback, ts_train, forecast_periods)
+            if forecast_test_series is not None and len(forecast_test_series) == forecast_periods:
+                metrics = calculate_metrics(ts_test.values, forecast_test_series.values)
+            else:
+                # Baseline sem backtest: mantém a previsão final, com a mesma penalidade dos modelos
+                metrics = {'RMSE': 999999.0, 'MAPE': 999999.0, 'MAE': 999999.0}
+        backtest_seconds = time.time() - fallback_start
+        _, final_forecast = fm._intermittent_model(fallback, ts_full, forecast_periods)
+        if final_forecast is not None:
+            results[fallback] = {
+                'metrics': metrics,
+                'prediction': final_forecast.values.tolist(),
+                'forecast_dates': final_forecast.index.strftime('%Y-%m-%d').tolist()
+            }
+            budget_events.append({'model': fallback, 'event': 'fallback'})
+            model_timings[fallback] = time.time() - fallback_start
+            model_metrics[fallback] = {
+                'backtest_seconds': backtest_seconds,
+                'final_seconds': model_timings[fallback] - backtest_seconds,
+                'fit_seconds': fm.stage_seconds['fit'],
+                'predict_seconds': fm.stage_seconds['predict'],
+                'status': 'fallback',
+                'failure_reason': 'orçamento de tempo esgotado',
+            }
                 
     if not results: return None
         
     # Lógica de seleção do melhor modelo
-    # Se não houve backtesting (MAPE/RMSE = 0), o primeiro modelo da lista recomendada é o "melhor"
+    # Se não houve backtesting (MAPE/RMSE = 0), o primeiro modelo recomendado com previsão é o "melhor"
     if do_backtest:
         best_model = min(results, key=lambda m: results[m]['metrics']['RMSE'])
     else:
-        best_model = recommended_models[0]
+        best_model = next((m for m in recommended_models if m in results), next(iter(results)))
         
     best_prediction = results[best_model]['prediction']
     
@@ -555,6 +1209,9 @@ def process_item_forecast(df_item, item_group, forecast_periods=60):
     arima_pred_clean = clean_prediction(results.get('ARIMA', {}).get('prediction', [None] * forecast_periods))
     holt_winters_pred_clean = clean_prediction(results.get('Holt-Winters', {}).get('prediction', [None] * forecast_periods))
     xgboost_pred_clean = clean_prediction(results.get('XGBoost', {}).get('prediction', [None] * forecast_periods))
+    croston_pred_clean = clean_prediction(results.get('Croston', {}).get('prediction', [None] * forecast_periods))
+    sba_pred_clean = clean_prediction(results.get('SBA', {}).get('prediction', [None] * forecast_periods))
+    tsb_pred_clean = clean_prediction(results.get('TSB', {}).get('prediction', [None] * forecast_periods))
     
     output_df = pd.DataFrame({
         'store_id': store_id, 'item_id': item_id,
@@ -571,11 +1228,26 @@ def process_item_forecast(df_item, item_group, forecast_periods=60):
         'arima_prediction': arima_pred_clean,
         'holt_winters_prediction': holt_winters_pred_clean,
         'xgboost_prediction': xgboost_pred_clean,
+        'croston_prediction': croston_pred_clean,
+        'sba_prediction': sba_pred_clean,
+        'tsb_prediction': tsb_pred_clean,
         
         # GARANTIR QUE AS COLUNAS AUSENTES EXISTAM COM VALOR NONE
         'linear_regression_prediction': clean_prediction(results.get('Linear-Regression', {}).get('prediction', [None] * forecast_periods)),
         'random_forest_prediction': clean_prediction(results.get('Random-Forest', {}).get('prediction', [None] * forecast_periods)),
     })
+    output_df.attrs['model_hints'] = fm.hints
+    output_df.attrs['model_timings'] = model_timings
+    output_df.attrs['model_metrics'] = model_metrics
+    output_df.attrs['budget_events'] = budget_events
+    output_df.attrs['model_selection'] = {
+        'segment': (item_char['seasonality_category'], item_char['price_category'], store_id),
+        'evaluated': list(results) if do_backtest else [],
+        'best': best_model,
+        'pruned': pruned_models,
+        'explored': explored,
+        'fits': model_fits,
+    }
     
     return output_df
 
@@ -613,6 +1285,38 @@ def process_items_batch(batch_data):
     return results
 
 
+def process_shared_batch(batch_entries, forecast_periods, precomputed=None, model_hints=None, classifications=None,
+                         win_rates=None, model_routes=None, hw_engine=None):
+    """
+    Entrada dos workers do modo 'process': lê as séries do batch da memória
+    compartilhada (anexada em attach_worker_store) e reaproveita
+    process_items_batch_safe.
+    """
+    series_data = worker_series(batch_entries)
+    batch_items = [(entry[0], entry[1]) for entry in batch_entries]
+    return process_items_batch_safe(batch_items, series_data, forecast_periods, precomputed, model_hints,
+                                    classifications=classifications, win_rates=win_rates, model_routes=model_routes,
+                                    hw_engine=hw_engine)
+
+def create_process_executor(shared_store, num_workers, max_tasks_per_child):
+    """ProcessPoolExecutor com workers anexados ao SharedSeriesStore e reciclados a cada N tarefas"""
+    kwargs = {
+        'max_workers': num_workers,
+        'initializer': attach_worker_store,
+        'initargs': (shared_store.spec,),
+    }
+    # max_tasks_per_child só existe a partir do Python 3.11 (e exige spawn)
+    if sys.version_info >= (3, 11) and max_tasks_per_child:
+        kwargs['mp_context'] = multiprocessing.get_context('spawn')
+        kwargs['max_tasks_per_child'] = max_tasks_per_child
+    return ProcessPoolExecutor(**kwargs)
+
+def series_failure_frame(item_id, store_id, reason):
+    """Resultado vazio de uma série sem forecast, levando o motivo para as métricas da execução"""
+    df = pd.DataFrame()
+    df.attrs['series_failure'] = (item_id, store_id, str(reason))
+    return df
+
 def chunk_list(lst, n):
     """Divide lista em chunks de tamanho n"""
     for i in range(0, len(lst), n):
@@ -621,66 +1325,83 @@ def chunk_list(lst, n):
 # ==========================================
 # FUNÇÃO DE PROCESSAMENTO OTIMIZADA
 # ==========================================
-def process_items_batch_safe(batch_items, pg_conn_str, forecast_periods, store_ids=None):
+def process_items_batch_safe(batch_items, series_data, forecast_periods, precomputed=None, model_hints=None,
+                             matrix=None, series_traits=None, classifications=None, win_rates=None,
+                             model_routes=None, hw_engine=None):
     """
     Processa batch de items de forma segura
     
     Args:
         batch_items: lista de (item_id, store_id)
-        pg_conn_str: connection string
+        series_data: dict {(item_id, store_id): arrays} vindo de load_active_series
         forecast_periods: dias para prever
-        store_ids: lista de store_ids permitidos
+        precomputed: dict opcional {(item_id, store_id): previsões já geradas por modelo}
+        model_hints: dict opcional {(item_id, store_id): estado dos modelos (ex: ordem ARIMA)}
+        matrix: SeriesMatrix da execução; se None, é montada só para o batch
+        series_traits: características das séries (characterize_series_matrix); se None, calculadas para o batch
+        classifications: dict {item_id: {'price_category', 'seasonality_category'}} da execução
+                         (resolve_classifications); se None, classificadas para o batch
+        win_rates: dict {(sazonalidade, preço, loja): {modelo: (vitórias, avaliações)}} (load_win_rates)
+        model_routes: dict {(item_id, store_id): [modelos]} das séries desviadas na triagem
+        hw_engine: motor do Holt-Winters da execução (None = FORECAST_HW_ENGINE)
+    
+    Returns:
+        lista de DataFrames de forecast; séries sem forecast entram como DataFrame
+        vazio com o motivo em attrs['series_failure'] (series_failure_frame)
     """
+    precomputed = precomputed or {}
+    model_hints = model_hints or {}
+    win_rates = win_rates or {}
+    model_routes = model_routes or {}
     results = []
     
-    try:
-        conn = psycopg2.connect(pg_conn_str)
-        
-        for item_id, store_id in batch_items:
-            try:
-                # ✅ QUERY COM FILTRO DE LOJA
-                query = f"""
-                SELECT s.date, s.store_id, s.item_id, i.nivel3 as category, i.brand,
-                       SUM(s.quantity) AS quantity,
-                       ROUND(SUM(s.quantity * s.price) / NULLIF(SUM(s.quantity), 0), 0) AS unit_price,
-                       c.is_holiday, c.holiday_name
-                FROM public.sales_sale AS s
-                JOIN public.items_item AS i ON s.item_id = i.code::int
-                LEFT JOIN public.sales_calendar c ON s.date = c.date
-                WHERE s.item_id = {item_id}
-                  AND s.store_id = {store_id}
-                  AND i.is_disabled_purchase = false
-                GROUP BY s.date, s.store_id, s.item_id, i.nivel3, i.brand, c.is_holiday, c.holiday_name
-                ORDER BY s.date
-                """
-                
-                df_item = pd.read_sql(query, conn)
-                
-                if df_item.empty or len(df_item) < 60:
-                    continue
-                
-                df_item['date'] = pd.to_datetime(df_item['date'])
-                df_item['is_holiday'] = df_item['is_holiday'].fillna(False)
-                df_item = create_time_features(df_item)
-                df_item = classify_products(df_item)
-                
-                forecast_df = process_item_forecast(
-                    df_item,
-                    (item_id, store_id),
-                    forecast_periods
-                )
-                
-                if forecast_df is not None:
-                    results.append(forecast_df)
-                
-            except Exception as e:
-                print(f"⚠️  Erro no item {item_id}, loja {store_id}: {str(e)[:100]}")
+    if matrix is None:
+        matrix = SeriesMatrix.from_series(series_data, keys=batch_items)
+    if series_traits is None:
+        series_traits = characterize_series_matrix(matrix, forecast_periods)
+    if classifications is None:
+        classifications = classify_items({key: series_data[key] for key in batch_items if key in series_data})
+        classifications = classifications[['price_category', 'seasonality_category']].to_dict('index')
+    
+    for item_id, store_id in batch_items:
+        try:
+            series = series_data.get((item_id, store_id))
+            
+            if series is None or len(series['date']) < 60:
+                reason = 'sem vendas' if series is None else f"apenas {len(series['date'])} dias com venda"
+                results.append(series_failure_frame(item_id, store_id, reason))
                 continue
-        
-        conn.close()
-        
-    except Exception as e:
-        print(f"❌ Erro fatal no batch: {str(e)[:200]}")
+            
+            # Categorias vêm da classificação da execução: sem DataFrame por item
+            item_char = {
+                'category': series['category'],
+                'brand': series['brand'],
+                **classifications.get(item_id, {'price_category': 'MEDIO', 'seasonality_category': 'ESTAVEL'})
+            }
+            
+            forecast_df = process_item_forecast(
+                None,
+                (item_id, store_id),
+                forecast_periods,
+                precomputed=precomputed.get((item_id, store_id)),
+                model_hints=model_hints.get((item_id, store_id)),
+                ts=matrix.series((item_id, store_id)),
+                ts_characteristics=series_traits.get((item_id, store_id)),
+                item_char=item_char,
+                segment_stats=win_rates.get((item_char['seasonality_category'], item_char['price_category'], store_id)),
+                models=model_routes.get((item_id, store_id)),
+                hw_engine=hw_engine
+            )
+            
+            if forecast_df is not None:
+                results.append(forecast_df)
+            else:
+                results.append(series_failure_frame(item_id, store_id, 'nenhum modelo gerou previsão'))
+            
+        except Exception as e:
+            print(f"⚠️  Erro no item {item_id}, loja {store_id}: {str(e)[:100]}")
+            results.append(series_failure_frame(item_id, store_id, f"{type(e).__name__}: {e}"))
+            continue
     
     return results
 
@@ -688,11 +1409,13 @@ def process_items_batch_safe(batch_items, pg_conn_str, forecast_periods, store_i
 # 4. FUNÇÃO PRINCIPAL EXECUTÁVEL PELO FLASK (AGORA COM PROGRESSO REAL)
 # =============================================================================
 
-def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', executed_by=None, store_ids=None):
+def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', executed_by=None, store_ids=None,
+                           execution_mode=None, xgboost_mode=None, hw_engine=None, force_full_refresh=False,
+                           keep_results=False, run_id=None):
     """
     Pipeline OTIMIZADO com:
-    - Threading (estável)
-    - Bulk insert (rápido)
+    - Threading (estável) ou processos (escala com os núcleos)
+    - Gravação contínua em segundo plano (bulk insert por bloco)
     - MLflow COMPLETO (todas métricas)
     - Seleção de lojas (NOVO)
     
@@ -703,6 +1426,19 @@ def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', ex
         executed_by: Quem executou (username ou 'system')
         store_ids: Lista de store_ids para processar (ex: [1, 2, 3])
                    Se None, processa todas as lojas
+        execution_mode: 'thread' ou 'process' (None = FORECAST_EXECUTION_MODE)
+        xgboost_mode: 'local' ou 'global' (None = FORECAST_XGBOOST_MODE)
+        hw_engine: 'statsmodels' ou 'numpy' (None = FORECAST_HW_ENGINE)
+        force_full_refresh: ignora o ledger e reajusta todas as séries
+        keep_results: mantém os forecasts em memória para o retorno (memória cresce com
+                      o número de séries); padrão False: o primeiro DataFrame volta vazio e a
+                      memória fica limitada à fila do writer - use summary['forecast_rows']
+        run_id: identificador da execução para checkpoint; repetir o mesmo run_id
+                (ex: retry do Airflow) retoma a execução pulando as séries já concluídas.
+                None = nova execução (forecast_<timestamp>)
+    
+    Returns:
+        (forecasts, resumo por série: store_id, item_id, best_model, métricas, forecast_rows)
     """
     global FORECAST_STATUS
     start_time = time.time()
@@ -713,6 +1449,7 @@ def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', ex
     execution_date = datetime.now()
     hostname = socket.gethostname()
     executed_by = executed_by or os.getenv('USER', 'system')
+    run_id = run_id or f"forecast_{execution_date.strftime('%Y%m%d_%H%M%S')}"
     
     mlflow_run = None
     if MLFLOW_AVAILABLE:
@@ -740,6 +1477,7 @@ def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', ex
                 mlflow.log_param("execution_timestamp", execution_date.isoformat())
                 mlflow.log_param("source", source)
                 mlflow.log_param("executed_by", executed_by)
+                mlflow.log_param("run_id", run_id)
                 print("✅ MLflow tracking iniciado")
                 
         except Exception as e:
@@ -811,10 +1549,95 @@ def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', ex
             return pd.DataFrame(), pd.DataFrame()
         
         FORECAST_STATUS['total'] = total_items
+        FORECAST_STATUS['progress'] = 5
+        
+        # ✅ CHECKPOINT: séries já concluídas neste run_id (execução retomada)
+        resumed_items = 0
+        try:
+            completed_series = load_completed_series(pg_conn_str, run_id)
+            if completed_series:
+                unique_items = [key for key in unique_items if key not in completed_series]
+                resumed_items = total_items - len(unique_items)
+                print(f"   ⏯️  Retomando {run_id}: {resumed_items} séries já concluídas, {len(unique_items)} restantes")
+        except Exception as e:
+            print(f"   ⚠️  Checkpoint indisponível: {str(e)[:100]}")
+        
+        # ✅ CARGA ÚNICA: uma query por loja em vez de uma por (item, loja)
+        print("   📥 Carregando séries (uma query por loja)...")
+        load_start = time.time()
+        load_timings = {}
+        series_data = load_active_series(pg_conn_str, unique_items, load_timings=load_timings)
+        load_time = time.time() - load_start
+        print(f"   ✅ Séries carregadas: {len(series_data)} em {load_time:.1f}s")
+        
+        # ✅ CLASSIFICAÇÃO da execução (preço/sazonalidade) sobre todas as séries ativas, antes do filtro
+        # incremental; com filtro de lojas ou retomada, series_data é parcial e a agregação vai ao banco
+        classification_start = time.time()
+        classifications, reclassified_items = resolve_classifications(
+            pg_conn_str, series_data, full_scope=not store_ids and not resumed_items
+        )
+        classification_time = time.time() - classification_start
+        print(f"   🏷️  Produtos classificados: {len(classifications)} itens "
+              f"({reclassified_items} reclassificados) em {classification_time:.1f}s")
+        
+        # ✅ INCREMENTAL: marca d'água por série (última venda + hash) vs ledger
+        fingerprints = {key: series_fingerprint(series) for key, series in series_data.items()}
+        skipped_unchanged = 0
+        if FORECAST_INCREMENTAL and not force_full_refresh:
+            try:
+                ledger = load_series_ledger(pg_conn_str, store_ids)
+                refresh_keys, unchanged_keys = select_series_to_refresh(
+                    fingerprints, ledger, MODEL_VERSION, forecast_periods, FORECAST_STALE_DAYS
+                )
+                skipped_unchanged = len(unchanged_keys)
+                refresh_set = set(refresh_keys)
+                unique_items = [key for key in unique_items if key in refresh_set]
+                series_data = {key: series_data[key] for key in refresh_keys}
+                print(f"   ♻️  Incremental: {len(refresh_keys)} séries a reajustar, "
+                      f"{skipped_unchanged} inalteradas (previsão anterior mantida)")
+            except Exception as e:
+                print(f"   ⚠️  Ledger indisponível, reprocessando tudo: {str(e)[:100]}")
+        else:
+            if force_full_refresh:
+                print("   🔁 Reprocessamento completo forçado")
+            try:
+                # Sem leitura do ledger nesta execução: garante a tabela para a gravação
+                create_series_ledger_table(pg_conn_str)
+            except Exception as e:
+                print(f"   ⚠️  Ledger indisponível: {str(e)[:100]}")
+        
+        total_items = len(unique_items)
+        FORECAST_STATUS['total'] = total_items
+        
+        # ✅ MATRIZ DIÁRIA: pivot único (n_series, n_days) lido pelos modelos via views
+        series_matrix = SeriesMatrix.from_series(series_data)
+        print(f"   🧱 Matriz diária: {series_matrix.values.shape[0]} séries x {series_matrix.values.shape[1]} dias "
+              f"({series_matrix.nbytes() / 1024**2:.1f} MB)")
+        
+        # ✅ CARACTERÍSTICAS em lote (tendência, lag 7, intermitência, ADF) para todas as séries
+        traits_start = time.time()
+        series_traits = characterize_series_matrix(series_matrix, forecast_periods)
+        traits_time = time.time() - traits_start
+        print(f"   🔬 Características calculadas: {len(series_traits)} séries em {traits_time:.1f}s")
         FORECAST_STATUS['progress'] = 10
         
         if mlflow_run:
+            mlflow.log_param("incremental", FORECAST_INCREMENTAL and not force_full_refresh)
             mlflow.log_metric("total_items_to_forecast", total_items)
+            mlflow.log_metric("series_skipped_unchanged", skipped_unchanged)
+            mlflow.log_metric("series_resumed_from_checkpoint", resumed_items)
+            mlflow.log_metric("series_load_time_seconds", load_time)
+            mlflow.log_metric("series_characterization_time_seconds", traits_time)
+            mlflow.log_metric("items_reclassified", reclassified_items)
+            mlflow.log_metric("product_classification_time_seconds", classification_time)
+        
+        if total_items == 0:
+            print("✅ Nenhuma série a processar (inalteradas ou já concluídas neste run_id)")
+            FORECAST_STATUS['progress'] = 100
+            if mlflow_run:
+                mlflow.log_param("status", "no_changes")
+                mlflow.end_run()
+            return pd.DataFrame(), pd.DataFrame()
         
     except Exception as e:
         print(f"❌ Erro ao buscar itens: {e}")
@@ -828,128 +1651,399 @@ def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', ex
     # ==========================================
     # 2. PROCESSAMENTO COM THREADING
     # ==========================================
-    print(f"[2/4] Processando com threading...")
+    execution_mode = execution_mode or FORECAST_EXECUTION_MODE
+    print(f"[2/4] Processando com {'processos' if execution_mode == 'process' else 'threading'}...")
     
-    num_workers = min(4, max(2, multiprocessing.cpu_count() - 2))
+    if execution_mode == 'process':
+        num_workers = FORECAST_PROCESS_WORKERS or max(1, multiprocessing.cpu_count() - 1)
+    else:
+        num_workers = min(4, max(2, multiprocessing.cpu_count() - 2))
     batch_size = 20
     
     print(f"   🔧 Workers: {num_workers}")
     print(f"   📦 Batch size: {batch_size}")
     
     batches = [unique_items[i:i + batch_size] for i in range(0, len(unique_items), batch_size)]
+    
+    # ✅ LPT: batches de custo parecido pelo tempo histórico das séries, mais caros primeiro
+    if FORECAST_SCHEDULING == 'lpt':
+        try:
+            series_costs = estimate_costs(unique_items, load_series_costs(pg_conn_str, store_ids))
+            fixed_batches = batches
+            batches = pack_batches_lpt(unique_items, series_costs, num_workers, batch_size)
+            fixed_makespan, fixed_idle = simulate_makespan(fixed_batches, series_costs, num_workers)
+            lpt_makespan, lpt_idle = simulate_makespan(batches, series_costs, num_workers)
+            if lpt_makespan > fixed_makespan:
+                batches, lpt_makespan, lpt_idle = fixed_batches, fixed_makespan, fixed_idle
+            print(f"   ⚖️  Agendamento LPT (estimado): makespan {fixed_makespan:.1f}s -> {lpt_makespan:.1f}s, "
+                  f"ocioso {fixed_idle:.1f}s -> {lpt_idle:.1f}s")
+            if mlflow_run:
+                mlflow.log_metric("schedule_fixed_makespan_seconds", fixed_makespan)
+                mlflow.log_metric("schedule_lpt_makespan_seconds", lpt_makespan)
+                mlflow.log_metric("schedule_idle_saved_seconds", fixed_idle - lpt_idle)
+        except Exception as e:
+            print(f"   ⚠️  Custos indisponíveis, batches fixos: {str(e)[:100]}")
     print(f"   📊 Total de batches: {len(batches)}")
     
+    if mlflow_run:
+        mlflow.log_param("execution_mode", execution_mode)
+        mlflow.log_param("num_workers", num_workers)
+        mlflow.log_param("single_fit", FORECAST_SINGLE_FIT)
+    
+    # ✅ TRIAGEM: séries paradas/esparsas saem dos modelos pesados
+    precomputed = {}
+    model_routes = {}
+    heavy_series = series_data
+    if FORECAST_TRIAGE:
+        triage_start = time.time()
+        routes = triage_series_matrix(
+            series_matrix, FORECAST_TRIAGE_ZERO_DAYS, FORECAST_TRIAGE_SPARSE_RATIO, FORECAST_TRIAGE_MIN_DAILY_MEAN
+        )
+        precomputed.update(zero_forecasts(
+            series_matrix, [key for key, route in routes.items() if route == 'zero'], forecast_periods
+        ))
+        precomputed.update(fit_batch_intermittent(
+            series_matrix, [key for key, route in routes.items() if route == 'sparse'], forecast_periods
+        ))
+        model_routes = {key: list(models) for key, models in precomputed.items()}
+        heavy_series = {key: series for key, series in series_data.items() if key not in model_routes}
+        route_counts = {route: list(routes.values()).count(route) for route in ('zero', 'sparse', 'full')}
+        triage_time = time.time() - triage_start
+        print(f"   🚦 Triagem: {route_counts['zero']} paradas (zero), {route_counts['sparse']} esparsas "
+              f"(Croston/SBA/TSB), {route_counts['full']} para modelos completos em {triage_time:.1f}s")
+        if mlflow_run:
+            mlflow.log_param("triage", True)
+            for route, count in route_counts.items():
+                mlflow.log_metric(f"triage_{route}_series", count)
+            mlflow.log_metric("triage_time_seconds", triage_time)
+    
+    # ✅ XGBoost GLOBAL: um treino por execução/segmento, previsão em lote
+    xgboost_mode = xgboost_mode or FORECAST_XGBOOST_MODE
+    if xgboost_mode == 'global':
+        print(f"   🌐 Treinando XGBoost global (segmento: {FORECAST_XGBOOST_SEGMENT or 'execução'})...")
+        xgb_start = time.time()
+        xgb_results = fit_global_xgboost(
+            heavy_series, forecast_periods, segment_by=FORECAST_XGBOOST_SEGMENT or None, matrix=series_matrix
+        )
+        for key, models in xgb_results.items():
+            precomputed.setdefault(key, {}).update(models)
+        xgb_time = time.time() - xgb_start
+        print(f"   ✅ XGBoost global: {len(xgb_results)} séries em {xgb_time:.1f}s")
+        if mlflow_run:
+            mlflow.log_param("xgboost_mode", xgboost_mode)
+            mlflow.log_metric("global_xgboost_time_seconds", xgb_time)
+    
+    # ✅ Holt-Winters VETORIZADO: todas as séries ajustadas de uma vez
+    hw_engine = hw_engine or FORECAST_HW_ENGINE
+    if hw_engine == 'numpy':
+        print("   📐 Ajustando Holt-Winters vetorizado...")
+        hw_start = time.time()
+        hw_results = fit_batch_holt_winters(
+            heavy_series, forecast_periods, reuse_backtest_fit=FORECAST_SINGLE_FIT, matrix=series_matrix
+        )
+        for key, models in hw_results.items():
+            precomputed.setdefault(key, {}).update(models)
+        hw_time = time.time() - hw_start
+        print(f"   ✅ Holt-Winters vetorizado: {len(hw_results)} séries em {hw_time:.1f}s")
+        if mlflow_run:
+            mlflow.log_param("hw_engine", hw_engine)
+            mlflow.log_metric("vectorized_hw_time_seconds", hw_time)
+    
     all_forecasts = []
+    summary_rows = []
     completed = 0
     lock = threading.Lock()
     
-    with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        # ✅ PASSAR store_ids PARA A FUNÇÃO
+    # ✅ Ordens ARIMA da execução anterior (cache persistente por loja/item)
+    try:
+        model_hints = {key: {'arima': hint} for key, hint in load_arima_orders(pg_conn_str, store_ids).items()}
+        print(f"   🧮 Ordens ARIMA em cache: {len(model_hints)}")
+    except Exception as e:
+        print(f"   ⚠️  Cache de ordens ARIMA indisponível: {str(e)[:100]}")
+        model_hints = {}
+    arima_orders = {}
+    
+    # ✅ Histórico de vitórias por segmento (poda de modelos)
+    win_rates = {}
+    if FORECAST_MODEL_PRUNING:
+        try:
+            win_rates = load_win_rates(pg_conn_str, store_ids)
+            print(f"   🏆 Taxas de vitória carregadas: {len(win_rates)} segmentos "
+                  f"(mín. {FORECAST_PRUNING_MIN_WIN_RATE:.0%}, exploração {FORECAST_PRUNING_EXPLORE_RATE:.0%})")
+        except Exception as e:
+            print(f"   ⚠️  Taxas de vitória indisponíveis, seleção completa: {str(e)[:100]}")
+    selection_outcomes = []
+    series_timings = {}
+    metric_rows = []
+    selection_stats = {'fits': 0, 'pruned': 0, 'explored': 0}
+    budget_stats = {'series_budget': 0, 'model_budget': 0, 'fallback': 0}
+    
+    def persist_forecasts(df):
+        """Grava um bloco de forecasts e avança o ledger das séries gravadas"""
+        save_forecasts_to_db(df, pg_conn_str)
+        keys = [key for key in df[['item_id', 'store_id']].drop_duplicates().itertuples(index=False, name=None)
+                if key in fingerprints]
+        try:
+            row_counts = {key: len(series_data[key]['date']) for key in keys}
+            save_series_ledger(pg_conn_str, fingerprints, keys, MODEL_VERSION, forecast_periods, row_counts)
+        except Exception as e:
+            print(f"⚠️  Erro ao atualizar ledger: {str(e)[:100]}")
+    
+    shared_store = None
+    time_limit = None
+    if execution_mode == 'process':
+        # ✅ Séries vão para memória compartilhada; tarefas levam só os offsets
+        shared_store = SharedSeriesStore.from_series(series_data)
+        create_executor = lambda: create_process_executor(shared_store, num_workers, FORECAST_MAX_TASKS_PER_CHILD)
+        submit_batch = lambda executor, batch: executor.submit(
+            process_shared_batch, shared_store.batch_entries(batch), forecast_periods,
+            {key: precomputed[key] for key in batch if key in precomputed},
+            {key: model_hints[key] for key in batch if key in model_hints},
+            {item_id: classifications[item_id] for item_id, _ in batch if item_id in classifications},
+            win_rates,
+            {key: model_routes[key] for key in batch if key in model_routes},
+            hw_engine
+        )
+        print(f"   ♻️  Reciclagem de workers a cada {FORECAST_MAX_TASKS_PER_CHILD} batches")
+        if FORECAST_SERIES_HARD_LIMIT > 0:
+            # ✅ Prazo rígido: o batch que estourar tem os workers terminados
+            time_limit = lambda batch: FORECAST_SERIES_HARD_LIMIT * len(batch) + FORECAST_WORKER_START_SECONDS
+            print(f"   ⏱️  Prazo rígido: {FORECAST_SERIES_HARD_LIMIT:.0f}s por série")
+    else:
+        create_executor = lambda: ThreadPoolExecutor(max_workers=num_workers)
+        # ✅ Workers consomem as séries já carregadas em memória
         process_func = partial(
             process_items_batch_safe,
-            pg_conn_str=pg_conn_str,
+            series_data=series_data,
             forecast_periods=forecast_periods,
-            store_ids=store_ids  # ✅ NOVO
+            precomputed=precomputed,
+            model_hints=model_hints,
+            matrix=series_matrix,
+            series_traits=series_traits,
+            classifications=classifications,
+            win_rates=win_rates,
+            model_routes=model_routes,
+            hw_engine=hw_engine
         )
-        
-        futures = {executor.submit(process_func, batch): i for i, batch in enumerate(batches)}
-        
-        for future in as_completed(futures):
-            batch_idx = futures[future]
+        submit_batch = lambda executor, batch: executor.submit(process_func, batch)
+    
+    def checkpoint_series(keys, df):
+        """Marca como concluídas no run_id as séries de batches já gravados"""
+        with_forecast = set(df[['item_id', 'store_id']].drop_duplicates().itertuples(index=False, name=None)) if len(df) else set()
+        try:
+            mark_series_completed(pg_conn_str, run_id, [key for key in keys if key in with_forecast], has_forecast=True)
+            mark_series_completed(pg_conn_str, run_id, [key for key in keys if key not in with_forecast], has_forecast=False)
+        except Exception as e:
+            print(f"⚠️  Erro ao gravar checkpoint: {str(e)[:100]}")
+    
+    # ✅ Métricas seguem pelo writer a cada bloco: uma execução interrompida mantém as já gravadas
+    persist_metrics = None
+    try:
+        create_run_metrics_table(pg_conn_str)
+        persist_metrics = partial(save_run_metrics, pg_conn_str, create_table=False)
+    except Exception as e:
+        print(f"⚠️  Tabela de métricas indisponível, métricas não serão gravadas: {str(e)[:100]}")
+    
+    # ✅ Writer em segundo plano: grava os batches conforme terminam
+    writer = ForecastWriter(
+        persist_forecasts, max_pending=FORECAST_WRITER_QUEUE_SIZE, flush_rows=FORECAST_WRITER_FLUSH_ROWS,
+        on_flush=checkpoint_series, persist_metrics=persist_metrics
+    ).start()
+    
+    loop_start = time.time()
+    batches_done = 0
+    try:
+        # Com prazo rígido, um batch em voo por worker (o prazo conta do envio)
+        max_in_flight = num_workers if time_limit else 2 * num_workers
+        # Falha na gravação: para de submitir (o writer descartaria tudo) e só recolhe o que está em voo
+        for batch, batch_results, batch_error in run_batches(create_executor, submit_batch, batches,
+                                                              max_in_flight, time_limit=time_limit,
+                                                              stop=lambda: writer.error is not None):
+            batches_done += 1
             batch_start_time = time.time()
-            
+        
             try:
-                batch_results = future.result(timeout=300)
+                if isinstance(batch_error, BatchTimeoutError):
+                    # Série descartada pelo prazo rígido: entra nas métricas e no checkpoint
+                    batch_results = [series_failure_frame(batch[0][0], batch[0][1], batch_error)]
+                elif batch_error is not None:
+                    raise batch_error
                 batch_time = time.time() - batch_start_time
                 
+                batch_metrics = []
+                for df in batch_results:
+                    key = df.attrs['series_failure'][:2] if 'series_failure' in df.attrs else None
+                    if key is None and len(df) > 0:
+                        key = (df['item_id'].iat[0], df['store_id'].iat[0])
+                    batch_metrics.extend(series_metric_rows(run_id, df, load_timings.get(key)))
+            
+                writer.put(batch_results, keys=batch, metrics=batch_metrics)
+                
                 with lock:
-                    all_forecasts.extend(batch_results)
-                    completed += len(batches[batch_idx])
-                    
+                    metric_rows.extend(batch_metrics)
+                    for df in batch_results:
+                        for event in df.attrs.get('budget_events', []):
+                            budget_stats[event['event']] += 1
+                    batch_results = [df for df in batch_results if df is not None and len(df) > 0]
+                    if keep_results:
+                        all_forecasts.extend(batch_results)
+                    completed += len(batch)
+                
                     FORECAST_STATUS['completed'] = completed
                     progress = 10 + int(75 * (completed / total_items))
                     FORECAST_STATUS['progress'] = min(85, progress)
-                    
+                
                     # Stats detalhados
                     for df in batch_results:
                         if df is not None and len(df) > 0:
                             row = df.iloc[0]
-                            stats['successful'] += 1
                             
+                            arima_hint = df.attrs.get('model_hints', {}).get('arima')
+                            if arima_hint:
+                                arima_orders[(row['item_id'], row['store_id'])] = arima_hint
+                            if df.attrs.get('model_timings'):
+                                series_timings[(row['item_id'], row['store_id'])] = df.attrs['model_timings']
+                            selection = df.attrs.get('model_selection')
+                            if selection:
+                                selection_outcomes.append(selection)
+                                selection_stats['fits'] += selection['fits']
+                                selection_stats['pruned'] += len(selection['pruned'])
+                                selection_stats['explored'] += int(selection['explored'])
+                            summary_rows.append({
+                                'store_id': row['store_id'], 'item_id': row['item_id'],
+                                'best_model': row['best_model'], 'model_rmse': row['model_rmse'],
+                                'model_mape': row['model_mape'], 'model_mae': row['model_mae'],
+                                'forecast_rows': len(df),
+                            })
+                            stats['successful'] += 1
+                        
                             model = row['best_model']
                             stats['by_model'][model] = stats['by_model'].get(model, 0) + 1
-                            
+                        
                             store = row['store_id']
                             if store not in stats['by_store']:
                                 stats['by_store'][store] = {'total': 0, 'mape_sum': 0}
                             stats['by_store'][store]['total'] += 1
                             stats['by_store'][store]['mape_sum'] += row['model_mape']
-                            
+                        
                             stats['mape_values'].append(row['model_mape'])
                             stats['rmse_values'].append(row['model_rmse'])
                             stats['mae_values'].append(row['model_mae'])
-                    
+                
                     # Tempo do batch
                     if batch_results:
-                        avg_time_per_item_in_batch = batch_time / len(batches[batch_idx])
+                        avg_time_per_item_in_batch = batch_time / len(batch)
                         stats['execution_times'].append(avg_time_per_item_in_batch)
-                
-                print(f"   ✅ Batch {batch_idx+1}/{len(batches)}: {len(batch_results)} forecasts | "
+            
+                print(f"   ✅ Batch {batches_done}: {len(batch_results)} forecasts | "
                       f"Total: {completed}/{total_items} ({completed/total_items*100:.1f}%) | "
                       f"Tempo: {batch_time:.1f}s")
-                
-            except TimeoutError:
-                print(f"   ⏱️  Timeout no batch {batch_idx+1}")
-                with lock:
-                    stats['failed'] += len(batches[batch_idx])
-                    stats['errors'].append({
-                        'batch': batch_idx,
-                        'error': 'Timeout após 300s'
-                    })
-                    completed += len(batches[batch_idx])
-                
+            
             except Exception as e:
-                print(f"   ❌ Erro no batch {batch_idx+1}: {str(e)[:100]}")
+                print(f"   ❌ Erro no batch {batches_done}: {str(e)[:100]}")
                 with lock:
-                    stats['failed'] += len(batches[batch_idx])
+                    stats['failed'] += len(batch)
                     stats['errors'].append({
-                        'batch': batch_idx,
+                        'batch': batches_done,
                         'error': str(e)[:200]
                     })
-                    completed += len(batches[batch_idx])
+                    completed += len(batch)
+    finally:
+        if shared_store is not None:
+            shared_store.close()
+        
+        # ==========================================
+        # 3. GRAVAÇÃO FINAL (resto da fila do writer)
+        # ==========================================
+        print("[3/4] Gravando últimos batches...")
+        writer.close()
+    
+    if writer.error is not None:
+        # Séries já gravadas ficam no checkpoint: a próxima execução retoma do run_id
+        print(f"❌ Erro ao salvar, execução interrompida após {batches_done}/{len(batches)} batches: {writer.error}")
+        FORECAST_STATUS['error'] = str(writer.error)
+        if mlflow_run:
+            mlflow.log_param("save_error", str(writer.error)[:200])
+            mlflow.log_param("status", "failed_save")
+            mlflow.end_run()
+        raise RuntimeError(f"Falha na gravação dos forecasts: {writer.error}") from writer.error
+    
+    # Skew real: tempo de ajuste somado das séries vs capacidade dos workers no laço
+    loop_time = time.time() - loop_start
+    busy_time = sum(sum(models.values()) for models in series_timings.values())
+    if loop_time > 0:
+        utilization = busy_time / (num_workers * loop_time)
+        print(f"   ⚖️  Utilização dos workers: {utilization:.0%} "
+              f"(ocioso: {max(0.0, num_workers * loop_time - busy_time):.1f}s de {num_workers * loop_time:.1f}s)")
+        if mlflow_run:
+            mlflow.log_param("scheduling", FORECAST_SCHEDULING)
+            mlflow.log_metric("worker_utilization", utilization)
+    try:
+        if persist_metrics is not None:
+            print(f"   📏 Métricas da execução gravadas: {len(metric_rows)} linhas (run_id {run_id})")
+        if mlflow_run and FORECAST_METRICS_PARQUET:
+            log_metrics_artifact(mlflow, metric_rows, run_id)
+    except Exception as e:
+        print(f"⚠️  Erro ao gravar métricas da execução: {str(e)[:100]}")
+    try:
+        save_series_costs(pg_conn_str, series_timings)
+    except Exception as e:
+        print(f"⚠️  Erro ao gravar custo das séries: {str(e)[:100]}")
     
     stats['total_items'] = completed
     stats['failed'] = completed - stats['successful']
     
-    if not all_forecasts:
+    if not summary_rows:
         print("❌ Nenhum forecast gerado")
         if mlflow_run:
             mlflow.log_param("status", "failed_no_forecasts")
             mlflow.end_run()
         return pd.DataFrame(), pd.DataFrame()
     
-    # ==========================================
-    # 3. CONSOLIDAÇÃO
-    # ==========================================
-    print("[3/4] Consolidando resultados...")
-    final_df = pd.concat(all_forecasts, ignore_index=True)
     FORECAST_STATUS['progress'] = 90
-    
-    print(f"   ✅ Total de forecasts: {len(final_df)}")
+    print(f"   ✅ Forecasts gravados: {writer.rows_written} linhas em {writer.flushes} gravações")
     
     # ==========================================
-    # 4. BULK SAVE
+    # 4. CONSOLIDAÇÃO
     # ==========================================
-    print("[4/4] Salvando no banco (bulk insert)...")
+    print("[4/4] Consolidando resultados...")
+    final_df = pd.concat(all_forecasts, ignore_index=True) if all_forecasts else pd.DataFrame()
+    summary_df = pd.DataFrame(summary_rows)
+    FORECAST_STATUS['progress'] = 95
+    
+    if mlflow_run:
+        mlflow.log_metric("forecast_rows_written", writer.rows_written)
+        mlflow.log_metric("writer_flushes", writer.flushes)
     
     try:
-        save_forecasts_to_db(final_df, pg_conn_str)
-        FORECAST_STATUS['progress'] = 95
+        record_model_outcomes(pg_conn_str, selection_outcomes)
+        print(f"   🏆 Seleção: {selection_stats['fits']} ajustes, {selection_stats['pruned']} modelos podados, "
+              f"{selection_stats['explored']} séries em exploração")
     except Exception as e:
-        print(f"❌ Erro ao salvar: {e}")
-        FORECAST_STATUS['error'] = str(e)
-        if mlflow_run:
-            mlflow.log_param("save_error", str(e)[:200])
+        print(f"⚠️  Erro ao gravar taxas de vitória: {str(e)[:100]}")
+    
+    if mlflow_run:
+        mlflow.log_param("model_pruning", FORECAST_MODEL_PRUNING)
+        mlflow.log_metric("model_fits_total", selection_stats['fits'])
+        mlflow.log_metric("models_pruned", selection_stats['pruned'])
+        mlflow.log_metric("pruning_explored_series", selection_stats['explored'])
+    
+    if any(budget_stats.values()):
+        print(f"   ⏱️  Orçamento de tempo: {budget_stats['model_budget']} modelos interrompidos, "
+              f"{budget_stats['series_budget']} modelos pulados (série esgotada), "
+              f"{budget_stats['fallback']} séries no baseline ({FORECAST_BUDGET_FALLBACK_MODEL})")
+    if mlflow_run:
+        mlflow.log_param("series_time_budget", FORECAST_SERIES_TIME_BUDGET)
+        mlflow.log_param("model_time_budget", FORECAST_MODEL_TIME_BUDGET)
+        mlflow.log_metric("budget_model_timeouts", budget_stats['model_budget'])
+        mlflow.log_metric("budget_models_skipped", budget_stats['series_budget'])
+        mlflow.log_metric("budget_fallback_series", budget_stats['fallback'])
+    
+    try:
+        save_arima_orders(pg_conn_str, arima_orders)
+        print(f"   🧮 Ordens ARIMA gravadas no cache: {len(arima_orders)}")
+    except Exception as e:
+        print(f"⚠️  Erro ao gravar cache de ordens ARIMA: {str(e)[:100]}")
     
     # ==========================================
     # MÉTRICAS MLFLOW COMPLETAS
@@ -976,4 +2070,4 @@ def main_forecast_pipeline(pg_conn_str, forecast_periods=60, source='manual', ex
     print(f"🤖 Modelos usados: {list(stats['by_model'].keys())}")
     print("="*60)
     
-    return final_df, final_df
\ No newline at end of file
+    return final_df, summary_df
\ No newline at end of file
@@ -6,7 +6,6 @@ from .transfer import start_transfer_orders_thread, start_transfer_stock_thread
 from .transfer import start_transfer_sales_thread
 from .forecasting_service import (
     main_forecast_pipeline, 
-    save_forecasts_to_db,
     FORECAST_STATUS,
     FORECAST_TASK_RUNNING
 )
@@ -66,13 +65,14 @@ def start_transfer():
 def progress():
     return jsonify({
         "progress": progress_state.get("percent", 0),
+        "processed": progress_state.get("processed"),
         "error": progress_state.get("error")
     })
 
 @app.route('/progress_orders', methods=['GET'])
 def progress_orders():
     state = progress_state.get("orders", {"percent": 0, "error": None})
-    return jsonify({"progress": state.get("percent", 0), "error": state.get("error")})
+    return jsonify({"progress": state.get("percent", 0), "processed": state.get("processed"), "error": state.get("error")})
 
 @app.route('/start_transfer_orders', methods=['POST'])
 def start_transfer_orders():
@@ -116,7 +116,7 @@ def start_transfer_stock():
 @app.route('/progress_stock', methods=['GET'])
 def progress_stock():
     state = progress_state.get("stock", {"percent": 0, "error": None})
-    return jsonify({"progress": state.get("percent", 0), "error": state.get("error")})
+    return jsonify({"progress": state.get("percent", 0), "processed": state.get("processed"), "error": state.get("error")})
 
 @app.route('/start_transfer_sales', methods=['POST'])
 def start_transfer_sales():
@@ -132,7 +132,7 @@ def start_transfer_sales():
 @app.route('/progress_sales', methods=['GET'])
 def progress_sales():
     state = progress_state.get("sales", {"percent": 0, "error": None})
-    return jsonify({"progress": state.get("percent", 0), "error": state.get("error")})
+    return jsonify({"progress": state.get("percent", 0), "processed": state.get("processed"), "error": state.get("error")})
 
 def run_forecast_task_in_background():
     """Função wrapper para rodar o pipeline na thread e atualizar o status."""
@@ -142,16 +142,13 @@ def run_forecast_task_in_background():
     FORECAST_TASK_RUNNING = True
 
     try:
-        results, summary = main_forecast_pipeline(Config.POSTGRES_CONNECTION_STRING)
+        _, summary = main_forecast_pipeline(Config.POSTGRES_CONNECTION_STRING, keep_results=False)
         
         if summary is not None and not summary.empty:
-            FORECAST_STATUS['progress'] = 95 
-            
-            save_forecasts_to_db(summary, Config.POSTGRES_CONNECTION_STRING)
-            
+            # Forecasts já gravados pelo writer do pipeline; summary tem uma linha por série
             FORECAST_STATUS['data'] = summary.to_dict('records')
             FORECAST_STATUS['progress'] = 100
-            message = f"Previsão concluída com sucesso! {len(summary)} registros salvos."
+            message = f"Previsão concluída com sucesso! {int(summary['forecast_rows'].sum())} registros salvos."
         else:
             message = "Previsão concluída, mas nenhum dado gerado."
 
@@ -190,6 +187,7 @@ def start_forecast():
     # Pegar store_ids do request
     data = request.get_json()
     store_ids = data.get('store_ids', [])
+    force_full_refresh = bool(data.get('force_full_refresh', False))
     
     if not store_ids:
         return jsonify({
@@ -232,16 +230,19 @@ def start_forecast():
             
             from app.forecasting_service import main_forecast_pipeline
             
-            result_df, summary_df = main_forecast_pipeline(
+            # Forecasts gravados pelo writer do pipeline: só o resumo volta para a memória
+            _, summary_df = main_forecast_pipeline(
                 Config.POSTGRES_CONNECTION_STRING,
                 forecast_periods=60,
                 source='web_ui',
                 executed_by='user',
-                store_ids=store_ids
+                store_ids=store_ids,
+                force_full_refresh=force_full_refresh,
+                keep_results=False
             )
             
             FORECAST_STATUS['data'] = {
-                'total': len(result_df),
+                'total': int(summary_df['forecast_rows'].sum()) if not summary_df.empty else 0,
                 'stores': store_ids,
                 'summary': summary_df.to_dict() if not summary_df.empty else {}
             }
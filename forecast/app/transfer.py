@@ -1,13 +1,48 @@
 import csv
+import hashlib
 import io
+import itertools
+import os
 import psycopg2
 import pyodbc
+import resource
+import sys
 import time
 from datetime import datetime
 from flask import current_app
 from threading import Thread
 from psycopg2.extras import execute_values
 
+from app.utils.pg_binary_copy import BinaryCopyWriter
+from app.utils.transfer_pipeline import run_transfer_pipeline
+
+# Blocos em espera entre leitura, transformação e carga (contrapressão)
+TRANSFER_QUEUE_SIZE = int(os.getenv('TRANSFER_QUEUE_SIZE', '4'))
+
+# Formato do COPY para as tabelas temporárias: 'binary' (padrão) ou 'csv'
+TRANSFER_COPY_FORMAT = os.getenv('TRANSFER_COPY_FORMAT', 'binary').lower()
+
+# 1 = conta as linhas da origem antes de ler (percentual exato, mas uma varredura a mais no SQL Server);
+# desligado, o progresso informa as linhas processadas
+TRANSFER_COUNT_SOURCE_ROWS = os.getenv('TRANSFER_COUNT_SOURCE_ROWS', '0') == '1'
+
+# 1 = transfer_bi_productos reenvia todo o catálogo, ignorando os hashes gravados
+TRANSFER_ITEMS_FULL_REFRESH = os.getenv('TRANSFER_ITEMS_FULL_REFRESH', '0') == '1'
+
+# Tipos binários na ordem das colunas de cada tabela temporária (precisam bater com o CREATE TEMP TABLE)
+SUPPLIER_COPY = BinaryCopyWriter(('int4', 'text', 'bool', 'timestamp'))
+ITEM_COPY = BinaryCopyWriter((
+    'text', 'text', 'numeric', 'int4', 'text', 'numeric', 'numeric',
+    'text', 'text', 'text', 'text', 'text', 'text', 'numeric', 'text',
+    'bool', 'bool', 'numeric', 'text', 'timestamp', 'text',
+))
+ORDER_COPY = BinaryCopyWriter((
+    'int4', 'int4', 'int4', 'text', 'numeric', 'bool',
+    'date', 'date', 'date', 'numeric', 'numeric', 'numeric',
+))
+STOCK_COPY = BinaryCopyWriter(('text', 'text', 'numeric'))
+SALE_COPY = BinaryCopyWriter(('text', 'int4', 'date', 'int4', 'int8', 'numeric', 'numeric', 'timestamp', 'int8'))
+
 
 # Variável global para progresso (pode melhorar com armazenagem compartilhada)
 progress_state = {
@@ -41,6 +76,115 @@ def chunks(iterable, size):
     if batch:
         yield batch
 
+def stream_rows(cursor, chunk_size):
+    """
+    Lê o resultado do cursor em blocos de chunk_size (fetchmany): só um bloco de
+    linhas fica em memória e cada bloco é gravado antes da leitura do próximo.
+    """
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def copy_buffer(writer, rows, fmt=None):
+    """Serializa as linhas para o COPY: binário (writer) ou CSV '|' (fmt/TRANSFER_COPY_FORMAT='csv')"""
+    if (fmt or TRANSFER_COPY_FORMAT) == 'csv':
+        output = io.StringIO()
+        writer = csv.writer(output, delimiter='|', quoting=csv.QUOTE_MINIMAL)
+        for row in rows:
+            writer.writerow([v if v is not None else '' for v in row])
+        output.seek(0)
+        return output
+    # No CSV a string vazia vira NULL; mantém o mesmo resultado no binário
+    return writer.encode([None if v == '' else v for v in row] for row in rows)
+
+def copy_into(cur, target, output):
+    """COPY target FROM STDIN no formato do buffer gerado por copy_buffer"""
+    options = "FORMAT BINARY" if isinstance(output, io.BytesIO) else "FORMAT CSV, DELIMITER '|'"
+    cur.copy_expert(f"COPY {target} FROM STDIN WITH ({options})", output)
+
+def create_item_hash_table(cur):
+    """Hash do conteúdo de cada item de bi_productos na última carga (fora de items_item, que é do Django)"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS transfer_item_hashes (
+            code TEXT PRIMARY KEY,
+            row_hash VARCHAR(32) NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+
+def load_item_hashes(cur):
+    """
+    {code: row_hash} da última carga. Antes descarta os hashes de itens que não
+    existem mais em items_item, para que um item apagado no Postgres volte a ser inserido.
+    """
+    create_item_hash_table(cur)
+    cur.execute("""
+        DELETE FROM transfer_item_hashes h
+        WHERE NOT EXISTS (SELECT 1 FROM items_item i WHERE i.code = h.code)
+    """)
+    if cur.rowcount:
+        print(f"Hashes descartados de itens ausentes em items_item: {cur.rowcount}")
+    cur.execute("SELECT code, row_hash FROM transfer_item_hashes")
+    return dict(cur.fetchall())
+
+def item_row_hash(values):
+    """Hash estável dos campos de origem de um item (sem created_at)"""
+    return hashlib.blake2b(repr(tuple(values)).encode('utf-8'), digest_size=16).hexdigest()
+
+def current_wal_lsn(cur):
+    """Posição atual do WAL (None se indisponível, p.ex. em réplica)"""
+    try:
+        cur.execute("SELECT pg_current_wal_lsn()")
+        return cur.fetchone()[0]
+    except Exception:
+        cur.connection.rollback()
+        return None
+
+def wal_bytes_since(cur, start_lsn):
+    """Bytes de WAL gerados desde start_lsn (inclui outras sessões do servidor)"""
+    if start_lsn is None:
+        return None
+    try:
+        cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", (start_lsn,))
+        return int(cur.fetchone()[0])
+    except Exception:
+        cur.connection.rollback()
+        return None
+
+def count_source_rows(cursor, query):
+    """
+    Total de linhas da query no SQL Server (para o progresso).
+    None se TRANSFER_COUNT_SOURCE_ROWS estiver desligado ou a contagem falhar.
+    """
+    if not TRANSFER_COUNT_SOURCE_ROWS:
+        return None
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM ({query}) AS src")
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Contagem de registros indisponível: {e}")
+        return None
+
+def report_progress(state, processed, total):
+    """Atualiza o progresso: percentual quando há total, senão só as linhas processadas"""
+    state['processed'] = processed
+    if total:
+        state['percent'] = min(99, int(processed / total * 100))
+        print(f"Progresso: {state['percent']}% ({processed}/{total})")
+    else:
+        print(f"Progresso: {processed} registros processados")
+
+def current_rss_mb():
+    """Memória residente atual do processo (MB); fora do Linux, o pico do processo"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
 def transfer_bi_sucursales(sql_conn_str, pg_conn_str):
     try:
         query = 'SELECT cod_sucursal, nombre_sucursal FROM bi_sucursales'
@@ -135,8 +279,20 @@ def transfer_bi_proveedores(sql_conn_str, pg_conn_str):
         task_running['supplier'] = False        
         return f"Ocorreu erro na transferência de fornecedores: {str(e)}"
 
-def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
+def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000, full_refresh=None):
+    """
+    Carrega bi_productos em suppliers_supplier/items_item. Só itens novos ou com
+    hash diferente do gravado em transfer_item_hashes são enviados ao Postgres
+    (full_refresh=True, ou TRANSFER_ITEMS_FULL_REFRESH=1, reenvia todos).
+
+    O hash cobre só a linha de origem: um item apagado de items_item tem o hash
+    descartado e é reinserido, mas um item editado direto no Postgres (admin,
+    script) não é corrigido enquanto não mudar no SQL Server - nesse caso, use
+    a carga completa.
+    """
     global progress_state, task_running
+    if full_refresh is None:
+        full_refresh = TRANSFER_ITEMS_FULL_REFRESH
     try:
         progress_state['percent'] = 0
         progress_state['error'] = None
@@ -154,8 +310,13 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                     precio_costo, nivel1, nivel2, nivel3, nivel4, nivel5, marca, precio_vta, 
                     codigo_barra, Desactivado_compra, DESACTIVADO, precio_matriz,
                     cod_proveedor_principal, proveedor_principal
-            FROM bi_productos;
+            FROM bi_productos
         """
+        total = count_source_rows(mssql_cursor, query)
+        if total is not None:
+            print(f"Total de registros no SQL Server: {total}")
+
+        start_rss = peak_rss = current_rss_mb()
         mssql_cursor.execute(query)
         row = mssql_cursor.fetchone()
 
@@ -165,10 +326,11 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                 print(f"{col_name}: {value}")
         else:
             print("Nenhum registro encontrado.") 
-                   
-        rows = mssql_cursor.fetchall()
-        total = len(rows)
-        print(f"Total de registros lidos do SQL Server: {total}")
+        
+        # Leitura em blocos (fetchmany); a primeira linha, já lida acima, entra no primeiro bloco
+        row_chunks = stream_rows(mssql_cursor, chunk_size)
+        if row:
+            row_chunks = itertools.chain([[row] + (next(row_chunks, None) or [])], row_chunks)
 
         # ================= PostgreSQL =================
         print("Conectando ao PostgreSQL...")
@@ -176,16 +338,29 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
         pg_cursor = pg_conn.cursor()
         print("Conexão PostgreSQL estabelecida.")
 
+        # Hashes da última carga: linhas iguais nem chegam ao COPY
+        known_hashes = {} if full_refresh else load_item_hashes(pg_cursor)
+        if full_refresh:
+            create_item_hash_table(pg_cursor)
+        pg_conn.commit()
+        print(f"Hashes de itens conhecidos: {len(known_hashes)}" + (" (carga completa)" if full_refresh else ""))
+        start_lsn = current_wal_lsn(pg_cursor)
+        item_counts = {'unchanged': 0, 'inserted': 0, 'updated': 0}
+
         processed = 0
 
-        # ================= Loop em chunks =================
-        print(f"Iniciando processamento em chunks de {chunk_size} registros...")
-        for start in range(0, total, chunk_size):
-            end = min(start + chunk_size, total)
-            chunk = rows[start:end]
+        def on_chunk(n_rows):
+            nonlocal processed, peak_rss
+            processed += n_rows
+            peak_rss = max(peak_rss, current_rss_mb())
+            report_progress(progress_state, processed, total)
 
+        # ================= Transformação (thread própria) =================
+        def transform(chunk):
             supplier_values = []
             item_values = []
+            # Contado aqui e somado em item_counts só na carga (uma única thread escreve)
+            unchanged = 0
 
             for row in chunk:
                 (
@@ -204,6 +379,19 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                 sale_price = truncate_numeric(sale_price)
                 matriz_price = truncate_numeric(matriz_price)
 
+                # Linha idêntica à da última carga: não reenvia item nem fornecedor
+                row_hash = item_row_hash((
+                    code, name, pack_size, min_size, unit_of_measure,
+                    purchase_price, cost_price,
+                    nivel1, nivel2, nivel3, nivel4, nivel5,
+                    brand, sale_price, ean,
+                    is_disabled_purchase, is_disabled,
+                    matriz_price, supplier_code, supplier_name
+                ))
+                if known_hashes.get(str(code)) == row_hash:
+                    unchanged += 1
+                    continue
+
                 # suppliers
                 if supplier_code:
                     supplier_values.append((
@@ -220,11 +408,11 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                     nivel1, nivel2, nivel3, nivel4, nivel5,
                     brand, sale_price, ean,
                     is_disabled_purchase, is_disabled,
-                    matriz_price, supplier_code, datetime.utcnow()
+                    matriz_price, supplier_code, datetime.utcnow(), row_hash
                 ))
 
-            # ================= SUPPLIERS =================
-            print("Upsert de fornecedores...")
+            # Fornecedores: deduplicação e CSV
+            supplier_output = None
             if supplier_values:
                 print(f'Pré-processamento concluído. Fornecedores antes da deduplicação: {len(supplier_values)}')
 
@@ -236,13 +424,37 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                 supplier_values = [(code, *values) for code, values in unique_suppliers.items()]
                 print(f'Fornecedores após deduplicação: {len(supplier_values)}')
 
-                # Converte explicitamente code para int na geração do CSV
-                output = io.StringIO()
-                writer = csv.writer(output, delimiter='|', quoting=csv.QUOTE_MINIMAL)
-                for code, name, active, created_at in supplier_values:
-                    writer.writerow([int(code), name, active, created_at.isoformat()])
-                output.seek(0)
+                # Converte explicitamente code para int (coluna INTEGER)
+                supplier_output = copy_buffer(SUPPLIER_COPY, [
+                    (int(code), name, active, created_at)
+                    for code, name, active, created_at in supplier_values
+                ])
+
+            # Itens: deduplicação e CSV
+            item_output = None
+            if item_values:
+                # Deduplica por código
+                unique_items = {}
+                for row in item_values:
+                    code = row[0]  # índice do código em item_values
+                    unique_items[code] = row  # mantem o último registro para código duplicado
 
+                item_values = list(unique_items.values())
+                print(f"Itens após deduplicação: {len(item_values)}")
+
+                item_output = copy_buffer(ITEM_COPY, item_values)
+
+            return supplier_output, item_output, unchanged
+
+        # ================= Carga no PostgreSQL (thread chamadora) =================
+        def load(payload):
+            supplier_output, item_output, unchanged = payload
+            item_counts['unchanged'] += unchanged
+
+            # ================= SUPPLIERS =================
+            print("Upsert de fornecedores...")
+            if supplier_output is not None:
+                output = supplier_output
                 print('Preparando para criar (ou limpar) a tabela tmp_suppliers...')
                 with pg_conn.cursor() as cur:
                     # Cria a tabela temporária com código do tipo INTEGER
@@ -262,10 +474,7 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
 
                     try:
                         # Carrega dados via COPY
-                        cur.copy_expert(
-                            "COPY tmp_suppliers (code, name, active, created_at) FROM STDIN WITH (FORMAT CSV, DELIMITER '|')",
-                            output
-                        )
+                        copy_into(cur, "tmp_suppliers (code, name, active, created_at)", output)
                         print("COPY executado.")
                     except Exception as e:
                         print("Erro no COPY:", e)
@@ -288,6 +497,8 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                                 name = EXCLUDED.name,
                                 active = EXCLUDED.active,
                                 updated_at = NOW()
+                            WHERE (suppliers_supplier.name, suppliers_supplier.active)
+                                IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.active)
                         """)
 
                         print("Upsert executado.")
@@ -297,26 +508,10 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
 
                     pg_conn.commit()
                     print("Commit realizado.")
-
             # ================= ITEMS =================
             print("Upsert de itens...")
-            if item_values:
-                # Deduplica por código
-                unique_items = {}
-                for row in item_values:
-                    code = row[0]  # índice do código em item_values
-                    unique_items[code] = row  # mantem o último registro para código duplicado
-
-                item_values = list(unique_items.values())
-                print(f"Itens após deduplicação: {len(item_values)}")
-
-                output = io.StringIO()
-                writer = csv.writer(output, delimiter='|', quoting=csv.QUOTE_MINIMAL)
-                for row in item_values:
-                # for row in filtered:
-                    writer.writerow([v if v is not None else '' for v in row])
-                output.seek(0)
-
+            if item_output is not None:
+                output = item_output
                 try:
                     with pg_conn.cursor() as cur:
                         cur.execute("""
@@ -340,15 +535,13 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                                 is_disabled BOOLEAN,
                                 matriz_price NUMERIC,
                                 supplier_code TEXT,
-                                created_at TIMESTAMP
+                                created_at TIMESTAMP,
+                                row_hash TEXT
                             ) ON COMMIT DROP;
                         """)
                         print("Tabela temporária tmp_items criada.")
                         # Imprime o CSV completo para debugar
-                        cur.copy_expert(
-                            "COPY tmp_items FROM STDIN WITH (FORMAT CSV, DELIMITER '|')",
-                            output
-                        )
+                        copy_into(cur, "tmp_items", output)
                         print("COPY para tmp_items executado.")
                       
                         # Relatório de fornecedores faltantes
@@ -424,40 +617,84 @@ def transfer_bi_productos(sql_conn_str, pg_conn_str, chunk_size=5000):
                                 is_disabled_purchase = EXCLUDED.is_disabled_purchase,
                                 is_disabled = EXCLUDED.is_disabled,
                                 matriz_price = EXCLUDED.matriz_price,
-                                supplier_id = EXCLUDED.supplier_id;
+                                supplier_id = EXCLUDED.supplier_id
+                            WHERE (
+                                items_item.name, items_item.pack_size, items_item.min_size, items_item.unit_of_measure,
+                                items_item.purchase_price, items_item.cost_price, items_item.section, items_item.subsection,
+                                items_item.nivel3, items_item.nivel4, items_item.nivel5, items_item.brand,
+                                items_item.sale_price, items_item.ean, items_item.is_disabled_purchase,
+                                items_item.is_disabled, items_item.matriz_price, items_item.supplier_id
+                            ) IS DISTINCT FROM (
+                                EXCLUDED.name, EXCLUDED.pack_size, EXCLUDED.min_size, EXCLUDED.unit_of_measure,
+                                EXCLUDED.purchase_price, EXCLUDED.cost_price, EXCLUDED.section, EXCLUDED.subsection,
+                                EXCLUDED.nivel3, EXCLUDED.nivel4, EXCLUDED.nivel5, EXCLUDED.brand,
+                                EXCLUDED.sale_price, EXCLUDED.ean, EXCLUDED.is_disabled_purchase,
+                                EXCLUDED.is_disabled, EXCLUDED.matriz_price, EXCLUDED.supplier_id
+                            )
+                            RETURNING (xmax = 0) AS inserted;
+                        """)
+                        # Linhas que não voltam no RETURNING já estavam iguais em items_item
+                        upserted = [inserted for inserted, in cur.fetchall()]
+                        inserted_count = sum(upserted)
+                        cur.execute("SELECT COUNT(*) FROM tmp_items")
+                        staged = cur.fetchone()[0]
+                        item_counts['inserted'] += inserted_count
+                        item_counts['updated'] += len(upserted) - inserted_count
+                        item_counts['unchanged'] += staged - len(upserted)
+                        print(f"Upsert em items_item executado: {inserted_count} inseridos, "
+                              f"{len(upserted) - inserted_count} alterados, {staged - len(upserted)} sem mudança.")
+
+                        # Grava os hashes na mesma transação do upsert
+                        cur.execute("""
+                            INSERT INTO transfer_item_hashes (code, row_hash, updated_at)
+                            SELECT code, row_hash, NOW() FROM tmp_items
+                            ON CONFLICT (code) DO UPDATE SET
+                                row_hash = EXCLUDED.row_hash,
+                                updated_at = NOW()
                         """)
-                        print("Upsert em items_item executado.")
                         pg_conn.commit()
                         print("Commit realizado.")
 
                 except Exception as e:
                     print("Erro na transferência dos itens:", e)
-                    progress_state['percent'] = 0
-                    progress_state['error'] = str(e)
-                    task_running['bi_productos'] = False
                     pg_conn.rollback()
-                    return f"Erro na transferência de produtos: {str(e)}"
+                    raise
 
-            # ================= Commit e progresso =================
             pg_conn.commit()
-            processed += len(chunk)
 
-            progress_state['percent'] = int(processed / total * 100)
-            print(f"Progresso: {progress_state['percent']}% ({processed}/{total})")
+        # ================= Pipeline: leitura | transformação | carga =================
+        print(f"Iniciando processamento em chunks de {chunk_size} registros...")
+        pipeline_stats = run_transfer_pipeline(
+            row_chunks, transform, load,
+            queue_size=TRANSFER_QUEUE_SIZE, on_chunk=on_chunk
+        )
+        print(pipeline_stats.summary())
 
         # ================= Finalização =================
+        wal_bytes = wal_bytes_since(pg_cursor, start_lsn)
         mssql_cursor.close()
         mssql_conn.close()
         pg_cursor.close()
         pg_conn.close()
 
         progress_state['percent'] = 100
+        progress_state['peak_rss_mb'] = round(peak_rss, 1)
+        progress_state['pipeline'] = pipeline_stats.as_dict()
+        progress_state['items'] = dict(item_counts, wal_bytes=wal_bytes)
+        print(f"Pico de memória: {peak_rss:.0f} MB (início {start_rss:.0f} MB)")
+        print(f"Itens: {item_counts['inserted']} inseridos, {item_counts['updated']} alterados, "
+              f"{item_counts['unchanged']} sem mudança")
+        if wal_bytes is not None:
+            print(f"WAL gerado: {wal_bytes / 1024 ** 2:.1f} MB")
         print("Transferência concluída com sucesso!")
         task_running['bi_productos'] = False
-        return f"Transferência concluída! Total processado: {processed} registros."
+        return (f"Transferência concluída! Total processado: {processed} registros "
+                f"({item_counts['inserted']} inseridos, {item_counts['updated']} alterados, "
+                f"{item_counts['unchanged']} sem mudança).")
 
     except Exception as e:
         progress_state['percent'] = 0
+        progress_state['error'] = str(e)
         task_running['bi_productos'] = False
         return f"Erro na transferência de produtos: {str(e)}"
 
@@ -482,21 +719,25 @@ def transfer_orders(sql_conn_str, pg_conn_str, chunk_size=5000):
         WHERE r.fecha >= '2025-07-01'
         AND r.nro_pedido = ocfe.NRO_OC
         AND r.codigo = ocfe.codigo
-        ORDER BY r.nro_pedido DESC;
         """
-        mssql_cursor.execute(query)
-        rows = mssql_cursor.fetchall()
-        total = len(rows)
-        print(f"Total de ordens lidas: {total}")
+        total = count_source_rows(mssql_cursor, query)
+        if total is not None:
+            print(f"Total de ordens no SQL Server: {total}")
+
+        start_rss = peak_rss = current_rss_mb()
+        mssql_cursor.execute(query + " ORDER BY r.nro_pedido DESC")
 
         print("Conectando ao PostgreSQL...")
         pg_conn = psycopg2.connect(pg_conn_str)
         processed = 0
 
-        for start in range(0, total, chunk_size):
-            end = min(start + chunk_size, total)
-            chunk = rows[start:end]
+        def on_chunk(n_rows):
+            nonlocal processed, peak_rss
+            processed += n_rows
+            peak_rss = max(peak_rss, current_rss_mb())
+            report_progress(progress_state['orders'], processed, total)
 
+        def transform(chunk):
             order_values = []
             for row in chunk:
                 (
@@ -521,6 +762,10 @@ def transfer_orders(sql_conn_str, pg_conn_str, chunk_size=5000):
                     float(precio) if precio else 0.0
                 ])
 
+            # Buffer para COPY
+            return copy_buffer(ORDER_COPY, order_values)
+
+        def load(output):
             with pg_conn.cursor() as cur:
                 # Tabela temporária p/ ordens
                 cur.execute("""
@@ -541,17 +786,7 @@ def transfer_orders(sql_conn_str, pg_conn_str, chunk_size=5000):
                 """)
                 cur.execute("TRUNCATE tmp_orders;")
 
-                # CSV para COPY
-                output = io.StringIO()
-                writer = csv.writer(output, delimiter='|', quoting=csv.QUOTE_MINIMAL)
-                for vals in order_values:
-                    writer.writerow([v if v is not None else '' for v in vals])
-                output.seek(0)
-
-                cur.copy_expert(
-                    "COPY tmp_orders FROM STDIN WITH (FORMAT CSV, DELIMITER '|')",
-                    output
-                )
+                copy_into(cur, "tmp_orders", output)
 
                 # Upsert para orders_ordersystem
                 cur.execute("""
@@ -598,15 +833,20 @@ def transfer_orders(sql_conn_str, pg_conn_str, chunk_size=5000):
                 """)
                 pg_conn.commit()                
 
-            processed += len(chunk)
-            progress_state['orders']['percent'] = int(processed / total * 100)
-            print(f"Progresso: {progress_state['orders']['percent']}% ({processed}/{total})")
+        pipeline_stats = run_transfer_pipeline(
+            stream_rows(mssql_cursor, chunk_size), transform, load,
+            queue_size=TRANSFER_QUEUE_SIZE, on_chunk=on_chunk
+        )
+        print(pipeline_stats.summary())
 
         mssql_cursor.close()
         mssql_conn.close()
         pg_conn.close()
 
         progress_state['orders']['percent'] = 100
+        progress_state['orders']['peak_rss_mb'] = round(peak_rss, 1)
+        progress_state['orders']['pipeline'] = pipeline_stats.as_dict()
+        print(f"Pico de memória: {peak_rss:.0f} MB (início {start_rss:.0f} MB)")
         task_running['orders'] = False
         print("Transferência de ordens concluída!")
         return "Transferência de ordens concluída!"
@@ -631,19 +871,24 @@ def transfer_stock(sql_conn_str, pg_conn_str, chunk_size=5000):
             FROM bi_stock bs
             GROUP BY bs.codigo, bs.cod_sucursal
         """
+        total = count_source_rows(mssql_cursor, query)
+        if total is not None:
+            print(f"Total de itens de estoque no SQL Server: {total}")
+
+        start_rss = peak_rss = current_rss_mb()
         mssql_cursor.execute(query)
-        rows = mssql_cursor.fetchall()
-        total = len(rows)
-        print(f"Total de itens de estoque lidos: {total}")
 
         print("Conectando ao PostgreSQL...")
         pg_conn = psycopg2.connect(pg_conn_str)
         processed = 0
 
-        for start in range(0, total, chunk_size):
-            end = min(start + chunk_size, total)
-            chunk = rows[start:end]
+        def on_chunk(n_rows):
+            nonlocal processed, peak_rss
+            processed += n_rows
+            peak_rss = max(peak_rss, current_rss_mb())
+            report_progress(progress_state['stock'], processed, total)
 
+        def transform(chunk):
             stock_values = []
             for row in chunk:
                 codigo, cod_sucursal, cantidad = row
@@ -653,6 +898,9 @@ def transfer_stock(sql_conn_str, pg_conn_str, chunk_size=5000):
                     float(cantidad) if cantidad is not None else 0.0
                 ])
 
+            return copy_buffer(STOCK_COPY, stock_values)
+
+        def load(output):
             with pg_conn.cursor() as cur:
                 cur.execute("""
                     CREATE TEMP TABLE IF NOT EXISTS tmp_stock (
@@ -663,16 +911,7 @@ def transfer_stock(sql_conn_str, pg_conn_str, chunk_size=5000):
                 """)
                 cur.execute("TRUNCATE tmp_stock;")
 
-                output = io.StringIO()
-                writer = csv.writer(output, delimiter='|', quoting=csv.QUOTE_MINIMAL)
-                for vals in stock_values:
-                    writer.writerow([v if v is not None else '' for v in vals])
-                output.seek(0)
-
-                cur.copy_expert(
-                    "COPY tmp_stock FROM STDIN WITH (FORMAT CSV, DELIMITER '|')",
-                    output
-                )
+                copy_into(cur, "tmp_stock", output)
 
                 # Atualização/Upsert do estoque
                 # Se não existe, cria. Se existe, atualiza.
@@ -715,15 +954,20 @@ def transfer_stock(sql_conn_str, pg_conn_str, chunk_size=5000):
                 """)
                 pg_conn.commit()
 
-            processed += len(chunk)
-            progress_state['stock']['percent'] = int(processed / total * 100)
-            print(f"Progresso: {progress_state['stock']['percent']}% ({processed}/{total})")
+        pipeline_stats = run_transfer_pipeline(
+            stream_rows(mssql_cursor, chunk_size), transform, load,
+            queue_size=TRANSFER_QUEUE_SIZE, on_chunk=on_chunk
+        )
+        print(pipeline_stats.summary())
 
         mssql_cursor.close()
         mssql_conn.close()
         pg_conn.close()
 
         progress_state['stock']['percent'] = 100
+        progress_state['stock']['peak_rss_mb'] = round(peak_rss, 1)
+        progress_state['stock']['pipeline'] = pipeline_stats.as_dict()
+        print(f"Pico de memória: {peak_rss:.0f} MB (início {start_rss:.0f} MB)")
         task_running['stock'] = False
         print("Transferência de estoque concluída!")
         return "Transferência de estoque concluída!"
@@ -735,20 +979,118 @@ def transfer_stock(sql_conn_str, pg_conn_str, chunk_size=5000):
         print("Erro ao transferir estoque:", e)
         return f"Erro: {str(e)}"
 
+def prepare_sales_ledger(cur):
+    """
+    Ledger das execuções de transfer_sales: intervalo de datas de cada execução
+    e último nro_reg já gravado, atualizado no mesmo commit de cada bloco; e as
+    linhas de origem descartadas na conversão, para não sumirem atrás do
+    last_nro_reg. A chave única sales_sale.source_nro_reg vem da migration
+    0013 do Django (sales).
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS transfer_sales_runs (
+            run_id SERIAL PRIMARY KEY,
+            from_date DATE NOT NULL,
+            to_date DATE NOT NULL,
+            last_nro_reg BIGINT,
+            status VARCHAR(20) NOT NULL DEFAULT 'running',
+            rows_read BIGINT NOT NULL DEFAULT 0,
+            rows_inserted BIGINT NOT NULL DEFAULT 0,
+            rows_duplicated BIGINT NOT NULL DEFAULT 0,
+            rows_rejected BIGINT NOT NULL DEFAULT 0,
+            error TEXT,
+            started_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            finished_at TIMESTAMP
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS transfer_sales_rejects (
+            nro_reg BIGINT PRIMARY KEY,
+            run_id INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            source_row TEXT,
+            rejected_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+
+def open_sales_run(cur, today):
+    """
+    Execução a processar: a última não concluída (retomada a partir do seu
+    last_nro_reg) ou uma nova, de onde a última concluída parou até ontem.
+
+    Returns:
+        (run_id, from_date, to_date, last_nro_reg, resumed)
+    """
+    cur.execute("""
+        SELECT run_id, from_date, to_date, last_nro_reg
+        FROM transfer_sales_runs
+        WHERE status <> 'completed'
+        ORDER BY run_id DESC
+        LIMIT 1
+    """)
+    pending = cur.fetchone()
+    if pending:
+        run_id, from_date, to_date, last_nro_reg = pending
+        cur.execute("""
+            UPDATE transfer_sales_runs
+            SET status = 'running', error = NULL, updated_at = NOW()
+            WHERE run_id = %s
+        """, (run_id,))
+        return run_id, from_date, to_date, last_nro_reg, True
+
+    cur.execute("SELECT MAX(to_date) FROM transfer_sales_runs WHERE status = 'completed'")
+    from_date = cur.fetchone()[0]
+    if from_date is None:
+        # Primeira execução com ledger: continua do dia seguinte à maior data já gravada
+        cur.execute("SELECT COALESCE(MAX(date), '2000-01-01') + 1 FROM sales_sale;")
+        from_date = cur.fetchone()[0]
+
+    cur.execute("""
+        INSERT INTO transfer_sales_runs (from_date, to_date)
+        VALUES (%s, %s)
+        RETURNING run_id
+    """, (from_date, today))
+    return cur.fetchone()[0], from_date, today, None, False
+
+def finish_sales_run(pg_conn_str, run_id, error=None):
+    """Fecha a execução no ledger (conexão própria: a da carga pode estar abortada)"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE transfer_sales_runs
+        SET status = %s, error = %s, updated_at = NOW(),
+            finished_at = CASE WHEN %s THEN NOW() END
+        WHERE run_id = %s
+    """, ('failed' if error else 'completed', error, error is None, run_id))
+    conn.commit()
+    cur.close()
+    conn.close()
+
 def transfer_sales(sql_conn_str, pg_conn_str, chunk_size=5000):
+    """
+    Importa as vendas de bi_compra_venta para sales_sale em blocos idempotentes.
 
+    Cada bloco (ordenado por nro_reg) entra com ON CONFLICT (source_nro_reg)
+    DO NOTHING e avança last_nro_reg no ledger no mesmo commit. Uma execução
+    interrompida é retomada na próxima chamada a partir do último bloco gravado,
+    sem reprocessar o intervalo de datas inteiro nem duplicar vendas.
+    """
     global progress_state, task_running
     progress_state['sales'] = {"percent": 0, "error": None}
-    
+    run_id = None
+
     try:
         # Conexão PostgreSQL
         pg_conn = psycopg2.connect(pg_conn_str)
         pg_cursor = pg_conn.cursor()
-        pg_cursor.execute("SELECT COALESCE(MAX(date), '2000-01-01') FROM sales_sale;")
-        max_date = pg_cursor.fetchone()[0]
-        print(f"Maior data já gravada em Sale: {max_date}")
-
-        today_str = datetime.today().strftime('%Y-%m-%d')
+        prepare_sales_ledger(pg_cursor)
+        run_id, from_date, to_date, last_nro_reg, resumed = open_sales_run(pg_cursor, datetime.today().date())
+        pg_conn.commit()
+        if resumed:
+            print(f"Retomando execução {run_id} ({from_date} a {to_date}) após nro_reg {last_nro_reg}")
+        else:
+            print(f"Execução {run_id}: vendas de {from_date} até {to_date} (exclusive)")
 
         # Conexão SQL Server
         mssql_conn = pyodbc.connect(sql_conn_str)
@@ -758,14 +1100,14 @@ def transfer_sales(sql_conn_str, pg_conn_str, chunk_size=5000):
                    bcv.cod_sucursal, bcv.codigo, bcv.cant_vta, bcv.ventas_det_precio_neto 
             FROM pegasus.dbo.bi_compra_venta AS bcv
             WHERE bcv.tipo = 'VENTA'
-              AND bcv.fecha > '{max_date}'
-              AND bcv.fecha < '{today_str}'
-            ORDER BY bcv.nro_reg DESC
+              AND bcv.fecha >= '{from_date:%Y-%m-%d}'
+              AND bcv.fecha < '{to_date:%Y-%m-%d}'
         """
-        mssql_cursor.execute(sql_server_query)
-        rows = mssql_cursor.fetchall()
-        total = len(rows)
-        print(f"Registros de venda filtrados para importação: {total}")
+        if last_nro_reg is not None:
+            sql_server_query += f"  AND bcv.nro_reg > {int(last_nro_reg)}\n"
+        total = count_source_rows(mssql_cursor, sql_server_query)
+        if total is not None:
+            print(f"Registros de venda filtrados para importação: {total}")
 
         # Cache de lojas e itens como sets para verificação de existência
         pg_cursor.execute("SELECT code FROM stores_store;")
@@ -774,13 +1116,23 @@ def transfer_sales(sql_conn_str, pg_conn_str, chunk_size=5000):
         pg_cursor.execute("SELECT code FROM items_item;")
         item_codes = {str(code).strip() for (code,) in pg_cursor.fetchall()}
 
-        # Processamento em chunks
+        # Processamento em chunks, lidos do SQL Server sob demanda (fetchmany).
+        # Ordem crescente de nro_reg: last_nro_reg do ledger marca tudo o que já foi gravado.
+        start_rss = peak_rss = current_rss_mb()
+        mssql_cursor.execute(sql_server_query + " ORDER BY bcv.nro_reg ASC")
+
         processed = 0
+        sale_counts = {'inserted': 0, 'duplicated': 0, 'rejected': 0}
+
+        def on_chunk(n_rows):
+            nonlocal processed, peak_rss
+            processed += n_rows
+            peak_rss = max(peak_rss, current_rss_mb())
+            report_progress(progress_state['sales'], processed, total)
 
-        for start in range(0, total, chunk_size):
-            end = min(start + chunk_size, total)
-            chunk = rows[start:end]
+        def transform(chunk):
             sale_values = []
+            rejects = []
 
             for row in chunk:
                 try:
@@ -793,6 +1145,7 @@ def transfer_sales(sql_conn_str, pg_conn_str, chunk_size=5000):
 
                     # Verifique existência no cadastro de lojas e itens
                     if store_code not in store_codes or item_code not in item_codes:
+                        rejects.append((int(nro_reg), 'loja ou item fora do cadastro', repr(tuple(row))))
                         continue
 
                     # Converta os códigos para inteiro para garantir compatibilidade com bigint/integer
@@ -810,19 +1163,20 @@ def transfer_sales(sql_conn_str, pg_conn_str, chunk_size=5000):
                         item_id_int,
                         quantity,
                         price,
-                        datetime.now()  # created_at
+                        datetime.now(),  # created_at
+                        int(nro_reg)
                     ))
 
                 except Exception as e:
                     print(f"Erro ao processar linha: {row}\n{e}")
+                    rejects.append((int(row[0]), f"{type(e).__name__}: {e}", repr(tuple(row))))
 
-            with pg_conn.cursor() as cur:
-                output = io.StringIO()
-                writer = csv.writer(output, delimiter='|', quoting=csv.QUOTE_MINIMAL)
-                for vals in sale_values:
-                    writer.writerow([v if v is not None else '' for v in vals])
-                output.seek(0)
+            # O cursor do ledger avança também sobre as linhas descartadas, que ficam em transfer_sales_rejects
+            return copy_buffer(SALE_COPY, sale_values), rejects, int(chunk[-1][0]), len(chunk)
 
+        def load(payload):
+            output, rejects, chunk_last_nro_reg, n_read = payload
+            with pg_conn.cursor() as cur:
                 cur.execute("""
                     CREATE TEMP TABLE IF NOT EXISTS tmp_sales (
                         ticket_number TEXT,
@@ -832,41 +1186,90 @@ def transfer_sales(sql_conn_str, pg_conn_str, chunk_size=5000):
                         item_id BIGINT,
                         quantity NUMERIC,
                         price NUMERIC,
-                        created_at TIMESTAMP
+                        created_at TIMESTAMP,
+                        source_nro_reg BIGINT
                     ) ON COMMIT DROP;
                 """)
                 cur.execute("TRUNCATE tmp_sales;")
-                cur.copy_expert(
-                    "COPY tmp_sales FROM STDIN WITH (FORMAT CSV, DELIMITER '|')",
-                    output
-                )
+                copy_into(cur, "tmp_sales", output)
+                cur.execute("SELECT COUNT(*) FROM tmp_sales;")
+                staged = cur.fetchone()[0]
 
-                # Inserção em sales_sale
+                # Inserção em sales_sale; nro_reg já gravado (rerun/retomada) é ignorado
                 cur.execute("""
                     INSERT INTO sales_sale (
-                        ticket_number, store_id, date, time, item_id, quantity, price, created_at
+                        ticket_number, store_id, date, time, item_id, quantity, price, created_at, source_nro_reg
                     )
                     SELECT
-                        ticket_number, store_id, date, time, item_id, quantity, price, created_at
-                    FROM tmp_sales;
+                        ticket_number, store_id, date, time, item_id, quantity, price, created_at, source_nro_reg
+                    FROM tmp_sales
+                    ON CONFLICT (source_nro_reg) DO NOTHING;
+                """)
+                inserted = cur.rowcount
+                sale_counts['inserted'] += inserted
+                sale_counts['duplicated'] += staged - inserted
+                sale_counts['rejected'] += len(rejects)
+
+                # Descartes do bloco; um nro_reg rejeitado antes e gravado agora sai da lista
+                cur.execute("""
+                    DELETE FROM transfer_sales_rejects r
+                    USING tmp_sales t
+                    WHERE r.nro_reg = t.source_nro_reg
                 """)
+                if rejects:
+                    execute_values(cur, """
+                        INSERT INTO transfer_sales_rejects (nro_reg, run_id, reason, source_row)
+                        VALUES %s
+                        ON CONFLICT (nro_reg) DO UPDATE SET
+                            run_id = EXCLUDED.run_id,
+                            reason = EXCLUDED.reason,
+                            source_row = EXCLUDED.source_row,
+                            rejected_at = NOW()
+                    """, [(nro_reg, run_id, reason, source_row) for nro_reg, reason, source_row in rejects])
+
+                # Marca d'água do bloco no mesmo commit das vendas
+                cur.execute("""
+                    UPDATE transfer_sales_runs
+                    SET last_nro_reg = %s,
+                        rows_read = rows_read + %s,
+                        rows_inserted = rows_inserted + %s,
+                        rows_duplicated = rows_duplicated + %s,
+                        rows_rejected = rows_rejected + %s,
+                        updated_at = NOW()
+                    WHERE run_id = %s
+                """, (chunk_last_nro_reg, n_read, inserted, staged - inserted, len(rejects), run_id))
                 pg_conn.commit()
 
-            processed += len(chunk)
-            progress_state['sales']['percent'] = int(processed / total * 100)
-            print(f"Progresso: {progress_state['sales']['percent']}% ({processed}/{total})")
+        pipeline_stats = run_transfer_pipeline(
+            stream_rows(mssql_cursor, chunk_size), transform, load,
+            queue_size=TRANSFER_QUEUE_SIZE, on_chunk=on_chunk
+        )
+        print(pipeline_stats.summary())
 
         mssql_cursor.close()
         mssql_conn.close()
         pg_cursor.close()
         pg_conn.close()
+        finish_sales_run(pg_conn_str, run_id)
 
         progress_state['sales']['percent'] = 100
+        progress_state['sales']['peak_rss_mb'] = round(peak_rss, 1)
+        progress_state['sales']['pipeline'] = pipeline_stats.as_dict()
+        progress_state['sales']['run_id'] = run_id
+        progress_state['sales'].update(sale_counts)
+        print(f"Pico de memória: {peak_rss:.0f} MB (início {start_rss:.0f} MB)")
+        print(f"Vendas: {sale_counts['inserted']} inseridas, {sale_counts['duplicated']} já existentes, "
+              f"{sale_counts['rejected']} descartadas (transfer_sales_rejects)")
         task_running['sales'] = False
         print("Transferência de vendas concluída!")
-        return "Transferência de vendas concluída!"
+        return f"Transferência de vendas concluída! {sale_counts['inserted']} vendas inseridas."
 
     except Exception as e:
+        if run_id is not None:
+            try:
+                finish_sales_run(pg_conn_str, run_id, error=str(e))
+            except Exception as ledger_error:
+                print("Erro ao registrar falha no ledger de vendas:", ledger_error)
         progress_state['sales']['percent'] = 0
         progress_state['sales']['error'] = str(e)
         task_running['sales'] = False
@@ -0,0 +1,102 @@
+# app/utils/arima_order_cache.py
+"""
+Cache persistente da ordem (p,d,q) do ARIMA escolhida para cada (loja, item).
+Execuções seguintes partem da última ordem e só refazem a busca stepwise
+quando o ajuste piora.
+"""
+import psycopg2
+import psycopg2.extras
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_arima_order_table(pg_conn_str):
+    """Cria tabela do cache de ordens ARIMA"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_arima_order_cache (
+            store_id INTEGER NOT NULL,
+            item_id BIGINT NOT NULL,
+            p SMALLINT NOT NULL,
+            d SMALLINT NOT NULL,
+            q SMALLINT NOT NULL,
+            aic_per_obs DOUBLE PRECISION,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (store_id, item_id)
+        );
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_arima_order_cache criada/verificada")
+
+
+def load_arima_orders(pg_conn_str, store_ids=None):
+    """
+    Carrega as ordens em cache.
+
+    Returns:
+        dict {(item_id, store_id): {'order': (p, d, q), 'aic_per_obs': float}}
+    """
+    create_arima_order_table(pg_conn_str)
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    if store_ids:
+        cur.execute("""
+            SELECT store_id, item_id, p, d, q, aic_per_obs
+            FROM forecast_arima_order_cache
+            WHERE store_id = ANY(%s)
+        """, (list(store_ids),))
+    else:
+        cur.execute("SELECT store_id, item_id, p, d, q, aic_per_obs FROM forecast_arima_order_cache")
+
+    orders = {
+        (item_id, store_id): {'order': (p, d, q), 'aic_per_obs': aic_per_obs}
+        for store_id, item_id, p, d, q, aic_per_obs in cur.fetchall()
+    }
+    cur.close()
+    conn.close()
+    return orders
+
+
+def save_arima_orders(pg_conn_str, orders):
+    """
+    Grava (upsert) as ordens escolhidas nesta execução.
+
+    Args:
+        orders: dict {(item_id, store_id): {'order': (p, d, q), 'aic_per_obs': float}}
+    """
+    if not orders:
+        return
+
+    records = [
+        (int(store_id), int(item_id), *map(int, hint['order']), float(hint['aic_per_obs']))
+        for (item_id, store_id), hint in orders.items()
+    ]
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO forecast_arima_order_cache (store_id, item_id, p, d, q, aic_per_obs)
+            VALUES %s
+            ON CONFLICT (store_id, item_id) DO UPDATE SET
+                p = EXCLUDED.p,
+                d = EXCLUDED.d,
+                q = EXCLUDED.q,
+                aic_per_obs = EXCLUDED.aic_per_obs,
+                updated_at = NOW()
+        """, records, page_size=1000)
+        conn.commit()
+        logger.info(f"{len(records)} ordens ARIMA gravadas no cache")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,114 @@
+# app/utils/batch_runner.py
+"""
+Despacho dos batches do forecast com prazo rígido no modo 'process'.
+
+O orçamento cooperativo (time_budget) não alcança um ajuste preso dentro do
+Stan ou do otimizador do statsmodels. Aqui cada batch tem um prazo de parede:
+só há um batch em voo por worker (o prazo conta a partir do envio), e um batch
+que estoura tem os processos do pool terminados. O pool é recriado, os demais
+batches em voo voltam para a fila e o batch estourado é refeito série a série;
+uma série sozinha que estoura de novo é descartada com BatchTimeoutError.
+
+Threads não podem ser terminadas: no modo 'thread' o prazo não se aplica e o
+limite fica por conta do orçamento cooperativo e do teto de iterações.
+"""
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class BatchTimeoutError(Exception):
+    """Série que estourou o prazo rígido mesmo processada sozinha"""
+
+
+def _terminate_pool(executor):
+    """
+    Termina os processos do pool (inclusive o que está preso num ajuste).
+
+    ProcessPoolExecutor não expõe seus workers: usa o atributo interno
+    _processes ({pid: Process}) do CPython (3.8 a 3.13). Sem ele (outra versão
+    ou implementação, ou executor de threads), só cancela o que está na fila
+    com shutdown(wait=False, cancel_futures=True) - o worker preso segue até
+    terminar o ajuste, e o pool novo é criado ao lado dele.
+    """
+    processes = getattr(executor, '_processes', None)
+    if isinstance(processes, dict):
+        for process in list(processes.values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+    elif isinstance(executor, ProcessPoolExecutor):
+        logger.warning("Workers do pool inacessíveis: o batch estourado não pode ser interrompido")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batches(create_executor, submit, batches, max_in_flight, time_limit=None, stop=None):
+    """
+    Executa os batches e entrega os resultados conforme terminam.
+
+    Args:
+        create_executor: função() que cria o executor (chamada de novo após terminar o pool)
+        submit: função(executor, batch) -> Future
+        batches: lista de listas de (item_id, store_id)
+        max_in_flight: batches submetidos ao mesmo tempo (= workers com time_limit)
+        time_limit: função(batch) -> segundos de prazo do batch (None/0 = sem prazo);
+                    exige executor de processos
+        stop: função() -> bool; verdadeira, nada mais é submetido e o laço termina
+              depois dos batches já em voo
+
+    Yields:
+        (batch, resultados, erro) - resultados é None quando erro não é None
+    """
+    pending = deque(batches)
+    in_flight = {}
+    executor = create_executor()
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < max_in_flight and not (stop and stop()):
+                batch = pending.popleft()
+                limit = time_limit(batch) if time_limit else None
+                deadline = time.monotonic() + limit if limit else float('inf')
+                in_flight[submit(executor, batch)] = (batch, deadline)
+            if not in_flight:
+                break
+
+            next_deadline = min(deadline for _, deadline in in_flight.values())
+            timeout = None if next_deadline == float('inf') else max(0.0, next_deadline - time.monotonic())
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                batch, _ = in_flight.pop(future)
+                try:
+                    yield batch, future.result(), None
+                except Exception as e:
+                    yield batch, None, e
+
+            now = time.monotonic()
+            expired = [future for future, (_, deadline) in in_flight.items() if deadline <= now]
+            if not expired:
+                continue
+
+            # Prazo estourado: derruba o pool inteiro e recomeça o que estava em voo
+            logger.warning(f"{len(expired)} batch(es) estouraram o prazo rígido; reiniciando o pool")
+            _terminate_pool(executor)
+            retry = []
+            for future, (batch, _) in in_flight.items():
+                if future not in expired:
+                    retry.append(batch)
+                elif len(batch) > 1:
+                    # Refaz série a série para isolar a que travou
+                    retry.extend([key] for key in batch)
+                else:
+                    yield batch, None, BatchTimeoutError(f"série {batch[0]} excedeu o prazo rígido")
+            in_flight = {}
+            pending.extendleft(reversed(retry))
+            executor = create_executor()
+    finally:
+        if in_flight:
+            _terminate_pool(executor)
+        else:
+            executor.shutdown(wait=True)
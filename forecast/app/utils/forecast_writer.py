@@ -0,0 +1,110 @@
+# app/utils/forecast_writer.py
+"""
+Gravação contínua dos forecasts: os batches concluídos entram numa fila
+limitada e uma thread em segundo plano os grava no banco em blocos de
+~flush_rows linhas. A memória fica limitada ao tamanho da fila + bloco, e o
+que já foi gravado sobrevive a uma falha no fim da execução. As métricas de
+cada batch seguem junto e são gravadas no mesmo bloco.
+"""
+import logging
+import queue
+import threading
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Marca de fim da fila
+_STOP = object()
+
+
+class ForecastWriter:
+    """Thread gravadora alimentada por uma fila limitada de listas de DataFrames"""
+
+    def __init__(self, persist_func, max_pending=8, flush_rows=20000, on_flush=None, persist_metrics=None):
+        """
+        Args:
+            persist_func: função(df) que grava um bloco (ex: save_forecasts_to_db + ledger)
+            max_pending: batches aguardando na fila antes de bloquear os produtores
+            flush_rows: linhas acumuladas que disparam uma gravação
+            on_flush: função(keys, df) chamada após cada gravação com as séries dos
+                      batches gravados (ex: checkpoint da execução)
+            persist_metrics: função(rows) que grava as linhas de métricas dos batches
+                             do bloco (ex: save_run_metrics); falha aqui só gera aviso
+        """
+        self.persist_func = persist_func
+        self.flush_rows = flush_rows
+        self.on_flush = on_flush
+        self.persist_metrics = persist_metrics
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._buffer = []
+        self._keys = []
+        self._metrics = []
+        self._buffered_rows = 0
+        self._thread = threading.Thread(target=self._run, name='forecast-writer', daemon=True)
+        self.rows_written = 0
+        self.flushes = 0
+        # Primeira falha de gravação: o pipeline consulta para parar de submeter batches
+        self.error = None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, frames, keys=None, metrics=None):
+        """
+        Enfileira os DataFrames de um batch (bloqueia se a fila estiver cheia).
+        keys: séries (item_id, store_id) do batch, repassadas a on_flush depois de gravadas.
+        metrics: linhas de métricas do batch, repassadas a persist_metrics no mesmo bloco.
+        """
+        frames = [df for df in frames if df is not None and len(df) > 0]
+        if frames or keys or metrics:
+            self._queue.put((frames, list(keys or []), list(metrics or [])))
+
+    def close(self):
+        """Grava o que restou e espera a thread terminar"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _flush(self):
+        if not self._buffer and not self._keys and not self._metrics:
+            return
+        df = pd.concat(self._buffer, ignore_index=True) if self._buffer else pd.DataFrame()
+        keys = self._keys
+        metrics = self._metrics
+        self._buffer = []
+        self._keys = []
+        self._metrics = []
+        self._buffered_rows = 0
+        if metrics and self.persist_metrics is not None:
+            # Métricas valem para diagnóstico mesmo se os forecasts não puderem ser gravados
+            try:
+                self.persist_metrics(metrics)
+            except Exception as e:
+                logger.warning(f"Erro ao gravar métricas da execução: {e}")
+        if self.error is not None:
+            return
+        try:
+            if len(df) > 0:
+                self.persist_func(df)
+                self.rows_written += len(df)
+                self.flushes += 1
+            if self.on_flush is not None:
+                self.on_flush(keys, df)
+        except Exception as e:
+            # Continua consumindo a fila (só descarta) para não travar os batches ainda em voo
+            self.error = e
+            logger.error(f"Erro na gravação contínua de forecasts: {e}")
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                self._flush()
+                break
+            frames, keys, metrics = entry
+            self._buffer.extend(frames)
+            self._keys.extend(keys)
+            self._metrics.extend(metrics)
+            self._buffered_rows += sum(len(df) for df in frames)
+            if self._buffered_rows >= self.flush_rows:
+                self._flush()
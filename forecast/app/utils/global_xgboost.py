@@ -0,0 +1,224 @@
+# app/utils/global_xgboost.py
+"""
+XGBoost "global": um único booster treinado sobre todas as séries da execução
+(ou por segmento loja/categoria) com features por série, e inferência
+recursiva em lote - cada chamada a predict avança TODAS as séries um passo
+do horizonte (60 chamadas no total em vez de 60 x N).
+"""
+import numpy as np
+import pandas as pd
+
+from app.utils.series_matrix import fill_daily_series
+
+try:
+    import xgboost as xgb
+    XGBOOST_AVAILABLE = True
+except ImportError:
+    XGBOOST_AVAILABLE = False
+
+# Maior lag usado nas features (lag_14)
+MAX_LAG = 14
+
+FEATURE_COLS = [
+    'lag_1', 'lag_7', 'lag_14', 'rolling_mean_7',
+    'dayofweek', 'month', 'day', 'is_weekend',
+    'series_log_scale', 'series_zero_ratio', 'store_id', 'category_code',
+]
+
+
+def calendar_features(days):
+    """dayofweek (segunda=0), month, day e is_weekend a partir de datetime64[D]"""
+    day_numbers = days.astype('int64')
+    dayofweek = (day_numbers + 3) % 7  # 1970-01-01 foi quinta-feira
+    month_start = days.astype('datetime64[M]')
+    month = month_start.astype('int64') % 12 + 1
+    day = (days - month_start.astype('datetime64[D]')).astype('int64') + 1
+    is_weekend = (dayofweek >= 5).astype(np.int64)
+    return dayofweek, month, day, is_weekend
+
+
+class GlobalXGBoostForecaster:
+    """Booster único por segmento com previsão recursiva vetorizada"""
+
+    def __init__(self, n_estimators=300, max_depth=8, learning_rate=0.1, train_window=180):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.learning_rate = learning_rate
+        self.train_window = train_window
+
+    def _history_matrix(self, histories):
+        """Últimos train_window + MAX_LAG pontos de cada série, alinhados à direita (NaN à esquerda)"""
+        width = self.train_window + MAX_LAG
+        matrix = np.full((len(histories), width), np.nan, dtype=np.float64)
+        for row, values in enumerate(histories):
+            tail = values[-width:]
+            matrix[row, width - len(tail):] = tail
+        return matrix
+
+    @staticmethod
+    def _step_features(window, days, series_feats):
+        """Features de um passo para todas as séries; window = últimos MAX_LAG valores"""
+        dayofweek, month, day, is_weekend = calendar_features(days)
+        with np.errstate(invalid='ignore'):
+            rolling_mean_7 = np.nanmean(window[:, -7:], axis=1)
+        return np.column_stack([
+            window[:, -1], window[:, -7], window[:, -14], rolling_mean_7,
+            dayofweek, month, day, is_weekend,
+            series_feats,
+        ]).astype(np.float32)
+
+    def fit_predict(self, histories, last_days, series_feats, periods):
+        """
+        Treina um booster sobre todas as séries e prevê `periods` dias à frente.
+
+        Args:
+            histories: lista de arrays diários (quantidade) de cada série
+            last_days: datetime64[D] do último dia de cada série
+            series_feats: matriz (n_series, 4) com features fixas por série
+            periods: horizonte de previsão
+
+        Returns:
+            matriz (n_series, periods) com as previsões (>= 0)
+        """
+        n_series = len(histories)
+        last_days = np.asarray(last_days, dtype='datetime64[D]')
+        raw = self._history_matrix(histories)
+
+        # Normalização por série: o booster aprende a forma, a escala volta no final
+        with np.errstate(invalid='ignore'):
+            scale = np.nanmean(raw[:, MAX_LAG:], axis=1)
+        scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+        scaled = raw / scale[:, None]
+
+        # ---- Treino: uma linha por (série, dia) com lags completos ----
+        width = scaled.shape[1]
+        offsets = np.arange(width - 1, -1, -1)
+        blocks_X, blocks_y = [], []
+        for t in range(MAX_LAG, width):
+            target = scaled[:, t]
+            window = scaled[:, t - MAX_LAG:t]
+            valid = ~np.isnan(target) & ~np.isnan(window[:, 0])
+            if not valid.any():
+                continue
+            days = last_days[valid] - offsets[t]
+            blocks_X.append(self._step_features(window[valid], days, series_feats[valid]))
+            blocks_y.append(target[valid].astype(np.float32))
+
+        if not blocks_X:
+            return None
+
+        model = xgb.XGBRegressor(
+            n_estimators=self.n_estimators, max_depth=self.max_depth,
+            learning_rate=self.learning_rate, random_state=42,
+            objective='reg:squarederror', tree_method='hist', n_jobs=-1
+        )
+        model.fit(np.vstack(blocks_X), np.concatenate(blocks_y))
+
+        # ---- Inferência recursiva: um predict por passo para todas as séries ----
+        history = np.concatenate([scaled[:, -MAX_LAG:], np.full((n_series, periods), np.nan)], axis=1)
+        for step in range(periods):
+            t = MAX_LAG + step
+            days = last_days + (step + 1)
+            X_step = self._step_features(history[:, t - MAX_LAG:t], days, series_feats)
+            history[:, t] = np.maximum(model.predict(X_step), 0)
+
+        return history[:, MAX_LAG:] * scale[:, None]
+
+
+def fit_global_xgboost(series_data, forecast_periods, segment_by=None, min_points=60, matrix=None):
+    """
+    Roda o XGBoost global (backtest + previsão final) para todas as séries.
+
+    Reproduz o corte de process_item_forecast: com >= 2 x forecast_periods
+    pontos, o backtest treina até len - 2 x forecast_periods + 1 e avalia os
+    forecast_periods dias seguintes.
+
+    Args:
+        series_data: dict {(item_id, store_id): arrays} de load_active_series
+        forecast_periods: horizonte de previsão
+        segment_by: None (um modelo por execução), 'store' ou 'category'
+        min_points: mínimo de dias para a série participar
+        matrix: SeriesMatrix já montada (evita refazer as séries diárias)
+
+    Returns:
+        dict {(item_id, store_id): {'XGBoost': {'test': pd.Series|None, 'final': pd.Series}}}
+    """
+    if not XGBOOST_AVAILABLE or not series_data:
+        return {}
+
+    keys, first_days, values = [], [], []
+    for key, series in series_data.items():
+        if len(series['date']) < min_points:
+            continue
+        if matrix is not None and key in matrix:
+            first_day, daily = matrix.daily(key)
+        else:
+            first_day, daily = fill_daily_series(series['date'], series['quantity'])
+        keys.append(key)
+        first_days.append(first_day)
+        values.append(daily)
+
+    if not keys:
+        return {}
+
+    category_codes, _ = pd.factorize(pd.Series([series_data[k]['category'] for k in keys]).fillna(''))
+    store_ids = np.array([k[1] for k in keys])
+    first_days = np.array(first_days, dtype='datetime64[D]')
+    lengths = np.array([len(v) for v in values])
+    last_days = first_days + (lengths - 1)
+
+    def series_features(histories, rows):
+        """log da escala, proporção de zeros, loja e categoria de cada série"""
+        feats = np.empty((len(rows), 4), dtype=np.float64)
+        for i, h in enumerate(histories):
+            feats[i, 0] = np.log1p(h.mean())
+            feats[i, 1] = (h == 0).mean()
+        feats[:, 2] = store_ids[rows]
+        feats[:, 3] = category_codes[rows]
+        return feats
+
+    if segment_by == 'store':
+        segment_keys = store_ids
+    elif segment_by == 'category':
+        segment_keys = category_codes
+    else:
+        segment_keys = np.zeros(len(keys), dtype=int)
+
+    forecaster = GlobalXGBoostForecaster()
+    final = np.full((len(keys), forecast_periods), np.nan)
+    test = np.full((len(keys), forecast_periods), np.nan)
+
+    # Séries com dados suficientes para backtest e respectivo corte de treino
+    backtest_mask = lengths >= 2 * forecast_periods
+    train_lengths = lengths - 2 * forecast_periods + 1
+
+    for segment in np.unique(segment_keys):
+        rows = np.flatnonzero(segment_keys == segment)
+        histories = [values[r] for r in rows]
+        feats = series_features(histories, rows)
+
+        predictions = forecaster.fit_predict(histories, last_days[rows], feats, forecast_periods)
+        if predictions is not None:
+            final[rows] = predictions
+
+        bt_rows = rows[backtest_mask[rows]]
+        if len(bt_rows):
+            bt_histories = [values[r][:train_lengths[r]] for r in bt_rows]
+            bt_last_days = first_days[bt_rows] + (train_lengths[bt_rows] - 1)
+            bt_feats = series_features(bt_histories, bt_rows)
+            bt_predictions = forecaster.fit_predict(bt_histories, bt_last_days, bt_feats, forecast_periods)
+            if bt_predictions is not None:
+                test[bt_rows] = bt_predictions
+
+    results = {}
+    for row, key in enumerate(keys):
+        if np.isnan(final[row]).any():
+            continue
+        future_index = pd.date_range(start=pd.Timestamp(last_days[row]) + pd.Timedelta(days=1), periods=forecast_periods)
+        entry = {'test': None, 'final': pd.Series(final[row], index=future_index)}
+        if backtest_mask[row] and not np.isnan(test[row]).any():
+            test_start = pd.Timestamp(first_days[row]) + pd.Timedelta(days=int(train_lengths[row]))
+            entry['test'] = pd.Series(test[row], index=pd.date_range(start=test_start, periods=forecast_periods))
+        results[key] = {'XGBoost': entry}
+
+    return results
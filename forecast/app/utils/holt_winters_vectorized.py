@@ -0,0 +1,262 @@
+# app/utils/holt_winters_vectorized.py
+"""
+Holt-Winters aditivo (tendência + sazonalidade semanal) em NumPy puro,
+ajustado e previsto para milhares de séries diárias de uma vez a partir de
+uma matriz (n_series, n_days).
+
+Séries mais curtas entram alinhadas à direita, com NaN à esquerda. Os
+parâmetros (alpha, beta, gamma) são otimizados em lote: uma grade grossa
+avaliada para todas as séries ao mesmo tempo, seguida de uma busca de padrão
+(pattern search) com passo decrescente em torno do melhor ponto de cada série.
+"""
+import numpy as np
+import pandas as pd
+
+from app.utils.series_matrix import fill_daily_series
+
+SEASON_LENGTH = 7
+
+# Grade inicial de parâmetros (avaliada para todas as séries em uma passada).
+# Inclui valores ~0: em séries estáveis o ótimo do statsmodels costuma ser quase determinístico.
+ALPHA_GRID = (0.001, 0.05, 0.15, 0.3, 0.6)
+BETA_GRID = (0.0001, 0.005, 0.03)
+GAMMA_GRID = (0.0001, 0.05, 0.2)
+
+# Iterações da busca de padrão e passo inicial
+REFINE_ITERATIONS = 3
+REFINE_STEP = 0.05
+
+# Temporadas usadas para estimar os estados iniciais
+INIT_SEASONS = 8
+
+# Séries por bloco de ajuste (limita a memória dos estados n_series x candidatos)
+BATCH_ROWS = 5000
+
+PARAM_MIN = 1e-4
+PARAM_MAX = 0.9999
+
+
+class VectorizedHoltWinters:
+    """Holt-Winters aditivo ajustado para todas as linhas de uma matriz de séries"""
+
+    def __init__(self, season_length=SEASON_LENGTH, refine_iterations=REFINE_ITERATIONS):
+        self.season_length = season_length
+        self.refine_iterations = refine_iterations
+        self.params = None
+        self.level = None
+        self.trend = None
+        self.season = None
+        self.n_days = None
+
+    def _initial_states(self, Y, starts):
+        """
+        Estados iniciais a partir das primeiras INIT_SEASONS temporadas de cada série:
+        tendência = inclinação das médias por temporada, sazonalidade = média dos desvios.
+        """
+        m = self.season_length
+        n_series, n_days = Y.shape
+        level = np.empty(n_series)
+        trend = np.empty(n_series)
+        season = np.empty((n_series, m))
+        for row, start in enumerate(starts):
+            n_seasons = min(INIT_SEASONS, (n_days - start) // m)
+            segment = Y[row, start:start + n_seasons * m]
+            season_means = segment.reshape(n_seasons, m).mean(axis=1)
+            slope = np.polyfit(np.arange(n_seasons) * m, season_means, 1)[0] if n_seasons > 1 else 0.0
+            detrended = segment - (season_means[0] + slope * (np.arange(n_seasons * m) - (m - 1) / 2))
+            level[row] = season_means[0]
+            trend[row] = slope
+            # Sazonalidade indexada pela coluna absoluta (coluna % m)
+            season[row, (start + np.arange(m)) % m] = detrended.reshape(n_seasons, m).mean(axis=0)
+        return level, trend, season
+
+    def _run(self, Y, starts, alpha, beta, gamma, init):
+        """
+        Executa a recursão para K conjuntos de parâmetros por série.
+
+        alpha/beta/gamma: (n_series, K). Retorna SSE (n_series, K) e estados finais.
+        """
+        m = self.season_length
+        level0, trend0, season0 = init
+        K = alpha.shape[1]
+        level = np.repeat(level0[:, None], K, axis=1)
+        trend = np.repeat(trend0[:, None], K, axis=1)
+        season = np.repeat(season0[:, None, :], K, axis=1)
+        sse = np.zeros_like(alpha)
+
+        for t in range(Y.shape[1]):
+            y = Y[:, t][:, None]
+            active = (t >= starts)[:, None]
+            s = season[:, :, t % m]
+
+            err = y - (level + trend + s)
+            new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+            new_trend = beta * (new_level - level) + (1 - beta) * trend
+            new_season = gamma * (y - new_level) + (1 - gamma) * s
+
+            sse = np.where(active, sse + err * err, sse)
+            level = np.where(active, new_level, level)
+            trend = np.where(active, new_trend, trend)
+            season[:, :, t % m] = np.where(active, new_season, s)
+
+        return sse, level, trend, season
+
+    def fit(self, Y):
+        """
+        Ajusta todas as séries da matriz Y (n_series, n_days).
+        Cada série precisa de pelo menos 2 temporadas de dados.
+        """
+        Y = np.asarray(Y, dtype=np.float64)
+        n_series = Y.shape[0]
+        valid = ~np.isnan(Y)
+        starts = np.where(valid.any(axis=1), valid.argmax(axis=1), Y.shape[1])
+        Y = np.nan_to_num(Y)
+        init = self._initial_states(Y, starts)
+
+        # ---- Grade grossa ----
+        grid = np.array([(a, b, g) for a in ALPHA_GRID for b in BETA_GRID for g in GAMMA_GRID])
+        shape = (n_series, len(grid))
+        sse, _, _, _ = self._run(
+            Y, starts,
+            np.broadcast_to(grid[:, 0], shape), np.broadcast_to(grid[:, 1], shape),
+            np.broadcast_to(grid[:, 2], shape), init
+        )
+        best = grid[np.argmin(sse, axis=1)]
+        best_sse = sse.min(axis=1)
+
+        # ---- Busca de padrão: ±passo em cada parâmetro, passo cai pela metade ----
+        moves = np.vstack([np.zeros(3), np.eye(3), -np.eye(3)])
+        step = REFINE_STEP
+        for _ in range(self.refine_iterations):
+            candidates = np.clip(best[:, None, :] + step * moves[None, :, :], PARAM_MIN, PARAM_MAX)
+            sse, _, _, _ = self._run(
+                Y, starts, candidates[:, :, 0], candidates[:, :, 1], candidates[:, :, 2], init
+            )
+            choice = np.argmin(sse, axis=1)
+            improved = sse[np.arange(n_series), choice] < best_sse
+            best = np.where(improved[:, None], candidates[np.arange(n_series), choice], best)
+            best_sse = np.where(improved, sse[np.arange(n_series), choice], best_sse)
+            step /= 2
+
+        # ---- Estados finais com os parâmetros escolhidos ----
+        _, level, trend, season = self._run(
+            Y, starts, best[:, 0:1], best[:, 1:2], best[:, 2:3], init
+        )
+        self.params = best
+        self.level = level[:, 0]
+        self.trend = trend[:, 0]
+        self.season = season[:, 0, :]
+        self.n_days = Y.shape[1]
+        self.sse = best_sse
+        return self
+
+    def update(self, Y):
+        """
+        Reaplica os parâmetros já ajustados a uma matriz estendida (mesmas séries,
+        mesma ordem, com dias novos no fim): só recalcula os estados, sem otimizar.
+        """
+        Y = np.asarray(Y, dtype=np.float64)
+        valid = ~np.isnan(Y)
+        starts = np.where(valid.any(axis=1), valid.argmax(axis=1), Y.shape[1])
+        Y = np.nan_to_num(Y)
+        init = self._initial_states(Y, starts)
+        _, level, trend, season = self._run(
+            Y, starts, self.params[:, 0:1], self.params[:, 1:2], self.params[:, 2:3], init
+        )
+        self.level = level[:, 0]
+        self.trend = trend[:, 0]
+        self.season = season[:, 0, :]
+        self.n_days = Y.shape[1]
+        return self
+
+    def forecast(self, periods):
+        """Previsões (n_series, periods) a partir do último dia da matriz"""
+        h = np.arange(1, periods + 1)
+        season_idx = (self.n_days + h - 1) % self.season_length
+        return self.level[:, None] + h[None, :] * self.trend[:, None] + self.season[:, season_idx]
+
+
+def _right_aligned_matrix(histories):
+    """Empilha séries de tamanhos diferentes alinhadas pelo último dia (NaN à esquerda)"""
+    width = max(len(h) for h in histories)
+    matrix = np.full((len(histories), width), np.nan)
+    for row, values in enumerate(histories):
+        matrix[row, width - len(values):] = values
+    return matrix
+
+
+def holt_winters_forecast_matrix(histories, periods, batch_rows=BATCH_ROWS):
+    """Ajusta e prevê uma lista de séries diárias (arrays), em blocos de batch_rows séries"""
+    forecasts = []
+    for start in range(0, len(histories), batch_rows):
+        model = VectorizedHoltWinters().fit(_right_aligned_matrix(histories[start:start + batch_rows]))
+        forecasts.append(model.forecast(periods))
+    return np.vstack(forecasts)
+
+
+def fit_batch_holt_winters(series_data, forecast_periods, min_points=60, reuse_backtest_fit=False, matrix=None):
+    """
+    Holt-Winters vetorizado (backtest + previsão final) para todas as séries.
+
+    Mesmo corte de backtest de process_item_forecast e mesmo formato de
+    retorno de fit_global_xgboost:
+        {(item_id, store_id): {'Holt-Winters': {'test': pd.Series|None, 'final': pd.Series}}}
+
+    reuse_backtest_fit: a previsão final das séries com backtest reaproveita os
+    parâmetros otimizados no treino (só estende os estados até o último dia).
+    matrix: SeriesMatrix já montada (evita refazer as séries diárias).
+    """
+    keys, first_days, values = [], [], []
+    for key, series in series_data.items():
+        if len(series['date']) < min_points:
+            continue
+        if matrix is not None and key in matrix:
+            first_day, daily = matrix.daily(key)
+        else:
+            first_day, daily = fill_daily_series(series['date'], series['quantity'])
+        if len(daily) < 2 * SEASON_LENGTH:
+            continue
+        keys.append(key)
+        first_days.append(first_day)
+        values.append(daily)
+
+    if not keys:
+        return {}
+
+    first_days = np.array(first_days, dtype='datetime64[D]')
+    lengths = np.array([len(v) for v in values])
+    # Backtest só quando o trecho de treino tem ao menos 2 temporadas
+    train_lengths = lengths - 2 * forecast_periods + 1
+    backtest_rows = np.flatnonzero((lengths >= 2 * forecast_periods) & (train_lengths >= 2 * SEASON_LENGTH))
+    test = {}
+    final = np.empty((len(keys), forecast_periods))
+
+    if reuse_backtest_fit:
+        # Um ajuste por série: otimiza no treino, depois só estende os estados
+        for start in range(0, len(backtest_rows), BATCH_ROWS):
+            rows = backtest_rows[start:start + BATCH_ROWS]
+            model = VectorizedHoltWinters().fit(_right_aligned_matrix([values[r][:train_lengths[r]] for r in rows]))
+            test.update(zip(rows, model.forecast(forecast_periods)))
+            final[rows] = model.update(_right_aligned_matrix([values[r] for r in rows])).forecast(forecast_periods)
+        remaining_rows = np.setdiff1d(np.arange(len(keys)), backtest_rows)
+        if len(remaining_rows):
+            final[remaining_rows] = holt_winters_forecast_matrix([values[r] for r in remaining_rows], forecast_periods)
+    else:
+        final[:] = holt_winters_forecast_matrix(values, forecast_periods)
+        if len(backtest_rows):
+            bt = holt_winters_forecast_matrix([values[r][:train_lengths[r]] for r in backtest_rows], forecast_periods)
+            test = dict(zip(backtest_rows, bt))
+
+    results = {}
+    for row, key in enumerate(keys):
+        last_day = pd.Timestamp(first_days[row] + (lengths[row] - 1))
+        entry = {
+            'test': None,
+            'final': pd.Series(final[row], index=pd.date_range(start=last_day + pd.Timedelta(days=1), periods=forecast_periods)),
+        }
+        if row in test:
+            test_start = pd.Timestamp(first_days[row]) + pd.Timedelta(days=int(train_lengths[row]))
+            entry['test'] = pd.Series(test[row], index=pd.date_range(start=test_start, periods=forecast_periods))
+        results[key] = {'Holt-Winters': entry}
+
+    return results
@@ -0,0 +1,240 @@
+# app/utils/intermittent_demand.py
+"""
+Triagem e estimadores baratos para séries esparsas: Croston, SBA
+(Syntetos-Boylan), TSB (Teunter-Syntetos-Babai), média móvel e previsão zero,
+em NumPy para todas as séries de uma vez.
+
+Séries paradas (sem venda nos últimos dias do calendário) recebem previsão
+zero; séries esparsas (muitos zeros ou quase sem volume) vão para os
+estimadores de demanda intermitente; as demais seguem para os modelos pesados.
+Mesmo corte de backtest e mesmo formato de retorno de fit_batch_holt_winters.
+"""
+import numpy as np
+import pandas as pd
+
+# Grades de suavização (tamanho da demanda / intervalo em Croston e SBA,
+# probabilidade de demanda no TSB) escolhidas por erro um passo à frente
+ALPHA_GRID = (0.05, 0.1, 0.2, 0.3)
+BETA_GRID = (0.02, 0.05, 0.1, 0.2)
+
+# Janela da média móvel (dias)
+MOVING_AVERAGE_WINDOW = 28
+
+# Séries por bloco (limita a memória dos estados n_series x candidatos)
+BATCH_ROWS = 5000
+
+# Modelos do caminho esparso, na ordem de preferência sem backtest
+INTERMITTENT_MODELS = ('SBA', 'TSB', 'Croston', 'Moving-Average')
+
+
+def triage_series_matrix(matrix, zero_days, sparse_zero_ratio, min_daily_mean):
+    """
+    Rota de cada série da SeriesMatrix.
+
+    - 'zero': nenhuma venda nos últimos zero_days dias do calendário
+    - 'sparse': proporção de dias sem venda acima de sparse_zero_ratio ou
+      média diária abaixo de min_daily_mean
+    - 'full': modelos pesados
+
+    Returns:
+        dict {(item_id, store_id): 'zero' | 'sparse' | 'full'}
+    """
+    if len(matrix) == 0:
+        return {}
+
+    n_days = matrix.values.shape[1]
+    lengths = np.maximum(matrix.ends - matrix.starts + 1, 1)
+    idle_days = (n_days - 1) - matrix.ends
+    nonzero_days = (matrix.values > 0).sum(axis=1)
+    zero_ratio = 1.0 - nonzero_days / lengths
+    daily_mean = matrix.values.sum(axis=1, dtype=np.float64) / lengths
+
+    routes = np.where(
+        idle_days >= zero_days, 'zero',
+        np.where((zero_ratio > sparse_zero_ratio) | (daily_mean < min_daily_mean), 'sparse', 'full')
+    )
+    return dict(zip(matrix.keys, routes.tolist()))
+
+
+def _right_aligned(histories):
+    """Empilha séries de tamanhos diferentes alinhadas pelo último dia (NaN à esquerda)"""
+    width = max(len(h) for h in histories)
+    Y = np.full((len(histories), width), np.nan)
+    for row, values in enumerate(histories):
+        Y[row, width - len(values):] = values
+    return Y
+
+
+def _initial_states(Y, starts):
+    """Tamanho médio das demandas, intervalo médio entre demandas e probabilidade de demanda"""
+    valid = ~np.isnan(Y)
+    Y0 = np.nan_to_num(Y)
+    length = np.maximum(valid.sum(axis=1), 1)
+    n_demands = np.maximum((Y0 > 0).sum(axis=1), 1)
+    size = Y0.sum(axis=1) / n_demands
+    interval = np.maximum(length / n_demands, 1.0)
+    return size, interval, n_demands / length
+
+
+def _croston_run(Y, starts, alpha, size0, interval0):
+    """
+    Croston e SBA para K valores de alpha por série (alpha: n_series x K).
+    Retorna SSE um passo à frente de cada variante e os estados finais.
+    """
+    n_series, n_days = Y.shape
+    size = np.repeat(size0[:, None], alpha.shape[1], axis=1)
+    interval = np.repeat(interval0[:, None], alpha.shape[1], axis=1)
+    last_demand = starts.astype(np.float64)
+    sba_factor = 1 - alpha / 2
+    sse_croston = np.zeros_like(alpha)
+    sse_sba = np.zeros_like(alpha)
+
+    for t in range(n_days):
+        y = np.nan_to_num(Y[:, t])
+        scored = (t > starts)[:, None]
+        forecast = size / interval
+        sse_croston += np.where(scored, (y[:, None] - forecast) ** 2, 0.0)
+        sse_sba += np.where(scored, (y[:, None] - sba_factor * forecast) ** 2, 0.0)
+
+        # Atualiza tamanho e intervalo só nos dias com demanda (após o primeiro)
+        demand = (t > starts) & (y > 0)
+        gap = (t - last_demand)[:, None]
+        size = np.where(demand[:, None], alpha * y[:, None] + (1 - alpha) * size, size)
+        interval = np.where(demand[:, None], alpha * gap + (1 - alpha) * interval, interval)
+        last_demand = np.where(demand, t, last_demand)
+
+    return sse_croston, sse_sba, size, interval
+
+
+def _tsb_run(Y, starts, alpha, beta, size0, probability0):
+    """TSB: tamanho atualizado nas demandas (alpha), probabilidade em todo dia (beta)"""
+    n_series, n_days = Y.shape
+    size = np.repeat(size0[:, None], alpha.shape[1], axis=1)
+    probability = np.repeat(probability0[:, None], alpha.shape[1], axis=1)
+    sse = np.zeros_like(alpha)
+
+    for t in range(n_days):
+        y = np.nan_to_num(Y[:, t])
+        scored = (t > starts)[:, None]
+        sse += np.where(scored, (y[:, None] - probability * size) ** 2, 0.0)
+
+        demand = ((t > starts) & (y > 0))[:, None]
+        probability = np.where(scored, beta * demand + (1 - beta) * probability, probability)
+        size = np.where(demand, alpha * y[:, None] + (1 - alpha) * size, size)
+
+    return sse, size * probability
+
+
+def intermittent_forecast_matrix(histories, periods, models=INTERMITTENT_MODELS):
+    """
+    Ajusta e prevê Croston, SBA, TSB e média móvel (ou só os de models) para
+    uma lista de séries diárias.
+
+    Returns:
+        dict {modelo: array (n_series, periods)} - previsões constantes no horizonte
+    """
+    forecasts = {name: [] for name in models}
+    for start in range(0, len(histories), BATCH_ROWS):
+        Y = _right_aligned(histories[start:start + BATCH_ROWS])
+        n_series = Y.shape[0]
+        rows = np.arange(n_series)
+        valid = ~np.isnan(Y)
+        starts = np.where(valid.any(axis=1), valid.argmax(axis=1), Y.shape[1])
+        size0, interval0, probability0 = _initial_states(Y, starts)
+
+        levels = {}
+
+        if 'Croston' in models or 'SBA' in models:
+            alphas = np.broadcast_to(np.array(ALPHA_GRID), (n_series, len(ALPHA_GRID)))
+            sse_croston, sse_sba, size, interval = _croston_run(Y, starts, alphas, size0, interval0)
+            best = np.argmin(sse_croston, axis=1)
+            levels['Croston'] = size[rows, best] / interval[rows, best]
+            best = np.argmin(sse_sba, axis=1)
+            levels['SBA'] = (1 - alphas[rows, best] / 2) * size[rows, best] / interval[rows, best]
+
+        if 'TSB' in models:
+            grid = np.array([(a, b) for a in ALPHA_GRID for b in BETA_GRID])
+            shape = (n_series, len(grid))
+            sse_tsb, tsb_level = _tsb_run(
+                Y, starts, np.broadcast_to(grid[:, 0], shape), np.broadcast_to(grid[:, 1], shape), size0, probability0
+            )
+            levels['TSB'] = tsb_level[rows, np.argmin(sse_tsb, axis=1)]
+
+        if 'Moving-Average' in models:
+            levels['Moving-Average'] = np.nanmean(Y[:, -MOVING_AVERAGE_WINDOW:], axis=1)
+
+        for name in models:
+            forecasts[name].append(np.repeat(np.nan_to_num(levels[name])[:, None], periods, axis=1))
+
+    return {name: np.vstack(levels) for name, levels in forecasts.items()}
+
+
+def _daily_values(matrix, keys):
+    first_days, values = [], []
+    for key in keys:
+        first_day, daily = matrix.daily(key)
+        first_days.append(first_day)
+        values.append(np.asarray(daily, dtype=np.float64))
+    return np.array(first_days, dtype='datetime64[D]'), values
+
+
+def _to_results(keys, first_days, lengths, forecast_periods, final, test, train_lengths):
+    """Monta {key: {modelo: {'test', 'final'}}} com as datas de cada série"""
+    results = {}
+    for row, key in enumerate(keys):
+        last_day = pd.Timestamp(first_days[row] + (lengths[row] - 1))
+        final_index = pd.date_range(start=last_day + pd.Timedelta(days=1), periods=forecast_periods)
+        test_index = None
+        if row in test:
+            test_start = pd.Timestamp(first_days[row]) + pd.Timedelta(days=int(train_lengths[row]))
+            test_index = pd.date_range(start=test_start, periods=forecast_periods)
+        results[key] = {
+            name: {
+                'test': pd.Series(test[row][name], index=test_index) if row in test else None,
+                'final': pd.Series(final[name][row], index=final_index),
+            }
+            for name in final
+        }
+    return results
+
+
+def fit_batch_intermittent(matrix, keys, forecast_periods):
+    """
+    Croston/SBA/TSB/média móvel (backtest + previsão final) para as séries keys.
+
+    Returns:
+        {(item_id, store_id): {modelo: {'test': pd.Series|None, 'final': pd.Series}}}
+    """
+    keys = [key for key in keys if key in matrix]
+    if not keys:
+        return {}
+
+    first_days, values = _daily_values(matrix, keys)
+    lengths = np.array([len(v) for v in values])
+    train_lengths = lengths - 2 * forecast_periods + 1
+    backtest_rows = np.flatnonzero((lengths >= 2 * forecast_periods) & (train_lengths > 0))
+
+    final = intermittent_forecast_matrix(values, forecast_periods)
+    test = {}
+    if len(backtest_rows):
+        bt = intermittent_forecast_matrix([values[r][:train_lengths[r]] for r in backtest_rows], forecast_periods)
+        test = {row: {name: bt[name][i] for name in bt} for i, row in enumerate(backtest_rows)}
+
+    return _to_results(keys, first_days, lengths, forecast_periods, final, test, train_lengths)
+
+
+def zero_forecasts(matrix, keys, forecast_periods):
+    """Previsão zero (backtest incluído) para séries paradas"""
+    keys = [key for key in keys if key in matrix]
+    if not keys:
+        return {}
+
+    first_days, values = _daily_values(matrix, keys)
+    lengths = np.array([len(v) for v in values])
+    train_lengths = lengths - 2 * forecast_periods + 1
+    zeros = np.zeros((len(keys), forecast_periods))
+    test = {
+        row: {'Zero': zeros[row]}
+        for row in np.flatnonzero((lengths >= 2 * forecast_periods) & (train_lengths > 0))
+    }
+    return _to_results(keys, first_days, lengths, forecast_periods, {'Zero': zeros}, test, train_lengths)
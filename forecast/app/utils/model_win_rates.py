@@ -0,0 +1,134 @@
+# app/utils/model_win_rates.py
+"""
+Taxa de vitória dos modelos por segmento (sazonalidade, faixa de preço, loja):
+quantas vezes cada modelo entrou no backtest e quantas vezes foi o melhor.
+Com a poda ativa, modelos que quase nunca vencem no segmento deixam de ser
+ajustados (exceto nas séries sorteadas para exploração).
+"""
+import psycopg2
+import psycopg2.extras
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_win_rate_table(pg_conn_str):
+    """Cria tabela de vitórias por segmento/modelo"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_model_win_rates (
+            seasonality_category VARCHAR(20) NOT NULL,
+            price_category VARCHAR(20) NOT NULL,
+            store_id INTEGER NOT NULL,
+            model_name VARCHAR(50) NOT NULL,
+            candidates INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (seasonality_category, price_category, store_id, model_name)
+        );
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_model_win_rates criada/verificada")
+
+
+def load_win_rates(pg_conn_str, store_ids=None):
+    """
+    Carrega o histórico de vitórias.
+
+    Returns:
+        dict {(seasonality_category, price_category, store_id): {model_name: (wins, candidates)}}
+    """
+    create_win_rate_table(pg_conn_str)
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    query = """
+        SELECT seasonality_category, price_category, store_id, model_name, wins, candidates
+        FROM forecast_model_win_rates
+    """
+    if store_ids:
+        cur.execute(query + " WHERE store_id = ANY(%s)", (list(store_ids),))
+    else:
+        cur.execute(query)
+
+    win_rates = {}
+    for seasonality, price, store_id, model_name, wins, candidates in cur.fetchall():
+        win_rates.setdefault((seasonality, price, store_id), {})[model_name] = (wins, candidates)
+
+    cur.close()
+    conn.close()
+    return win_rates
+
+
+def record_model_outcomes(pg_conn_str, outcomes):
+    """
+    Soma ao histórico os resultados do backtest da execução.
+
+    Args:
+        outcomes: lista de dicts {'segment': (seasonality, price, store_id),
+                                  'evaluated': [modelos avaliados], 'best': modelo vencedor}
+    """
+    counts = {}
+    for outcome in outcomes:
+        for model_name in outcome['evaluated']:
+            key = (*outcome['segment'], model_name)
+            wins, candidates = counts.get(key, (0, 0))
+            counts[key] = (wins + int(model_name == outcome['best']), candidates + 1)
+
+    if not counts:
+        return
+
+    records = [
+        (seasonality, price, int(store_id), model_name, candidates, wins)
+        for (seasonality, price, store_id, model_name), (wins, candidates) in counts.items()
+    ]
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO forecast_model_win_rates (
+                seasonality_category, price_category, store_id, model_name, candidates, wins
+            )
+            VALUES %s
+            ON CONFLICT (seasonality_category, price_category, store_id, model_name) DO UPDATE SET
+                candidates = forecast_model_win_rates.candidates + EXCLUDED.candidates,
+                wins = forecast_model_win_rates.wins + EXCLUDED.wins,
+                updated_at = NOW()
+        """, records, page_size=1000)
+        conn.commit()
+        logger.info(f"{len(records)} taxas de vitória por segmento atualizadas")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def prune_models(recommended_models, segment_stats, min_win_rate, min_samples):
+    """
+    Remove da lista os modelos com taxa de vitória abaixo de min_win_rate no
+    segmento. Modelos com menos de min_samples avaliações são mantidos (sem
+    histórico suficiente) e ao menos um modelo sempre sobra.
+
+    Returns:
+        (modelos mantidos, modelos podados)
+    """
+    if not segment_stats:
+        return recommended_models, []
+
+    def win_rate(model_name):
+        wins, candidates = segment_stats.get(model_name, (0, 0))
+        return wins / candidates if candidates >= min_samples else None
+
+    rates = {model_name: win_rate(model_name) for model_name in recommended_models}
+    kept = [m for m in recommended_models if rates[m] is None or rates[m] >= min_win_rate]
+    if not kept:
+        kept = [max(recommended_models, key=lambda m: rates[m])]
+    return kept, [m for m in recommended_models if m not in kept]
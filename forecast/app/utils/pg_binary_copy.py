@@ -0,0 +1,180 @@
+# app/utils/pg_binary_copy.py
+"""
+Codificação de lotes de linhas no formato binário do COPY do PostgreSQL.
+
+Com FORMAT BINARY cada campo vai já no formato interno do tipo da coluna
+(inteiro big-endian, dias desde 2000-01-01, dígitos base 10000 do NUMERIC...):
+o Postgres não reparseia texto e delimitadores/aspas dentro de nomes não
+importam. Em contrapartida, os tipos declarados aqui precisam bater exatamente
+com os da tabela de destino (int4 numa coluna INTEGER, int8 numa BIGINT etc.).
+
+Uso:
+    writer = BinaryCopyWriter(('int4', 'text', 'bool', 'timestamp'))
+    cur.copy_expert("COPY tmp (code, name, active, created_at) FROM STDIN WITH (FORMAT BINARY)",
+                    writer.encode(rows))
+"""
+import io
+import struct
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_TRAILER = struct.pack('>h', -1)
+_NULL = struct.pack('>i', -1)
+
+_PG_EPOCH_DATE = date(2000, 1, 1)
+_PG_EPOCH_ORDINAL = _PG_EPOCH_DATE.toordinal()
+_PG_EPOCH = datetime(2000, 1, 1)
+
+_INT2 = struct.Struct('>ih')
+_INT4 = struct.Struct('>ii')
+_INT8 = struct.Struct('>iq')
+_FLOAT8 = struct.Struct('>id')
+_BOOL_TRUE = struct.pack('>ib', 1, 1)
+_BOOL_FALSE = struct.pack('>ib', 1, 0)
+
+_NUMERIC_POS = 0x0000
+_NUMERIC_NEG = 0x4000
+_NUMERIC_NAN = struct.pack('>ihhhh', 8, 0, 0, -0x4000, 0)  # sign 0xC000
+
+# Mesmos literais que o Postgres aceita para BOOLEAN em texto
+_TRUE_STRINGS = {'t', 'true', 'y', 'yes', 'on', '1'}
+_FALSE_STRINGS = {'f', 'false', 'n', 'no', 'off', '0'}
+
+
+def _encode_int2(value):
+    return _INT2.pack(2, int(value))
+
+
+def _encode_int4(value):
+    return _INT4.pack(4, int(value))
+
+
+def _encode_int8(value):
+    return _INT8.pack(8, int(value))
+
+
+def _encode_float8(value):
+    return _FLOAT8.pack(8, float(value))
+
+
+def _encode_bool(value):
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE_STRINGS:
+            return _BOOL_TRUE
+        if text in _FALSE_STRINGS:
+            return _BOOL_FALSE
+        raise ValueError(f"Valor booleano inválido: {value!r}")
+    return _BOOL_TRUE if value else _BOOL_FALSE
+
+
+def _encode_text(value):
+    data = str(value).encode('utf-8')
+    return struct.pack('>i', len(data)) + data
+
+
+def _encode_date(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value.strip()[:10])
+    return _INT4.pack(4, value.toordinal() - _PG_EPOCH_ORDINAL)
+
+
+def _encode_timestamp(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return _INT8.pack(8, micros)
+
+
+def _encode_numeric(value):
+    """NUMERIC binário: ndigits, weight, sign, dscale + dígitos base 10000"""
+    if not isinstance(value, Decimal):
+        # str() preserva a representação curta do float (1.1 -> '1.1')
+        value = Decimal(str(value))
+    if value.is_nan():
+        return _NUMERIC_NAN
+    if value.is_infinite():
+        raise ValueError(f"NUMERIC não aceita infinito: {value}")
+
+    sign, digits, exponent = value.as_tuple()
+    digit_str = ''.join(map(str, digits))
+    if exponent > 0:
+        digit_str += '0' * exponent
+        exponent = 0
+    dscale = -exponent
+
+    int_len = len(digit_str) - dscale
+    if int_len > 0:
+        int_part, frac_part = digit_str[:int_len], digit_str[int_len:]
+    else:
+        int_part, frac_part = '', '0' * (-int_len) + digit_str
+
+    int_part = '0' * (-len(int_part) % 4) + int_part
+    frac_part = frac_part + '0' * (-len(frac_part) % 4)
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+    weight = len(int_part) // 4 - 1
+
+    # Postgres não guarda grupos zero nas pontas
+    start, end = 0, len(groups)
+    while start < end and groups[start] == 0:
+        start += 1
+        weight -= 1
+    while end > start and groups[end - 1] == 0:
+        end -= 1
+    groups = groups[start:end]
+    if not groups:
+        weight = 0
+
+    ndigits = len(groups)
+    body = struct.pack(
+        f'>hhhh{ndigits}h', ndigits, weight,
+        _NUMERIC_NEG if sign and groups else _NUMERIC_POS, dscale, *groups
+    )
+    return struct.pack('>i', len(body)) + body
+
+
+ENCODERS = {
+    'int2': _encode_int2,
+    'int4': _encode_int4,
+    'int8': _encode_int8,
+    'float8': _encode_float8,
+    'numeric': _encode_numeric,
+    'bool': _encode_bool,
+    'text': _encode_text,
+    'date': _encode_date,
+    'timestamp': _encode_timestamp,
+}
+
+
+class BinaryCopyWriter:
+    """Codifica linhas (tuplas na ordem das colunas; None = NULL) para COPY ... WITH (FORMAT BINARY)"""
+
+    def __init__(self, column_types):
+        unknown = [t for t in column_types if t not in ENCODERS]
+        if unknown:
+            raise ValueError(f"Tipos sem codificador binário: {unknown}")
+        self.column_types = tuple(column_types)
+        self._encoders = [ENCODERS[t] for t in self.column_types]
+        self._field_count = struct.pack('>h', len(self.column_types))
+
+    def encode_row(self, row):
+        if len(row) != len(self._encoders):
+            raise ValueError(f"Linha com {len(row)} campos, esperados {len(self._encoders)}: {row!r}")
+        parts = [self._field_count]
+        for encode, value in zip(self._encoders, row):
+            parts.append(_NULL if value is None else encode(value))
+        return b''.join(parts)
+
+    def encode(self, rows):
+        """Buffer pronto para copy_expert (cabeçalho, tuplas e trailer)"""
+        encode_row = self.encode_row
+        return io.BytesIO(b''.join([_HEADER, *(encode_row(row) for row in rows), _TRAILER]))
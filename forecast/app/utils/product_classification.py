@@ -0,0 +1,278 @@
+# app/utils/product_classification.py
+"""
+Classificação de produtos por execução (faixa de preço e sazonalidade),
+calculada uma vez com groupby sobre todas as séries carregadas - mesmas
+regras de classify_products, mas com os percentis de preço entre TODOS os
+itens. O resultado fica em forecast_product_classification e é reaproveitado
+enquanto o preço mediano e o volume do item não mudarem de forma relevante.
+
+A tabela é global (por item_id): execuções parciais (filtro de lojas, retomada
+de checkpoint) classificam sobre o conjunto completo de séries ativas, com uma
+query agregada própria, em vez de usar só as séries carregadas.
+"""
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.extras
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Variação relativa do preço mediano / volume que força reclassificar o item
+PRICE_CHANGE_TOLERANCE = 0.10
+VOLUME_CHANGE_TOLERANCE = 0.25
+
+# Classificações mais antigas que isso são refeitas
+CLASSIFICATION_MAX_AGE_DAYS = 30
+
+
+def create_classification_table(pg_conn_str):
+    """Cria tabela de classificação de produtos"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_product_classification (
+            item_id BIGINT PRIMARY KEY,
+            median_price DOUBLE PRECISION,
+            total_quantity DOUBLE PRECISION,
+            seasonality_cv DOUBLE PRECISION,
+            price_category VARCHAR(20) NOT NULL,
+            seasonality_category VARCHAR(20) NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_product_classification criada/verificada")
+
+
+def price_category(median_price, p33, p66):
+    if median_price <= p33: return 'BARATO'
+    elif median_price <= p66: return 'MEDIO'
+    else: return 'CARO'
+
+
+def seasonality_category(cv):
+    if cv < 0.3: return 'ESTAVEL'
+    elif cv < 0.8: return 'SAZONAL'
+    else: return 'INTERMITENTE'
+
+
+def classify_items(series_data):
+    """
+    Classifica todos os itens de uma vez a partir do dict de load_active_series.
+
+    Returns:
+        DataFrame indexado por item_id com median_price, total_quantity,
+        seasonality_cv, price_category e seasonality_category
+    """
+    keys = list(series_data.keys())
+    if not keys:
+        return pd.DataFrame(columns=['median_price', 'total_quantity', 'seasonality_cv',
+                                     'price_category', 'seasonality_category'])
+
+    lengths = [len(series_data[k]['date']) for k in keys]
+    df = pd.DataFrame({
+        'item_id': np.repeat([k[0] for k in keys], lengths),
+        'month': np.concatenate([
+            np.asarray(series_data[k]['date'], dtype='datetime64[M]').astype(np.int64) % 12 + 1 for k in keys
+        ]),
+        'quantity': np.concatenate([np.asarray(series_data[k]['quantity'], dtype=np.float64) for k in keys]),
+        'unit_price': np.concatenate([np.asarray(series_data[k]['unit_price'], dtype=np.float64) for k in keys]),
+    })
+
+    items = df.groupby('item_id').agg(median_price=('unit_price', 'median'), total_quantity=('quantity', 'sum'))
+
+    monthly = df.groupby(['item_id', 'month'])['quantity'].sum().groupby('item_id').agg(['std', 'mean'])
+    items['seasonality_cv'] = np.where(monthly['mean'] > 0, monthly['std'] / monthly['mean'], 0.0)
+    items['seasonality_cv'] = items['seasonality_cv'].fillna(0.0)
+
+    return categorize_items(items)
+
+
+def categorize_items(items):
+    """Faixa de preço (percentis 33/66 entre os itens recebidos) e sazonalidade"""
+    p33 = items['median_price'].quantile(0.33)
+    p66 = items['median_price'].quantile(0.66)
+    items['price_category'] = [price_category(p, p33, p66) for p in items['median_price']]
+    items['seasonality_category'] = [seasonality_category(cv) for cv in items['seasonality_cv']]
+    return items
+
+
+def classify_active_items(pg_conn_str):
+    """
+    Mesma classificação de classify_items, mas agregada no banco sobre TODAS as
+    séries ativas (mesmo critério da seleção de itens do pipeline), sem carregar
+    as séries. Usada quando a execução só carregou parte delas.
+    """
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    cur.execute("""
+        WITH active AS (
+            SELECT s.item_id, s.store_id
+            FROM public.sales_sale s
+            JOIN public.items_item i ON s.item_id = i.code::int
+            WHERE s.date >= CURRENT_DATE - INTERVAL '90 days'
+              AND i.is_disabled_purchase = false
+            GROUP BY s.item_id, s.store_id
+            HAVING COUNT(*) >= 10
+        ),
+        daily AS (
+            SELECT s.item_id, s.date,
+                   SUM(s.quantity)::float8 AS quantity,
+                   ROUND(SUM(s.quantity * s.price) / NULLIF(SUM(s.quantity), 0), 0)::float8 AS unit_price
+            FROM public.sales_sale s
+            JOIN active a ON a.item_id = s.item_id AND a.store_id = s.store_id
+            GROUP BY s.item_id, s.store_id, s.date
+        ),
+        monthly AS (
+            SELECT item_id, SUM(quantity) AS quantity
+            FROM daily
+            GROUP BY item_id, EXTRACT(MONTH FROM date)
+        ),
+        cv AS (
+            SELECT item_id,
+                   CASE WHEN AVG(quantity) > 0
+                        THEN COALESCE(STDDEV_SAMP(quantity) / AVG(quantity), 0) ELSE 0 END AS seasonality_cv
+            FROM monthly
+            GROUP BY item_id
+        )
+        SELECT d.item_id,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY d.unit_price) AS median_price,
+               SUM(d.quantity) AS total_quantity,
+               cv.seasonality_cv
+        FROM daily d
+        JOIN cv ON cv.item_id = d.item_id
+        GROUP BY d.item_id, cv.seasonality_cv
+    """)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    items = pd.DataFrame(rows, columns=['item_id', 'median_price', 'total_quantity', 'seasonality_cv'])
+    items = items.set_index('item_id').astype(np.float64)
+    if items.empty:
+        return items.assign(price_category=pd.Series(dtype=object), seasonality_category=pd.Series(dtype=object))
+    return categorize_items(items)
+
+
+def load_classifications(pg_conn_str):
+    """Classificações persistidas: DataFrame indexado por item_id (+ updated_at)"""
+    create_classification_table(pg_conn_str)
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT item_id, median_price, total_quantity, seasonality_cv,
+               price_category, seasonality_category, updated_at
+        FROM forecast_product_classification
+    """)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    columns = ['item_id', 'median_price', 'total_quantity', 'seasonality_cv',
+               'price_category', 'seasonality_category', 'updated_at']
+    return pd.DataFrame(rows, columns=columns).set_index('item_id')
+
+
+def save_classifications(pg_conn_str, items):
+    """Grava (upsert) as classificações novas/refeitas"""
+    if items.empty:
+        return
+
+    records = [
+        (int(item_id), float(row.median_price), float(row.total_quantity), float(row.seasonality_cv),
+         row.price_category, row.seasonality_category)
+        for item_id, row in items.iterrows()
+    ]
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO forecast_product_classification (
+                item_id, median_price, total_quantity, seasonality_cv, price_category, seasonality_category
+            )
+            VALUES %s
+            ON CONFLICT (item_id) DO UPDATE SET
+                median_price = EXCLUDED.median_price,
+                total_quantity = EXCLUDED.total_quantity,
+                seasonality_cv = EXCLUDED.seasonality_cv,
+                price_category = EXCLUDED.price_category,
+                seasonality_category = EXCLUDED.seasonality_category,
+                updated_at = NOW()
+        """, records, page_size=1000)
+        conn.commit()
+        logger.info(f"{len(records)} classificações de produto gravadas")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def resolve_classifications(pg_conn_str, series_data, full_scope=True):
+    """
+    Classificação da execução: recalcula tudo em lote, mas mantém a
+    classificação persistida dos itens cujo preço mediano e volume não
+    mudaram além das tolerâncias (evita troca de modelo por ruído).
+    Itens novos, alterados ou com classificação velha são regravados.
+
+    full_scope: series_data tem todas as séries ativas. Se False (filtro de
+    lojas, execução retomada), classifica com classify_active_items; se essa
+    query falhar, usa as séries carregadas só nesta execução, sem gravar.
+
+    Returns:
+        (dict {item_id: {'price_category', 'seasonality_category'}}, nº de itens reclassificados)
+    """
+    persist = True
+    if full_scope:
+        current = classify_items(series_data)
+    else:
+        try:
+            current = classify_active_items(pg_conn_str)
+        except Exception as e:
+            logger.warning(f"Classificação global indisponível, usando só as séries da execução: {e}")
+            current = classify_items(series_data)
+            persist = False
+    if current.empty:
+        return {}, 0
+
+    try:
+        stored = load_classifications(pg_conn_str)
+    except Exception as e:
+        logger.warning(f"Classificações persistidas indisponíveis: {e}")
+        stored = pd.DataFrame()
+
+    if not stored.empty:
+        joined = current.join(stored, rsuffix='_stored', how='left')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            price_change = (joined['median_price'] - joined['median_price_stored']).abs() / joined['median_price_stored'].abs()
+            volume_change = (joined['total_quantity'] - joined['total_quantity_stored']).abs() / joined['total_quantity_stored'].abs()
+        age = pd.Timestamp.now() - pd.to_datetime(joined['updated_at'])
+        keep = (
+            joined['price_category_stored'].notna()
+            & (price_change.fillna(np.inf) <= PRICE_CHANGE_TOLERANCE)
+            & (volume_change.fillna(np.inf) <= VOLUME_CHANGE_TOLERANCE)
+            & (age <= pd.Timedelta(days=CLASSIFICATION_MAX_AGE_DAYS))
+        )
+        current.loc[keep, 'price_category'] = joined.loc[keep, 'price_category_stored']
+        current.loc[keep, 'seasonality_category'] = joined.loc[keep, 'seasonality_category_stored']
+        changed = current.loc[~keep]
+    else:
+        changed = current
+
+    try:
+        # Classes de escopo parcial não sobrescrevem a tabela global
+        if persist:
+            save_classifications(pg_conn_str, changed)
+    except Exception as e:
+        logger.warning(f"Erro ao gravar classificações: {e}")
+
+    lookup = current[['price_category', 'seasonality_category']].to_dict('index')
+    return lookup, len(changed)
@@ -0,0 +1,155 @@
+# app/utils/run_ledger.py
+"""
+Ledger de execuções do forecast: marca d'água por série (última data de
+venda + hash do conteúdo usado no ajuste). Permite reprocessar só as séries
+que mudaram (ou ficaram velhas) desde a última execução.
+"""
+import hashlib
+import psycopg2
+import psycopg2.extras
+import numpy as np
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def create_series_ledger_table(pg_conn_str):
+    """Cria tabela do ledger de séries"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_series_ledger (
+            store_id INTEGER NOT NULL,
+            item_id BIGINT NOT NULL,
+            last_sales_date DATE,
+            series_hash VARCHAR(32) NOT NULL,
+            n_rows INTEGER,
+            model_version VARCHAR(20),
+            forecast_periods INTEGER,
+            refreshed_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (store_id, item_id)
+        );
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_series_ledger criada/verificada")
+
+
+def series_fingerprint(series):
+    """
+    (última data de venda, hash do conteúdo) de uma série de load_active_series.
+    O hash cobre datas, quantidades e preços (preço entra na classificação).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(np.asarray(series['date'], dtype='datetime64[D]')).tobytes())
+    digest.update(np.ascontiguousarray(series['quantity'], dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(series['unit_price'], dtype=np.float64).tobytes())
+    last_date = np.asarray(series['date'], dtype='datetime64[D]').max().astype(object)
+    return last_date, digest.hexdigest()
+
+
+def load_series_ledger(pg_conn_str, store_ids=None):
+    """
+    Carrega o ledger.
+
+    Returns:
+        dict {(item_id, store_id): {'series_hash', 'last_sales_date', 'model_version',
+                                    'forecast_periods', 'refreshed_at'}}
+    """
+    create_series_ledger_table(pg_conn_str)
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    query = """
+        SELECT store_id, item_id, last_sales_date, series_hash, model_version, forecast_periods, refreshed_at
+        FROM forecast_series_ledger
+    """
+    if store_ids:
+        cur.execute(query + " WHERE store_id = ANY(%s)", (list(store_ids),))
+    else:
+        cur.execute(query)
+
+    ledger = {
+        (item_id, store_id): {
+            'last_sales_date': last_sales_date,
+            'series_hash': series_hash,
+            'model_version': model_version,
+            'forecast_periods': forecast_periods,
+            'refreshed_at': refreshed_at,
+        }
+        for store_id, item_id, last_sales_date, series_hash, model_version, forecast_periods, refreshed_at
+        in cur.fetchall()
+    }
+    cur.close()
+    conn.close()
+    return ledger
+
+
+def select_series_to_refresh(fingerprints, ledger, model_version, forecast_periods, stale_days, force_full=False):
+    """
+    Separa as séries em (reprocessar, inalteradas).
+
+    Reprocessa quando: não há entrada no ledger, o hash/última data mudou,
+    a versão do modelo ou o horizonte mudou, a entrada tem mais de
+    stale_days dias, ou force_full=True.
+    """
+    if force_full:
+        return list(fingerprints.keys()), []
+
+    stale_before = datetime.now() - timedelta(days=stale_days)
+    refresh, unchanged = [], []
+    for key, (last_date, series_hash) in fingerprints.items():
+        entry = ledger.get(key)
+        if (entry is None
+                or entry['series_hash'] != series_hash
+                or entry['last_sales_date'] != last_date
+                or entry['model_version'] != model_version
+                or entry['forecast_periods'] != forecast_periods
+                or entry['refreshed_at'] is None
+                or entry['refreshed_at'] < stale_before):
+            refresh.append(key)
+        else:
+            unchanged.append(key)
+    return refresh, unchanged
+
+
+def save_series_ledger(pg_conn_str, fingerprints, keys, model_version, forecast_periods, row_counts=None):
+    """Grava (upsert) a marca d'água das séries reprocessadas com sucesso"""
+    if not keys:
+        return
+
+    row_counts = row_counts or {}
+    records = [
+        (int(store_id), int(item_id), fingerprints[(item_id, store_id)][0], fingerprints[(item_id, store_id)][1],
+         row_counts.get((item_id, store_id)), model_version, forecast_periods)
+        for item_id, store_id in keys
+    ]
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO forecast_series_ledger (
+                store_id, item_id, last_sales_date, series_hash, n_rows, model_version, forecast_periods
+            )
+            VALUES %s
+            ON CONFLICT (store_id, item_id) DO UPDATE SET
+                last_sales_date = EXCLUDED.last_sales_date,
+                series_hash = EXCLUDED.series_hash,
+                n_rows = EXCLUDED.n_rows,
+                model_version = EXCLUDED.model_version,
+                forecast_periods = EXCLUDED.forecast_periods,
+                refreshed_at = NOW()
+        """, records, page_size=1000)
+        conn.commit()
+        logger.info(f"Ledger atualizado para {len(records)} séries")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
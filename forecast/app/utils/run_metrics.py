@@ -0,0 +1,229 @@
+# app/utils/run_metrics.py
+"""
+Métricas por execução, série e modelo: carga, backtest, previsão final, tempo de
+ajuste e de previsão (somados nas duas etapas), status, motivo da falha e linhas
+geradas, gravadas em forecast_run_metrics (e opcionalmente como Parquet no
+MLflow). Inclui consultas - séries mais lentas, modelos mais lentos e regressão
+entre duas execuções - e um CLI:
+
+    python -m app.utils.run_metrics slowest-series --run-id <run_id>
+    python -m app.utils.run_metrics slowest-models --run-id <run_id>
+    python -m app.utils.run_metrics compare --base <run_id> --run-id <run_id>
+"""
+import argparse
+import os
+import tempfile
+import psycopg2
+import psycopg2.extras
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+RUN_METRICS_COLUMNS = [
+    'run_id', 'store_id', 'item_id', 'model_name', 'load_seconds', 'backtest_seconds',
+    'final_seconds', 'fit_seconds', 'predict_seconds', 'status', 'failure_reason', 'output_rows', 'is_best'
+]
+
+
+def create_run_metrics_table(pg_conn_str):
+    """Cria tabela de métricas por execução/série/modelo"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_run_metrics (
+            run_id VARCHAR(100) NOT NULL,
+            store_id INTEGER NOT NULL,
+            item_id BIGINT NOT NULL,
+            model_name VARCHAR(50),
+            load_seconds REAL,
+            backtest_seconds REAL,
+            final_seconds REAL,
+            fit_seconds REAL,
+            predict_seconds REAL,
+            status VARCHAR(20) NOT NULL,
+            failure_reason VARCHAR(200),
+            output_rows INTEGER,
+            is_best BOOLEAN,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+
+    # Tabelas criadas antes da separação ajuste/previsão
+    cur.execute("""
+        ALTER TABLE forecast_run_metrics
+            ADD COLUMN IF NOT EXISTS fit_seconds REAL,
+            ADD COLUMN IF NOT EXISTS predict_seconds REAL;
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecast_run_metrics_run
+        ON forecast_run_metrics(run_id);
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_run_metrics criada/verificada")
+
+
+def series_metric_rows(run_id, df, load_seconds=None):
+    """
+    Linhas de métricas de um resultado de process_items_batch_safe: uma por
+    modelo avaliado ou, para séries sem previsão, uma linha com model_name None.
+    """
+    failure = df.attrs.get('series_failure')
+    if failure is not None:
+        item_id, store_id, reason = failure
+        return [(run_id, store_id, item_id, None, load_seconds, None, None, None, None, 'failed', reason[:200], 0, None)]
+
+    row = df.iloc[0]
+    return [
+        (run_id, row['store_id'], row['item_id'], model_name, load_seconds,
+         metrics['backtest_seconds'], metrics['final_seconds'],
+         metrics.get('fit_seconds'), metrics.get('predict_seconds'), metrics['status'],
+         metrics['failure_reason'], len(df), model_name == row['best_model'])
+        for model_name, metrics in df.attrs.get('model_metrics', {}).items()
+    ]
+
+
+def save_run_metrics(pg_conn_str, rows, create_table=True):
+    """
+    Grava as linhas de métricas da execução.
+    create_table=False quando a tabela já foi criada (gravação a cada bloco do writer).
+    """
+    if not rows:
+        return
+
+    def seconds(value):
+        return None if value is None else float(value)
+
+    records = [
+        (run_id, int(store_id), int(item_id), model_name, seconds(load), seconds(backtest), seconds(final),
+         seconds(fit), seconds(predict), status, reason, int(output_rows), is_best)
+        for run_id, store_id, item_id, model_name, load, backtest, final, fit, predict, status, reason, output_rows, is_best
+        in rows
+    ]
+
+    if create_table:
+        create_run_metrics_table(pg_conn_str)
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO forecast_run_metrics ({', '.join(RUN_METRICS_COLUMNS)})
+            VALUES %s
+        """, records, page_size=5000)
+        conn.commit()
+        logger.info(f"{len(records)} métricas da execução gravadas")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def log_metrics_artifact(mlflow_module, rows, run_id):
+    """Anexa as métricas como Parquet ao run do MLflow (requer pyarrow)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.warning("pyarrow não instalado, artefato Parquet das métricas ignorado")
+        return
+
+    df = pd.DataFrame(rows, columns=RUN_METRICS_COLUMNS)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"run_metrics_{run_id}.parquet")
+        df.to_parquet(path, index=False)
+        mlflow_module.log_artifact(path, artifact_path='run_metrics')
+
+
+def slowest_series(pg_conn_str, run_id, limit=20):
+    """Séries com maior tempo total (carga + backtest + final de todos os modelos)"""
+    conn = psycopg2.connect(pg_conn_str)
+    query = """
+    SELECT store_id, item_id,
+           MAX(load_seconds) AS load_s,
+           SUM(COALESCE(backtest_seconds, 0) + COALESCE(final_seconds, 0)) AS fit_s,
+           STRING_AGG(CASE WHEN is_best THEN model_name END, '') AS best_model,
+           STRING_AGG(DISTINCT failure_reason, '; ') AS failures
+    FROM forecast_run_metrics
+    WHERE run_id = %s
+    GROUP BY store_id, item_id
+    ORDER BY fit_s DESC
+    LIMIT %s
+    """
+    df = pd.read_sql(query, conn, params=(run_id, limit))
+    conn.close()
+    return df
+
+
+def slowest_models(pg_conn_str, run_id):
+    """Tempo por modelo: total, média e p95 por série, falhas e vitórias"""
+    conn = psycopg2.connect(pg_conn_str)
+    query = """
+    SELECT model_name,
+           COUNT(*) AS series,
+           SUM(backtest_seconds + final_seconds) AS total_s,
+           AVG(backtest_seconds + final_seconds) AS avg_s,
+           PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY backtest_seconds + final_seconds) AS p95_s,
+           SUM(fit_seconds) AS fit_s,
+           SUM(predict_seconds) AS predict_s,
+           SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) AS failures,
+           SUM(CASE WHEN is_best THEN 1 ELSE 0 END) AS wins
+    FROM forecast_run_metrics
+    WHERE run_id = %s AND model_name IS NOT NULL
+    GROUP BY model_name
+    ORDER BY total_s DESC
+    """
+    df = pd.read_sql(query, conn, params=(run_id,))
+    conn.close()
+    return df
+
+
+def compare_runs(pg_conn_str, base_run_id, run_id):
+    """Regressão entre execuções: tempo médio por série de cada modelo na base e na nova"""
+    conn = psycopg2.connect(pg_conn_str)
+    query = """
+    SELECT model_name,
+           AVG(CASE WHEN run_id = %(base)s THEN backtest_seconds + final_seconds END) AS base_avg_s,
+           AVG(CASE WHEN run_id = %(run)s THEN backtest_seconds + final_seconds END) AS run_avg_s,
+           SUM(CASE WHEN run_id = %(base)s AND status = 'failed' THEN 1 ELSE 0 END) AS base_failures,
+           SUM(CASE WHEN run_id = %(run)s AND status = 'failed' THEN 1 ELSE 0 END) AS run_failures
+    FROM forecast_run_metrics
+    WHERE run_id IN (%(base)s, %(run)s) AND model_name IS NOT NULL
+    GROUP BY model_name
+    """
+    df = pd.read_sql(query, conn, params={'base': base_run_id, 'run': run_id})
+    conn.close()
+    df['change_pct'] = (df['run_avg_s'] / df['base_avg_s'] - 1) * 100
+    return df.sort_values('change_pct', ascending=False)
+
+
+def main():
+    from app.config import Config
+
+    parser = argparse.ArgumentParser(description='Consulta das métricas por execução do forecast')
+    parser.add_argument('command', choices=['slowest-series', 'slowest-models', 'compare'])
+    parser.add_argument('--dsn', default=Config.POSTGRES_CONNECTION_STRING, help='String de conexão PostgreSQL')
+    parser.add_argument('--run-id', required=True, help='Execução analisada')
+    parser.add_argument('--base', help='Execução de referência (compare)')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'slowest-series':
+        df = slowest_series(args.dsn, args.run_id, args.limit)
+    elif args.command == 'slowest-models':
+        df = slowest_models(args.dsn, args.run_id)
+    else:
+        if not args.base:
+            parser.error('compare exige --base')
+        df = compare_runs(args.dsn, args.base, args.run_id)
+
+    print(df.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# app/utils/run_state.py
+"""
+Checkpoint das execuções do forecast: cada série concluída (forecast gravado
+ou descartada por falta de dados) é registrada por run_id. Uma execução
+reiniciada com o mesmo run_id (ex: retry do Airflow) pula o que já terminou.
+"""
+import psycopg2
+import psycopg2.extras
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Registros de execuções mais antigas que isso são removidos
+RUN_STATE_RETENTION_DAYS = 30
+
+
+def create_run_state_table(pg_conn_str):
+    """Cria tabela de estado das execuções"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_run_state (
+            run_id VARCHAR(100) NOT NULL,
+            store_id INTEGER NOT NULL,
+            item_id BIGINT NOT NULL,
+            has_forecast BOOLEAN NOT NULL,
+            completed_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (run_id, store_id, item_id)
+        );
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecast_run_state_completed
+        ON forecast_run_state(completed_at);
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_run_state criada/verificada")
+
+
+def load_completed_series(pg_conn_str, run_id):
+    """
+    Séries já concluídas no run_id (e limpeza de execuções antigas).
+
+    Returns:
+        set {(item_id, store_id)}
+    """
+    create_run_state_table(pg_conn_str)
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM forecast_run_state WHERE completed_at < NOW() - make_interval(days => %s)",
+        (RUN_STATE_RETENTION_DAYS,)
+    )
+    cur.execute("SELECT item_id, store_id FROM forecast_run_state WHERE run_id = %s", (run_id,))
+    completed = set(cur.fetchall())
+    conn.commit()
+    cur.close()
+    conn.close()
+    return completed
+
+
+def mark_series_completed(pg_conn_str, run_id, keys, has_forecast=True):
+    """Registra as séries (item_id, store_id) como concluídas no run_id"""
+    if not keys:
+        return
+
+    records = [(run_id, int(store_id), int(item_id), has_forecast) for item_id, store_id in keys]
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO forecast_run_state (run_id, store_id, item_id, has_forecast)
+            VALUES %s
+            ON CONFLICT (run_id, store_id, item_id) DO UPDATE SET
+                has_forecast = EXCLUDED.has_forecast,
+                completed_at = NOW()
+        """, records, page_size=1000)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
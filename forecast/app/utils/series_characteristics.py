@@ -0,0 +1,174 @@
+# app/utils/series_characteristics.py
+"""
+Caracterização em lote das séries da SeriesMatrix: força da tendência,
+autocorrelação lag 7, proporção de zeros (intermitência) e estacionariedade,
+calculadas para todas as linhas de uma vez em NumPy - em vez de linregress,
+autocorr e adfuller série a série.
+
+Cada série é avaliada no mesmo trecho que process_item_forecast usa para
+escolher os modelos: o treino do backtest (len - 2 x forecast_periods + 1
+dias) quando há dados para backtest, senão a série inteira.
+"""
+import numpy as np
+from scipy.optimize import brentq
+from statsmodels.tsa.adfvalues import mackinnonp
+
+# Limite de zeros para a série ser tratada como intermitente
+INTERMITTENT_ZERO_RATIO = 0.3
+
+# Linhas por bloco em characterize_series_matrix: limita a memória das matrizes
+# bloco x T (e do tensor bloco x T x p do ADF), independente do número de séries
+ADF_CHUNK_ROWS = 1000
+
+# Nível do teste ADF (mesmo critério de analyze_time_series_characteristics: p < 0.05)
+ADF_P_VALUE = 0.05
+
+
+def _pearson(x, y, w):
+    """Correlação de Pearson linha a linha considerando só as posições w=True"""
+    n = w.sum(axis=1)
+    xw, yw = np.where(w, x, 0.0), np.where(w, y, 0.0)
+    sx, sy = xw.sum(axis=1), yw.sum(axis=1)
+    sxy = (xw * yw).sum(axis=1)
+    sxx = (xw * xw).sum(axis=1)
+    syy = (yw * yw).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        denom = np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+        return np.where(denom > 0, cov / denom, np.nan)
+
+
+def _normal_equations(X, target):
+    """X'X, X'y e y'y por linha (X: n x T x p e target: n x T já mascarados)"""
+    Xt = X.transpose(0, 2, 1)
+    return Xt @ X, (Xt @ target[:, :, None])[:, :, 0], (target * target).sum(axis=1)
+
+
+def _solve_ols(XtX, Xty, yty):
+    """OLS por linha a partir das equações normais. Retorna beta, SSR e (X'X)^+"""
+    XtX_inv = np.linalg.pinv(XtX)
+    beta = np.einsum('npq,nq->np', XtX_inv, Xty)
+    ssr = np.maximum(yty - np.einsum('np,np->n', beta, Xty), 0.0)
+    return beta, ssr, XtX_inv
+
+
+def _adf_tstats(Y, lengths):
+    """
+    Estatística t do ADF com constante para cada linha de Y (alinhada à
+    esquerda, lengths[i] valores válidos), reproduzindo adfuller(autolag='AIC'):
+    maxlag de Schwert, escolha do lag pelo AIC numa amostra comum e
+    regressão final com o lag escolhido - tudo em mínimos quadrados em lote.
+    Y é um bloco de até ADF_CHUNK_ROWS linhas (characterize_series_matrix).
+    """
+    n_rows, width = Y.shape
+    if width < 4:
+        return np.full(n_rows, np.nan)
+
+    maxlags = np.minimum(np.ceil(12.0 * np.power(lengths / 100.0, 0.25)).astype(int), lengths // 2 - 2)
+    max_lag = int(max(maxlags.max(), 0))
+
+    # Equações t = 1..width-1: dy_t = a + g*y_{t-1} + soma b_k*dy_{t-k}
+    dY = np.diff(Y, axis=1)                          # dY[:, j] = y[j+1] - y[j]
+    t_idx = np.arange(1, width)
+    p = max_lag + 2
+
+    X = np.zeros((n_rows, width - 1, p))
+    X[:, :, 0] = 1.0
+    X[:, :, 1] = Y[:, :-1]
+    for k in range(1, max_lag + 1):
+        X[:, k:, 1 + k] = dY[:, :width - 1 - k]
+    target = dY
+    in_series = t_idx[None, :] < lengths[:, None]
+
+    # 1) Lag pelo AIC, amostra comum t >= maxlag + 1
+    common = in_series & (t_idx[None, :] >= maxlags[:, None] + 1)
+    n_common = common.sum(axis=1)
+    XtX, Xty, yty = _normal_equations(X * common[:, :, None], np.where(common, target, 0.0))
+    aic = np.full((n_rows, max_lag + 1), np.inf)
+    for k in range(max_lag + 1):
+        _, ssr, _ = _solve_ols(XtX[:, :k + 2, :k + 2], Xty[:, :k + 2], yty)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aic[:, k] = np.where(k <= maxlags, n_common * np.log(ssr / n_common) + 2 * (k + 2), np.inf)
+    best_lag = np.argmin(np.nan_to_num(aic, nan=np.inf), axis=1)
+
+    # 2) Regressão final com o lag escolhido, amostra t >= lag + 1
+    sample = in_series & (t_idx[None, :] >= best_lag[:, None] + 1)
+    used_cols = np.arange(p)[None, :] < best_lag[:, None] + 2
+    Xf = X * sample[:, :, None] * used_cols[:, None, :]
+    beta, ssr, XtX_inv = _solve_ols(*_normal_equations(Xf, np.where(sample, target, 0.0)))
+    dof = sample.sum(axis=1) - (best_lag + 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        se = np.sqrt(ssr / dof * XtX_inv[:, 1, 1])
+        t_stats = np.where((dof > 0) & (se > 0) & (maxlags >= 0), beta[:, 1] / se, np.nan)
+
+    return t_stats
+
+
+def _adf_threshold(p_value=0.05):
+    """Estatística t em que o p-valor de MacKinnon (constante, assintótico) vale p_value"""
+    return brentq(lambda t: mackinnonp(t, regression='c', N=1) - p_value, -10.0, 0.0)
+
+
+def characterize_series_matrix(matrix, forecast_periods):
+    """
+    Características de todas as séries da matriz.
+
+    Returns:
+        dict {(item_id, store_id): {'trend_strength', 'weekly_seasonality',
+                                    'zero_ratio', 'is_intermittent', 'is_stationary'}}
+    """
+    if len(matrix) == 0:
+        return {}
+
+    lengths_full = matrix.ends - matrix.starts + 1
+    backtest = lengths_full >= 2 * forecast_periods
+    lengths = np.where(backtest, lengths_full - 2 * forecast_periods + 1, lengths_full)
+    lengths = np.maximum(lengths, 0)
+
+    n_series = len(lengths)
+    trend_strength = np.empty(n_series)
+    weekly_seasonality = np.empty(n_series)
+    zero_ratio = np.empty(n_series)
+    t_stats = np.empty(n_series)
+
+    # Blocos de linhas: cada linha só depende do próprio trecho, então os temporários
+    # (Y, máscara, Pearson, ADF) ficam do tamanho do bloco
+    for start in range(0, n_series, ADF_CHUNK_ROWS):
+        rows = slice(start, start + ADF_CHUNK_ROWS)
+        lengths_c = lengths[rows]
+
+        # Trechos alinhados à esquerda: Y[i, :lengths[i]] = série i no trecho de avaliação
+        width = int(lengths_c.max())
+        offsets = np.arange(width)
+        cols = np.minimum(matrix.starts[rows, None] + offsets[None, :], matrix.values.shape[1] - 1)
+        Y = np.take_along_axis(matrix.values[rows], cols, axis=1).astype(np.float64)
+        w = offsets[None, :] < lengths_c[:, None]
+        Y[~w] = 0.0
+
+        # Tendência: |r| da regressão linear no tempo
+        x = np.broadcast_to(offsets.astype(np.float64), Y.shape)
+        trend_strength[rows] = np.nan_to_num(np.abs(_pearson(x, Y, w)))
+
+        # Sazonalidade semanal: |autocorrelação lag 7| (como pd.Series.autocorr)
+        lag7 = _pearson(Y[:, 7:], Y[:, :-7], w[:, 7:]) if width > 7 else np.full(len(Y), np.nan)
+        weekly_seasonality[rows] = np.nan_to_num(np.abs(lag7))
+
+        # Intermitência
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zero_ratio[rows] = np.where(lengths_c > 0, ((Y == 0) & w).sum(axis=1) / lengths_c, 1.0)
+
+        t_stats[rows] = _adf_tstats(Y, lengths_c)
+
+    # Estacionariedade: ADF em lote; p-valor < ADF_P_VALUE equivale a t abaixo do limiar
+    is_stationary = np.nan_to_num(t_stats, nan=np.inf) < _adf_threshold(ADF_P_VALUE)
+
+    return {
+        key: {
+            'trend_strength': float(trend_strength[row]),
+            'weekly_seasonality': float(weekly_seasonality[row]),
+            'zero_ratio': float(zero_ratio[row]),
+            'is_intermittent': bool(zero_ratio[row] > INTERMITTENT_ZERO_RATIO),
+            'is_stationary': bool(is_stationary[row]),
+        }
+        for row, key in enumerate(matrix.keys)
+    }
@@ -0,0 +1,95 @@
+# app/utils/series_matrix.py
+"""
+Matriz densa de vendas diárias: todas as séries carregadas pivotadas uma única
+vez num array contíguo (n_series, n_days) float32 sobre um calendário comum,
+com máscara de dias preenchidos com zero e mapas (item_id, store_id) -> linha.
+
+Os modelos leem cada série como view (sem cópia) do trecho entre a primeira e
+a última venda, no mesmo formato que prepare_data_for_item produzia.
+"""
+import numpy as np
+import pandas as pd
+
+
+def fill_daily_series(dates, quantity):
+    """Série diária completa (dias sem venda = 0) entre a primeira e a última data"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    first_day = days.min()
+    values = np.zeros(int((days.max() - first_day).astype(int)) + 1, dtype=np.float64)
+    np.add.at(values, (days - first_day).astype(int), np.nan_to_num(np.asarray(quantity, dtype=np.float64)))
+    return first_day, values
+
+
+class SeriesMatrix:
+    """Vendas diárias de todas as séries em um único array (n_series, n_days)"""
+
+    def __init__(self, keys, values, observed, first_day, starts, ends):
+        self.keys = keys
+        self.values = values          # float32 (n_series, n_days), 0 onde não houve venda
+        self.observed = observed      # bool (n_series, n_days), False = dia preenchido com zero
+        self.first_day = first_day    # datetime64[D] da coluna 0
+        self.starts = starts          # coluna da primeira venda de cada série
+        self.ends = ends              # coluna da última venda de cada série
+        self.row_index = {key: row for row, key in enumerate(keys)}
+        self.item_ids = np.array([key[0] for key in keys])
+        self.store_ids = np.array([key[1] for key in keys])
+        self.calendar = pd.date_range(start=pd.Timestamp(first_day), periods=values.shape[1], freq='D', name='date')
+
+    @classmethod
+    def from_series(cls, series_data, keys=None):
+        """Pivota o dict de load_active_series (datas, quantidades) de uma vez"""
+        keys = list(series_data.keys()) if keys is None else [k for k in keys if k in series_data]
+        if not keys:
+            return cls([], np.zeros((0, 0), dtype=np.float32), np.zeros((0, 0), dtype=bool),
+                       np.datetime64('1970-01-01', 'D'), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        lengths = np.array([len(series_data[k]['date']) for k in keys])
+        days = np.concatenate([np.asarray(series_data[k]['date'], dtype='datetime64[D]') for k in keys])
+        quantity = np.concatenate([np.asarray(series_data[k]['quantity'], dtype=np.float64) for k in keys])
+        rows = np.repeat(np.arange(len(keys)), lengths)
+
+        first_day = days.min()
+        cols = (days - first_day).astype(np.int64)
+        n_days = int(cols.max()) + 1
+
+        values = np.zeros((len(keys), n_days), dtype=np.float32)
+        observed = np.zeros((len(keys), n_days), dtype=bool)
+        np.add.at(values, (rows, cols), np.nan_to_num(quantity).astype(np.float32))
+        observed[rows, cols] = True
+
+        # Primeira/última venda por linha (séries vazias ficam com início > fim)
+        starts = np.full(len(keys), n_days, dtype=np.int64)
+        ends = np.full(len(keys), -1, dtype=np.int64)
+        np.minimum.at(starts, rows, cols)
+        np.maximum.at(ends, rows, cols)
+
+        return cls(keys, values, observed, first_day, starts, ends)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.row_index
+
+    def nbytes(self):
+        return self.values.nbytes + self.observed.nbytes
+
+    def daily(self, key):
+        """(primeiro dia, view float32 dos valores diários) da série, sem cópia"""
+        row = self.row_index[key]
+        start, end = self.starts[row], self.ends[row]
+        return self.first_day + start, self.values[row, start:end + 1]
+
+    def mask(self, key):
+        """View da máscara de dias observados (False = zero preenchido) da série"""
+        row = self.row_index[key]
+        return self.observed[row, self.starts[row]:self.ends[row] + 1]
+
+    def series(self, key):
+        """
+        pd.Series 'quantity' indexada por 'date' sobre a view da linha -
+        mesmo formato de prepare_data_for_item(...)['quantity'].
+        """
+        row = self.row_index[key]
+        start, end = self.starts[row], self.ends[row]
+        return pd.Series(self.values[row, start:end + 1], index=self.calendar[start:end + 1], name='quantity', copy=False)
@@ -0,0 +1,148 @@
+# app/utils/shared_series.py
+"""
+Séries de vendas em memória compartilhada para o modo 'process' do pipeline.
+
+O processo principal copia uma única vez as colunas numéricas de todas as
+séries para blocos de SharedMemory. Os workers anexam esses blocos no
+initializer e recebem por tarefa apenas (item_id, store_id, início, fim,
+category, brand) - nenhum DataFrame é serializado na ida.
+"""
+import numpy as np
+from multiprocessing import shared_memory, util
+
+# Colunas numéricas copiadas para memória compartilhada
+SHARED_COLUMNS = {
+    'date': 'int64',          # datetime64[ns] como int64
+    'quantity': 'float64',
+    'unit_price': 'float64',
+    'is_holiday': 'bool',
+}
+
+# Store anexado dentro de cada worker (preenchido por attach_worker_store)
+_WORKER_STORE = None
+
+
+class SharedSeriesStore:
+    """Colunas concatenadas de todas as séries em blocos de SharedMemory"""
+
+    def __init__(self, spec, blocks, owner=False):
+        self.spec = spec
+        self._blocks = blocks
+        self._owner = owner
+        self.arrays = {
+            col: np.ndarray((spec['length'],), dtype=np.dtype(dtype), buffer=blocks[col].buf)
+            for col, (_, dtype) in spec['columns'].items()
+        }
+        self.entries = {}
+
+    @classmethod
+    def from_series(cls, series_data):
+        """Cria os blocos a partir do dict de load_active_series (processo principal)"""
+        keys = list(series_data.keys())
+        lengths = [len(series_data[k]['date']) for k in keys]
+        total = int(sum(lengths))
+
+        blocks = {}
+        columns = {}
+        try:
+            for col, dtype in SHARED_COLUMNS.items():
+                nbytes = max(1, total * np.dtype(dtype).itemsize)
+                shm = shared_memory.SharedMemory(create=True, size=nbytes)
+                blocks[col] = shm
+                columns[col] = (shm.name, dtype)
+        except Exception:
+            for shm in blocks.values():
+                shm.close()
+                shm.unlink()
+            raise
+
+        store = cls({'length': total, 'columns': columns}, blocks, owner=True)
+
+        offset = 0
+        for key, length in zip(keys, lengths):
+            series = series_data[key]
+            end = offset + length
+            store.arrays['date'][offset:end] = np.asarray(series['date'], dtype='datetime64[ns]').view('int64')
+            store.arrays['quantity'][offset:end] = series['quantity']
+            store.arrays['unit_price'][offset:end] = series['unit_price']
+            store.arrays['is_holiday'][offset:end] = series['is_holiday']
+            store.entries[key] = (offset, end, series['category'], series['brand'])
+            offset = end
+
+        return store
+
+    @classmethod
+    def attach(cls, spec):
+        """Anexa blocos já existentes (dentro do worker)"""
+        blocks = {
+            col: shared_memory.SharedMemory(name=name)
+            for col, (name, _) in spec['columns'].items()
+        }
+        return cls(spec, blocks, owner=False)
+
+    def batch_entries(self, batch_items):
+        """Descritores leves das séries de um batch, enviados junto com a tarefa"""
+        entries = []
+        for item_id, store_id in batch_items:
+            entry = self.entries.get((item_id, store_id))
+            if entry is not None:
+                entries.append((item_id, store_id) + entry)
+        return entries
+
+    def series_views(self, batch_entries):
+        """Monta o dict {(item_id, store_id): arrays} com views (sem cópia)"""
+        series_data = {}
+        for item_id, store_id, start, end, category, brand in batch_entries:
+            series_data[(item_id, store_id)] = {
+                'date': self.arrays['date'][start:end].view('datetime64[ns]'),
+                'quantity': self.arrays['quantity'][start:end],
+                'unit_price': self.arrays['unit_price'][start:end],
+                'is_holiday': self.arrays['is_holiday'][start:end],
+                'holiday_name': np.full(end - start, None, dtype=object),
+                'category': category,
+                'brand': brand,
+            }
+        return series_data
+
+    def close(self):
+        """Libera os blocos (e remove do sistema, se for o processo dono)"""
+        self.arrays = {}
+        for shm in self._blocks.values():
+            shm.close()
+            if self._owner:
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+        self._blocks = {}
+
+
+def attach_worker_store(spec):
+    """
+    Initializer do ProcessPoolExecutor: anexa o store uma vez por worker e
+    agenda o fechamento para a saída do worker (reciclagem ou fim do pool).
+    """
+    global _WORKER_STORE
+    _WORKER_STORE = SharedSeriesStore.attach(spec)
+    # Workers saem por os._exit: atexit não roda, mas os finalizadores do multiprocessing sim
+    util.Finalize(None, close_worker_store, exitpriority=10)
+
+
+def close_worker_store():
+    """Fecha os blocos anexados neste worker (o processo principal é quem remove)"""
+    global _WORKER_STORE
+    if _WORKER_STORE is None:
+        return
+    try:
+        _WORKER_STORE.close()
+    except BufferError:
+        # Ainda há views do último batch vivas; o mapeamento é liberado com o processo
+        pass
+    _WORKER_STORE = None
+
+
+def worker_series(batch_entries):
+    """Séries de um batch dentro do worker, lidas do store anexado"""
+    if _WORKER_STORE is None:
+        raise RuntimeError("SharedSeriesStore não anexado neste worker")
+    return _WORKER_STORE.series_views(batch_entries)
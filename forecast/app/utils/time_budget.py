@@ -0,0 +1,37 @@
+# app/utils/time_budget.py
+"""
+Orçamentos de tempo por série e por modelo, com cancelamento cooperativo.
+
+Um ajuste em andamento (Stan do Prophet, otimizador do statsmodels) não pode ser
+interrompido de fora numa thread: os modelos consultam o prazo entre etapas
+(candidatos da busca stepwise do ARIMA, passos da previsão recursiva do XGBoost)
+e desistem ao estourá-lo. Entre modelos, process_item_forecast pula o ajuste
+final de quem estourou no backtest, passa ao próximo modelo e, se nenhum gerou
+previsão, cai para um baseline barato. O ajuste que trava de vez é cortado pelo
+prazo rígido do modo 'process' (batch_runner) e pelo teto de iterações.
+"""
+import time
+
+
+class TimeBudget:
+    """Prazo de `seconds` segundos a partir da criação (0 ou negativo = sem limite)"""
+
+    def __init__(self, seconds=0, parent=None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds if seconds and seconds > 0 else float('inf')
+        if parent is not None:
+            self.deadline = min(self.deadline, parent.deadline)
+
+    def child(self, seconds):
+        """Orçamento de uma etapa: `seconds` ou o que resta deste, o que acabar antes"""
+        return TimeBudget(seconds, parent=self)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
@@ -0,0 +1,194 @@
+# app/utils/transfer_pipeline.py
+"""
+Pipeline de três estágios para as transferências SQL Server -> PostgreSQL.
+
+    extração (thread) -> transformação (thread) -> COPY/upsert (thread chamadora)
+
+Enquanto um bloco é gravado no Postgres, o seguinte já está sendo lido do SQL
+Server e convertido: pyodbc e psycopg2 liberam o GIL durante a rede, então as
+esperas dos dois bancos se sobrepõem em vez de se alternarem. As filas entre os
+estágios são limitadas (contrapressão): se o Postgres atrasa, leitura e
+transformação param em vez de acumular blocos em memória.
+
+Cada estágio conta blocos, linhas, tempo ocupado e tempo parado esperando o
+estágio anterior (entrada vazia) ou o seguinte (fila cheia), o que mostra onde
+está o gargalo de cada transferência.
+"""
+import queue
+import threading
+import time
+
+# Marca de fim de fluxo entre os estágios
+_END = object()
+
+
+class StageStats:
+    """Contadores de um estágio do pipeline"""
+
+    def __init__(self, name):
+        self.name = name
+        self.chunks = 0
+        self.rows = 0
+        self.busy_s = 0.0
+        self.wait_input_s = 0.0    # parado esperando o estágio anterior
+        self.wait_output_s = 0.0   # parado com a fila seguinte cheia (contrapressão)
+
+    def rows_per_s(self):
+        return self.rows / self.busy_s if self.busy_s > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'chunks': self.chunks,
+            'rows': self.rows,
+            'busy_s': round(self.busy_s, 3),
+            'wait_input_s': round(self.wait_input_s, 3),
+            'wait_output_s': round(self.wait_output_s, 3),
+            'rows_per_s': round(self.rows_per_s(), 1),
+        }
+
+
+class PipelineStats:
+    """Estatísticas dos três estágios e tempo total de parede"""
+
+    def __init__(self):
+        self.extract = StageStats('extract')
+        self.transform = StageStats('transform')
+        self.load = StageStats('load')
+        self.wall_s = 0.0
+
+    def stages(self):
+        return (self.extract, self.transform, self.load)
+
+    def as_dict(self):
+        stats = {stage.name: stage.as_dict() for stage in self.stages()}
+        stats['wall_s'] = round(self.wall_s, 3)
+        return stats
+
+    def summary(self):
+        lines = [f"⏱️ Pipeline: {self.load.rows} linhas em {self.wall_s:.1f}s"]
+        for stage in self.stages():
+            lines.append(
+                f"   {stage.name:<9} {stage.chunks:>5} blocos | {stage.rows_per_s():>9.0f} linhas/s | "
+                f"ocupado {stage.busy_s:.1f}s | espera entrada {stage.wait_input_s:.1f}s | "
+                f"fila cheia {stage.wait_output_s:.1f}s"
+            )
+        return "\n".join(lines)
+
+
+def _put(q, item, stop, stats):
+    """Coloca na fila limitada; desiste se o pipeline foi interrompido"""
+    started = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+    finally:
+        stats.wait_output_s += time.perf_counter() - started
+
+
+def _get(q, stop, stats):
+    """Retira da fila; devolve _END se o pipeline foi interrompido"""
+    started = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return _END
+    finally:
+        stats.wait_input_s += time.perf_counter() - started
+
+
+def run_transfer_pipeline(row_chunks, transform, load, queue_size=4, on_chunk=None):
+    """
+    Executa extração, transformação e carga em paralelo.
+
+    Args:
+        row_chunks: iterável de blocos de linhas da origem (ex.: stream_rows);
+            é consumido numa thread própria, que deve ser a única a usar o cursor.
+        transform: função bloco -> payload pronto para gravar (thread própria).
+        load: função payload -> None que grava e faz commit; roda na thread
+            chamadora, dona da conexão PostgreSQL.
+        queue_size: blocos que cabem em cada fila entre os estágios.
+        on_chunk: callback(linhas_do_bloco) após cada carga (progresso).
+
+    Returns:
+        PipelineStats. Uma exceção em qualquer estágio interrompe os demais e é
+        relançada aqui.
+    """
+    stats = PipelineStats()
+    raw_queue = queue.Queue(maxsize=queue_size)
+    ready_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def extractor():
+        chunks = iter(row_chunks)
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                chunk = next(chunks, _END)
+                stats.extract.busy_s += time.perf_counter() - started
+                if chunk is _END:
+                    break
+                stats.extract.chunks += 1
+                stats.extract.rows += len(chunk)
+                if not _put(raw_queue, chunk, stop, stats.extract):
+                    return
+        except Exception as e:
+            errors.append(e)
+        _put(raw_queue, _END, stop, stats.extract)
+
+    def transformer():
+        try:
+            while True:
+                chunk = _get(raw_queue, stop, stats.transform)
+                if chunk is _END:
+                    break
+                started = time.perf_counter()
+                payload = transform(chunk)
+                stats.transform.busy_s += time.perf_counter() - started
+                stats.transform.chunks += 1
+                stats.transform.rows += len(chunk)
+                if not _put(ready_queue, (len(chunk), payload), stop, stats.transform):
+                    return
+        except Exception as e:
+            errors.append(e)
+        _put(ready_queue, _END, stop, stats.transform)
+
+    wall_started = time.perf_counter()
+    threads = [
+        threading.Thread(target=extractor, name='transfer-extract', daemon=True),
+        threading.Thread(target=transformer, name='transfer-transform', daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = _get(ready_queue, stop, stats.load)
+            if item is _END:
+                break
+            n_rows, payload = item
+            started = time.perf_counter()
+            load(payload)
+            stats.load.busy_s += time.perf_counter() - started
+            stats.load.chunks += 1
+            stats.load.rows += n_rows
+            if on_chunk:
+                on_chunk(n_rows)
+    finally:
+        # Em erro na carga, libera as threads presas em filas cheias
+        stop.set()
+        for thread in threads:
+            thread.join()
+        stats.wall_s = time.perf_counter() - wall_started
+
+    if errors:
+        raise errors[0]
+    return stats
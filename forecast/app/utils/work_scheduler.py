@@ -0,0 +1,169 @@
+# app/utils/work_scheduler.py
+"""
+Agendamento dos batches pelo custo histórico de cada série: o tempo de ajuste
+por modelo é gravado a cada execução (média móvel exponencial) e a execução
+seguinte monta batches de custo parecido, despachados do mais caro para o mais
+barato (LPT - longest processing time first). Como o pool entrega o próximo
+batch ao primeiro worker livre, as séries pesadas começam cedo e o fim da
+execução não fica preso a um worker só.
+"""
+import heapq
+import psycopg2
+import psycopg2.extras
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Peso da execução atual na média do custo (1.0 = só a última execução)
+COST_SMOOTHING = 0.5
+
+# Batches por worker no LPT: mais batches equilibram melhor, menos reduzem overhead
+BATCHES_PER_WORKER = 4
+
+# Custos de modelo não medidos há mais que isso não entram na estimativa
+COST_MAX_AGE_DAYS = 30
+
+
+def create_series_cost_table(pg_conn_str):
+    """Cria tabela de custo por série/modelo"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_series_cost (
+            store_id INTEGER NOT NULL,
+            item_id BIGINT NOT NULL,
+            model_name VARCHAR(50) NOT NULL,
+            seconds DOUBLE PRECISION NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (store_id, item_id, model_name)
+        );
+    """)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info("Tabela forecast_series_cost criada/verificada")
+
+
+def load_series_costs(pg_conn_str, store_ids=None):
+    """
+    Custo estimado (segundos, soma dos modelos) por série. Só entram os modelos
+    do conjunto candidato atual da série (save_series_costs remove os que
+    deixaram de rodar) medidos nos últimos COST_MAX_AGE_DAYS dias.
+
+    Returns:
+        dict {(item_id, store_id): segundos}
+    """
+    create_series_cost_table(pg_conn_str)
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    query = f"""
+        SELECT item_id, store_id, SUM(seconds) FROM forecast_series_cost
+        WHERE updated_at >= NOW() - INTERVAL '{COST_MAX_AGE_DAYS} days'
+    """
+    if store_ids:
+        cur.execute(query + " AND store_id = ANY(%s) GROUP BY item_id, store_id", (list(store_ids),))
+    else:
+        cur.execute(query + " GROUP BY item_id, store_id")
+    costs = {(item_id, store_id): seconds for item_id, store_id, seconds in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return costs
+
+
+def save_series_costs(pg_conn_str, timings):
+    """
+    Atualiza o custo das séries com os tempos da execução. Modelos que não
+    rodaram desta vez numa série medida (podados, desviados na triagem) saem da
+    tabela, para não inflar a estimativa.
+
+    Args:
+        timings: dict {(item_id, store_id): {modelo: segundos}}
+    """
+    records = [
+        (int(store_id), int(item_id), model_name, float(seconds))
+        for (item_id, store_id), models in timings.items()
+        for model_name, seconds in models.items()
+    ]
+    if not records:
+        return
+
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO forecast_series_cost (store_id, item_id, model_name, seconds)
+            VALUES %s
+            ON CONFLICT (store_id, item_id, model_name) DO UPDATE SET
+                seconds = {COST_SMOOTHING} * EXCLUDED.seconds + {1 - COST_SMOOTHING} * forecast_series_cost.seconds,
+                updated_at = NOW()
+        """, records, page_size=1000)
+        psycopg2.extras.execute_values(cur, """
+            DELETE FROM forecast_series_cost c
+            USING (VALUES %s) AS run (store_id, item_id, models)
+            WHERE c.store_id = run.store_id
+              AND c.item_id = run.item_id
+              AND NOT (c.model_name = ANY(run.models))
+        """, [
+            (int(store_id), int(item_id), list(models))
+            for (item_id, store_id), models in timings.items() if models
+        ], template="(%s, %s, %s::varchar[])", page_size=1000)
+        conn.commit()
+        logger.info(f"Custo de {len(timings)} séries atualizado")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def estimate_costs(keys, known_costs):
+    """Custo de cada série; séries sem histórico recebem a mediana das conhecidas (ou 1s)"""
+    known = sorted(known_costs[key] for key in keys if key in known_costs)
+    default = known[len(known) // 2] if known else 1.0
+    return {key: known_costs.get(key, default) for key in keys}
+
+
+def pack_batches_lpt(keys, costs, num_workers, max_batch_size):
+    """
+    workers x BATCHES_PER_WORKER batches (ou mais, se max_batch_size exigir) de
+    custo parecido: cada série, da mais cara para a mais barata, entra no batch
+    mais leve que ainda tem espaço. Devolvidos em ordem decrescente de custo.
+    """
+    if not keys:
+        return []
+    n_batches = max(num_workers * BATCHES_PER_WORKER, -(-len(keys) // max_batch_size))
+    n_batches = min(n_batches, len(keys))
+    batches = [[] for _ in range(n_batches)]
+    heap = [(0.0, i) for i in range(n_batches)]
+
+    for key in sorted(keys, key=lambda key: costs[key], reverse=True):
+        full = []
+        batch_cost, i = heapq.heappop(heap)
+        while len(batches[i]) >= max_batch_size:
+            full.append((batch_cost, i))
+            batch_cost, i = heapq.heappop(heap)
+        batches[i].append(key)
+        heapq.heappush(heap, (batch_cost + costs[key], i))
+        for entry in full:
+            heapq.heappush(heap, entry)
+
+    return sorted(batches, key=lambda b: sum(costs[key] for key in b), reverse=True)
+
+
+def simulate_makespan(batches, costs, num_workers):
+    """
+    Simula o pool despachando os batches na ordem dada para o primeiro worker livre.
+
+    Returns:
+        (makespan, tempo ocioso somado dos workers até o makespan)
+    """
+    workers = [0.0] * max(1, num_workers)
+    for batch in batches:
+        start = heapq.heappop(workers)
+        heapq.heappush(workers, start + sum(costs[key] for key in batch))
+    makespan = max(workers)
+    return makespan, sum(makespan - finish for finish in workers)
@@ -0,0 +1,410 @@
+# benchmarks/bench_forecasting.py
+"""
+Benchmark do motor de previsão com séries sintéticas (benchmarks/synthetic_series):
+throughput (séries/s), pico de RSS e acurácia por modelo e por modo do pipeline.
+
+Suítes:
+- models: cada modelo de ForecastingModels ajustado série a série (amostra de
+  --model-sample séries) e os motores em lote (Holt-Winters vetorizado,
+  XGBoost global, Croston/SBA/TSB/média móvel) sobre todas as séries, com
+  backtest + previsão final como no pipeline. Tudo em memória.
+- pipeline: main_forecast_pipeline completo em cada modo contra um Postgres
+  local DEDICADO (--dsn obrigatório; o banco é zerado a cada tamanho).
+
+Cada cenário roda num processo novo: o pico de RSS é o do próprio processo
+(inclui as séries sintéticas, ver data_rss_mb) e o dos workers no modo process.
+A acurácia é medida contra as vendas futuras geradas (fora do histórico):
+WAPE e RMSE no total e WAPE por perfil.
+
+--save grava os resultados em JSON; --baseline compara com um JSON anterior e
+sai com código 1 se throughput, memória ou WAPE pioraram além de --tolerance.
+
+Uso (dentro de forecast/):
+    python -m benchmarks.bench_forecasting models
+    python -m benchmarks.bench_forecasting models --sizes 1000 10000 50000 --models "Holt-Winters (numpy)" "XGBoost (global)"
+    python -m benchmarks.bench_forecasting pipeline --dsn "dbname=forecast_bench" --modes thread global triage
+    python -m benchmarks.bench_forecasting models --save base.json
+    python -m benchmarks.bench_forecasting models --baseline base.json --tolerance 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from benchmarks.synthetic_series import (
+    generate_series, load_into_postgres, prepare_benchmark_database, reset_forecast_state
+)
+
+FORECAST_PERIODS = 60
+
+# Mínimo de dias com venda para a série ser prevista (mesmo corte de process_items_batch_safe)
+MIN_SERIES_POINTS = 60
+
+# Filtro de itens ativos de main_forecast_pipeline: >= 10 dias com venda nos últimos 90 dias
+ACTIVE_WINDOW_DAYS = 90
+ACTIVE_MIN_DAYS = 10
+
+# Modelos ajustados série a série -> método de ForecastingModels
+SERIES_MODELS = {
+    'Prophet': 'prophet_model', 'ARIMA': 'arima_model', 'Holt-Winters': 'holt_winters_model',
+    'XGBoost': 'xgboost_model', 'Croston': 'croston_model', 'SBA': 'sba_model', 'TSB': 'tsb_model',
+}
+
+# Motores em lote (todas as séries de uma vez)
+BATCH_MODELS = [
+    'Holt-Winters (numpy)', 'XGBoost (global)', 'Croston (lote)', 'SBA (lote)', 'TSB (lote)',
+    'Moving-Average (lote)',
+]
+
+# Variáveis de ambiente de cada modo do pipeline (lidas no import de forecasting_service)
+PIPELINE_BASE_ENV = {'FORECAST_INCREMENTAL': 'False'}
+PIPELINE_MODES = {
+    'thread': {'FORECAST_EXECUTION_MODE': 'thread'},
+    'process': {'FORECAST_EXECUTION_MODE': 'process'},
+    'global': {'FORECAST_EXECUTION_MODE': 'thread', 'FORECAST_XGBOOST_MODE': 'global', 'FORECAST_HW_ENGINE': 'numpy'},
+    'triage': {'FORECAST_EXECUTION_MODE': 'thread', 'FORECAST_XGBOOST_MODE': 'global', 'FORECAST_HW_ENGINE': 'numpy',
+               'FORECAST_TRIAGE': 'True'},
+}
+
+PROFILES = ('stable', 'seasonal', 'intermittent')
+
+# Métricas comparadas com a baseline: True = maior é melhor
+GATE_METRICS = {'series_per_s': True, 'peak_rss_mb': False, 'wape': False}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Pico de RSS (MB) do processo ou do maior processo filho já encerrado"""
+    max_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return max_rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def _isolated_entry(result_queue, target, args):
+    try:
+        result_queue.put(('ok', target(*args)))
+    except Exception as e:
+        result_queue.put(('error', f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(target, *args):
+    """
+    Executa target(*args) num processo novo (spawn) e devolve o resultado.
+    Processo não-daemon: pode abrir o próprio pool (modo process do pipeline).
+    """
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_isolated_entry, args=(result_queue, target, args))
+    process.start()
+    try:
+        while True:
+            try:
+                status, result = result_queue.get(timeout=5)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"processo do cenário terminou com código {process.exitcode}")
+    finally:
+        process.join()
+    if status == 'error':
+        raise RuntimeError(result)
+    return result
+
+
+def score_forecasts(forecasts, dataset):
+    """
+    Acurácia das previsões finais contra as vendas futuras geradas.
+
+    Args:
+        forecasts: dict {(item_id, store_id): pd.Series indexada por data}
+
+    Returns:
+        dict com wape, rmse, pontos avaliados e wape_<perfil>
+    """
+    future_start = pd.Timestamp(dataset.end_date) + pd.Timedelta(days=1)
+    totals = {profile: np.zeros(4) for profile in PROFILES}  # |erro|, erro², vendas, pontos
+
+    for key, forecast in forecasts.items():
+        if key not in dataset.future or forecast is None:
+            continue
+        offsets = (pd.DatetimeIndex(forecast.index) - future_start).days.to_numpy()
+        valid = (offsets >= 0) & (offsets < dataset.horizon)
+        if not valid.any():
+            continue
+        actual = dataset.future[key][offsets[valid]]
+        error = np.asarray(forecast.values, dtype=np.float64)[valid] - actual
+        totals[dataset.profiles[key]] += (np.abs(error).sum(), (error ** 2).sum(), actual.sum(), valid.sum())
+
+    total = sum(totals.values())
+    scores = {
+        'wape': total[0] / total[2] if total[2] else None,
+        'rmse': float(np.sqrt(total[1] / total[3])) if total[3] else None,
+        'scored_points': int(total[3]),
+    }
+    for profile, values in totals.items():
+        scores[f"wape_{profile}"] = values[0] / values[2] if values[2] else None
+    return scores
+
+
+def _eligible_keys(dataset):
+    return [key for key, series in dataset.series.items() if len(series['date']) >= MIN_SERIES_POINTS]
+
+
+def _expected_pipeline_series(dataset):
+    """Séries que o pipeline deve prever (ativas e com o mínimo de dias com venda)"""
+    cutoff = np.datetime64(dataset.end_date + timedelta(days=1) - timedelta(days=ACTIVE_WINDOW_DAYS))
+    return sum(
+        1 for series in dataset.series.values()
+        if len(series['date']) >= MIN_SERIES_POINTS and (series['date'] >= cutoff).sum() >= ACTIVE_MIN_DAYS
+    )
+
+
+def _batch_intermittent(model, matrix, keys, forecast_periods):
+    """Um estimador intermitente em lote (backtest + final) como em fit_batch_intermittent"""
+    from app.utils.intermittent_demand import intermittent_forecast_matrix
+
+    values = [np.asarray(matrix.daily(key)[1], dtype=np.float64) for key in keys]
+    train = [v[:len(v) - 2 * forecast_periods + 1] for v in values if len(v) >= 2 * forecast_periods]
+    intermittent_forecast_matrix(train, forecast_periods, models=(model,))
+    final = intermittent_forecast_matrix(values, forecast_periods, models=(model,))[model]
+
+    forecasts = {}
+    for row, key in enumerate(keys):
+        last_day = pd.Timestamp(matrix.series(key).index[-1])
+        forecasts[key] = pd.Series(final[row], index=pd.date_range(last_day + pd.Timedelta(days=1), periods=forecast_periods))
+    return forecasts
+
+
+def model_scenario(model, size, settings):
+    """Cenário da suíte models (roda em processo isolado)"""
+    from app.forecasting_service import PROPHET_AVAILABLE, ForecastingModels
+    from app.utils.global_xgboost import fit_global_xgboost
+    from app.utils.holt_winters_vectorized import fit_batch_holt_winters
+    from app.utils.series_matrix import SeriesMatrix
+
+    if model == 'Prophet' and not PROPHET_AVAILABLE:
+        raise RuntimeError('Prophet não instalado')
+
+    fp = settings['periods']
+    dataset = generate_series(size, days=settings['days'], horizon=fp, n_stores=settings['stores'], seed=settings['seed'])
+    keys = _eligible_keys(dataset)
+    series_data = {key: dataset.series[key] for key in keys}
+    matrix = SeriesMatrix.from_series(series_data)
+    data_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    failed = 0
+    if model in SERIES_MODELS:
+        rng = np.random.default_rng(settings['seed'])
+        sample = rng.choice(len(keys), min(settings['model_sample'], len(keys)), replace=False)
+        keys = [keys[i] for i in sorted(sample)]
+        fit = getattr(ForecastingModels(), SERIES_MODELS[model])
+        forecasts = {}
+        for key in keys:
+            ts = matrix.series(key)
+            if len(ts) >= 2 * fp:
+                fit(ts.iloc[:len(ts) - 2 * fp + 1], periods=fp)
+            _, forecasts[key] = fit(ts, periods=fp)
+            failed += forecasts[key] is None
+    elif model == 'Holt-Winters (numpy)':
+        results = fit_batch_holt_winters(series_data, fp, matrix=matrix)
+        forecasts = {key: models['Holt-Winters']['final'] for key, models in results.items()}
+    elif model == 'XGBoost (global)':
+        results = fit_global_xgboost(series_data, fp, matrix=matrix)
+        forecasts = {key: models['XGBoost']['final'] for key, models in results.items()}
+    else:
+        forecasts = _batch_intermittent(model.split(' ')[0], matrix, keys, fp)
+    seconds = time.perf_counter() - start
+
+    if model not in SERIES_MODELS:
+        failed = len(keys) - len(forecasts)
+
+    return {
+        'series': len(keys), 'failed': int(failed), 'seconds': seconds,
+        'data_rss_mb': data_rss, 'peak_rss_mb': peak_rss_mb(), 'worker_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        **score_forecasts(forecasts, dataset),
+    }
+
+
+def pipeline_scenario(mode, pg_conn_str, forecast_periods):
+    """Cenário da suíte pipeline (roda em processo isolado; o modo vem do ambiente)"""
+    os.environ.update({**PIPELINE_BASE_ENV, **PIPELINE_MODES[mode]})
+    from app import forecasting_service
+
+    if not forecasting_service.PROPHET_AVAILABLE or not forecasting_service.XGBOOST_AVAILABLE:
+        raise RuntimeError('Prophet/XGBoost não instalados')
+
+    data_rss = peak_rss_mb()
+    start = time.perf_counter()
+    _, summary = forecasting_service.main_forecast_pipeline(
+        pg_conn_str, forecast_periods=forecast_periods, source='benchmark', executed_by='benchmark',
+        force_full_refresh=True, keep_results=False, run_id=f"benchmark_{mode}_{int(time.time())}"
+    )
+    seconds = time.perf_counter() - start
+
+    return {
+        'series': len(summary), 'seconds': seconds,
+        'data_rss_mb': data_rss, 'peak_rss_mb': peak_rss_mb(), 'worker_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        'best_models': summary['best_model'].value_counts().to_dict() if len(summary) else {},
+    }
+
+
+def read_best_forecasts(pg_conn_str):
+    """best_prediction gravado pelo pipeline, por série"""
+    conn = psycopg2.connect(pg_conn_str)
+    df = pd.read_sql(
+        "SELECT item_id, store_id, forecast_date, best_prediction FROM sales_salesforecast ORDER BY item_id, store_id, forecast_date",
+        conn
+    )
+    conn.close()
+    df['forecast_date'] = pd.to_datetime(df['forecast_date'])
+    return {
+        (int(item_id), int(store_id)): pd.Series(group['best_prediction'].to_numpy(), index=group['forecast_date'])
+        for (item_id, store_id), group in df.groupby(['item_id', 'store_id'])
+    }
+
+
+def run_models_suite(args, settings):
+    rows = []
+    for size in args.sizes:
+        for model in args.models:
+            try:
+                result = run_isolated(model_scenario, model, size, settings)
+            except RuntimeError as e:
+                print(f"⚠️  {size:>6} séries | {model:<22} | ignorado: {str(e)[:100]}")
+                continue
+            rows.append(_result_row('models', model, 'série' if model in SERIES_MODELS else 'lote', size, result))
+            _print_row(rows[-1])
+    return rows
+
+
+def run_pipeline_suite(args, settings):
+    if not args.dsn:
+        raise SystemExit('A suíte pipeline exige --dsn de um banco dedicado ao benchmark')
+
+    rows = []
+    for size in args.sizes:
+        dataset = generate_series(size, days=settings['days'], horizon=settings['periods'],
+                                  n_stores=settings['stores'], seed=settings['seed'])
+        prepare_benchmark_database(args.dsn)
+        load_start = time.perf_counter()
+        load_into_postgres(args.dsn, dataset)
+        print(f"📥 {size:>6} séries gravadas no banco de benchmark em {time.perf_counter() - load_start:.1f}s")
+
+        for mode in args.modes:
+            reset_forecast_state(args.dsn)
+            try:
+                result = run_isolated(pipeline_scenario, mode, args.dsn, settings['periods'])
+            except RuntimeError as e:
+                print(f"⚠️  {size:>6} séries | {mode:<22} | ignorado: {str(e)[:100]}")
+                continue
+            result['failed'] = max(0, _expected_pipeline_series(dataset) - result['series'])
+            result.update(score_forecasts(read_best_forecasts(args.dsn), dataset))
+            rows.append(_result_row('pipeline', mode, 'pipeline', size, result))
+            _print_row(rows[-1])
+            print(f"   🏆 Melhores modelos: {result['best_models']}")
+    return rows
+
+
+def _result_row(suite, name, engine, size, result):
+    row = {'suite': suite, 'name': name, 'engine': engine, 'size': size}
+    row.update({key: value for key, value in result.items() if key != 'best_models'})
+    row['series_per_s'] = result['series'] / result['seconds'] if result['seconds'] else None
+    return row
+
+
+def _fmt(value, pattern):
+    return '-' if value is None else format(value, pattern)
+
+
+def _print_row(row):
+    print(f"📊 {row['size']:>6} séries | {row['name']:<22} | {row['series']:>6} ajustadas em {row['seconds']:.1f}s "
+          f"({_fmt(row['series_per_s'], '.1f')} séries/s, {row.get('failed', 0)} sem previsão) | pico {row['peak_rss_mb']:.0f} MB | "
+          f"WAPE {_fmt(row['wape'], '.3f')} | RMSE {_fmt(row['rmse'], '.2f')}")
+
+
+def compare_with_baseline(rows, baseline_rows, tolerance):
+    """Regressões em relação à baseline (mesma suíte, cenário e tamanho) acima da tolerância"""
+    baseline = {(row['suite'], row['name'], row['size']): row for row in baseline_rows}
+    regressions = []
+    for row in rows:
+        base = baseline.get((row['suite'], row['name'], row['size']))
+        if base is None:
+            continue
+        for metric, higher_is_better in GATE_METRICS.items():
+            if row.get(metric) is None or not base.get(metric):
+                continue
+            change = row[metric] / base[metric] - 1
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(
+                    f"{row['suite']}/{row['name']}/{row['size']}: {metric} {base[metric]:.3f} -> {row[metric]:.3f} "
+                    f"({change:+.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do motor de previsão com séries sintéticas')
+    parser.add_argument('suite', choices=['models', 'pipeline'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='Número de séries (ex: 1000 10000 50000)')
+    parser.add_argument('--models', nargs='+', default=list(SERIES_MODELS) + BATCH_MODELS,
+                        choices=list(SERIES_MODELS) + BATCH_MODELS)
+    parser.add_argument('--model-sample', type=int, default=200, help='Séries por modelo ajustado série a série')
+    parser.add_argument('--modes', nargs='+', default=list(PIPELINE_MODES), choices=list(PIPELINE_MODES))
+    parser.add_argument('--dsn', help='String de conexão de um Postgres DEDICADO ao benchmark (suíte pipeline)')
+    parser.add_argument('--days', type=int, default=730, help='Dias de histórico por série')
+    parser.add_argument('--stores', type=int, default=10)
+    parser.add_argument('--periods', type=int, default=FORECAST_PERIODS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='Grava os resultados em JSON')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Piora relativa tolerada (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    settings = {
+        'days': args.days, 'stores': args.stores, 'periods': args.periods,
+        'seed': args.seed, 'model_sample': args.model_sample,
+    }
+    if args.suite == 'models':
+        rows = run_models_suite(args, settings)
+    else:
+        rows = run_pipeline_suite(args, settings)
+
+    if not rows:
+        print('❌ Nenhum cenário executado')
+        sys.exit(1)
+
+    print()
+    columns = ['suite', 'name', 'engine', 'size', 'series', 'failed', 'seconds', 'series_per_s', 'peak_rss_mb',
+               'worker_peak_rss_mb', 'wape', 'rmse'] + [f"wape_{profile}" for profile in PROFILES]
+    print(pd.DataFrame(rows)[columns].round(3).to_string(index=False))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'settings': settings, 'results': rows}, f, indent=2, default=float)
+        print(f"\n💾 Resultados gravados em {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print(f"⚠️  Configuração diferente da baseline: {baseline.get('settings')}")
+        regressions = compare_with_baseline(rows, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressões acima de {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"\n✅ Sem regressões acima de {args.tolerance:.0%} em relação a {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_save_forecasts.py
+"""
+Benchmark de save_forecasts_to_db: caminho antigo (iterrows + execute_batch)
+vs COPY para staging + upsert único.
+
+Grava numa cópia vazia de sales_salesforecast (bench_salesforecast, removida
+no fim), em duas passadas por tamanho: inserção (tabela vazia) e atualização
+(todas as chaves já existem, caminho do ON CONFLICT DO UPDATE).
+
+Uso (dentro de forecast/):
+    python -m benchmarks.bench_save_forecasts
+    python -m benchmarks.bench_save_forecasts --rows 100000 1000000 --methods copy
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from app.config import Config
+from app.forecasting_service import save_forecasts_to_db
+
+BENCH_TABLE = 'bench_salesforecast'
+FORECAST_PERIODS = 60
+
+
+def synthetic_forecasts(n_rows, seed=42):
+    """DataFrame no formato de process_item_forecast (60 dias por par loja/item)"""
+    rng = np.random.default_rng(seed)
+    n_pairs = int(np.ceil(n_rows / FORECAST_PERIODS))
+    pair = np.arange(n_rows) // FORECAST_PERIODS
+    horizon = np.arange(n_rows) % FORECAST_PERIODS
+    dates = np.array([date.today() + timedelta(days=int(d) + 1) for d in range(FORECAST_PERIODS)], dtype=object)
+
+    def predictions():
+        return rng.integers(0, 50, n_rows)
+
+    return pd.DataFrame({
+        'store_id': (pair % 20) + 1,
+        'item_id': pair // 20 + 1,
+        'forecast_date': dates[horizon],
+        'best_model': rng.choice(['Prophet', 'ARIMA', 'Holt-Winters', 'XGBoost'], n_pairs)[pair],
+        'best_prediction': predictions(),
+        'model_rmse': rng.gamma(2, 3, n_pairs)[pair],
+        'model_mape': rng.gamma(2, 20, n_pairs)[pair],
+        'model_mae': rng.gamma(2, 2, n_pairs)[pair],
+        'brand': 'MARCA', 'category': 'CATEGORIA',
+        'prophet_prediction': predictions(),
+        'arima_prediction': predictions(),
+        'holt_winters_prediction': [None] * n_rows,
+        'xgboost_prediction': predictions(),
+        'linear_regression_prediction': [None] * n_rows,
+        'random_forest_prediction': [None] * n_rows,
+    })
+
+
+def run_sql(pg_conn_str, statement):
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    cur.execute(statement)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de gravação de forecasts')
+    parser.add_argument('--dsn', default=Config.POSTGRES_CONNECTION_STRING, help='String de conexão PostgreSQL')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--methods', nargs='+', default=['batch', 'copy'], choices=['batch', 'copy'])
+    args = parser.parse_args()
+
+    run_sql(args.dsn, f"CREATE TABLE IF NOT EXISTS {BENCH_TABLE} (LIKE sales_salesforecast INCLUDING ALL)")
+
+    results = []
+    try:
+        for n_rows in args.rows:
+            df = synthetic_forecasts(n_rows)
+            for method in args.methods:
+                run_sql(args.dsn, f"TRUNCATE {BENCH_TABLE}")
+                timings = {}
+                for phase in ('insert', 'update'):
+                    start = time.perf_counter()
+                    save_forecasts_to_db(df.copy(), args.dsn, method=method, table=BENCH_TABLE)
+                    timings[phase] = time.perf_counter() - start
+                results.append({
+                    'rows': n_rows, 'method': method,
+                    'insert_s': round(timings['insert'], 2), 'update_s': round(timings['update'], 2),
+                    'rows_per_s': int(n_rows / timings['insert']),
+                })
+                print(f"📊 {n_rows:>9} linhas | {method:<5} | insert {timings['insert']:.2f}s | update {timings['update']:.2f}s")
+    finally:
+        run_sql(args.dsn, f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+
+    print()
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
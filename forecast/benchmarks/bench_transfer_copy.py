@@ -0,0 +1,136 @@
+# benchmarks/bench_transfer_copy.py
+"""
+Benchmark do COPY das transferências: CSV '|' (caminho antigo) vs FORMAT BINARY
+(app.utils.pg_binary_copy).
+
+Gera linhas sintéticas no formato das tabelas temporárias de itens e vendas
+(nomes com '|' e aspas incluídos, que quebravam o CSV) e mede, por formato:
+- encode_s: serialização em Python (copy_buffer)
+- copy_s: COPY para uma tabela temporária com o mesmo schema da transferência
+  (só com --dsn; a tabela é ON COMMIT DROP, nada fica no banco)
+
+Uso (dentro de forecast/):
+    python -m benchmarks.bench_transfer_copy --no-db
+    python -m benchmarks.bench_transfer_copy --rows 100000 1000000 --tables sales
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from app.config import Config
+from app.transfer import ITEM_COPY, SALE_COPY, copy_buffer, copy_into
+
+TEMP_TABLES = {
+    'items': """
+        CREATE TEMP TABLE bench_tmp_items (
+            code TEXT, name TEXT, pack_size NUMERIC, min_size INT, unit_of_measure TEXT,
+            purchase_price NUMERIC, cost_price NUMERIC,
+            nivel1 TEXT, nivel2 TEXT, nivel3 TEXT, nivel4 TEXT, nivel5 TEXT,
+            brand TEXT, sale_price NUMERIC, ean TEXT,
+            is_disabled_purchase BOOLEAN, is_disabled BOOLEAN,
+            matriz_price NUMERIC, supplier_code TEXT, created_at TIMESTAMP, row_hash TEXT
+        ) ON COMMIT DROP
+    """,
+    'sales': """
+        CREATE TEMP TABLE bench_tmp_sales (
+            ticket_number TEXT, store_id INTEGER, date DATE, time INTEGER,
+            item_id BIGINT, quantity NUMERIC, price NUMERIC, created_at TIMESTAMP, source_nro_reg BIGINT
+        ) ON COMMIT DROP
+    """,
+}
+WRITERS = {'items': ITEM_COPY, 'sales': SALE_COPY}
+
+
+def synthetic_items(n_rows, seed=42):
+    """Linhas no formato de item_values de transfer_bi_productos"""
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow()
+    prices = np.round(rng.gamma(2, 8000, n_rows), 2)
+    return [
+        (
+            str(100000 + i), f'PRODUTO {i} 1|2 "KG"', 1.0, int(rng.integers(1, 12)), 'UN',
+            float(prices[i]), float(prices[i]) * 0.9,
+            'ALIMENTOS', 'MERCEARIA', 'SECOS', None, None,
+            'MARCA', float(prices[i]) * 1.3, str(7800000000000 + i),
+            bool(i % 7 == 0), False,
+            float(prices[i]), str(int(rng.integers(1, 500))), now, f'{i:032x}',
+        )
+        for i in range(n_rows)
+    ]
+
+
+def synthetic_sales(n_rows, seed=42):
+    """Linhas no formato de sale_values de transfer_sales"""
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    start = date.today() - timedelta(days=30)
+    days = rng.integers(0, 30, n_rows)
+    quantities = np.round(rng.gamma(1.5, 2, n_rows), 3)
+    prices = np.round(rng.gamma(2, 8000, n_rows), 2)
+    return [
+        (
+            f'{1000000 + i // 5}', int(days[i] % 20) + 1, start + timedelta(days=int(days[i])),
+            int(rng.integers(800, 2200)), 100000 + i % 50000,
+            float(quantities[i]), float(prices[i]), now, 5_000_000 + i,
+        )
+        for i in range(n_rows)
+    ]
+
+
+GENERATORS = {'items': synthetic_items, 'sales': synthetic_sales}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do COPY CSV vs binário das transferências')
+    parser.add_argument('--dsn', default=Config.POSTGRES_CONNECTION_STRING, help='String de conexão PostgreSQL')
+    parser.add_argument('--no-db', action='store_true', help='Mede só a serialização, sem COPY')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--tables', nargs='+', default=['items', 'sales'], choices=list(TEMP_TABLES))
+    parser.add_argument('--formats', nargs='+', default=['csv', 'binary'], choices=['csv', 'binary'])
+    args = parser.parse_args()
+
+    conn = None if args.no_db else psycopg2.connect(args.dsn)
+    results = []
+    try:
+        for table in args.tables:
+            for n_rows in args.rows:
+                rows = GENERATORS[table](n_rows)
+                for fmt in args.formats:
+                    start = time.perf_counter()
+                    output = copy_buffer(WRITERS[table], rows, fmt=fmt)
+                    encode_s = time.perf_counter() - start
+                    payload_mb = len(output.getvalue()) / 1024 ** 2
+
+                    copy_s = None
+                    if conn is not None:
+                        with conn.cursor() as cur:
+                            cur.execute(TEMP_TABLES[table])
+                            start = time.perf_counter()
+                            copy_into(cur, f'bench_tmp_{table}', output)
+                            copy_s = time.perf_counter() - start
+                        conn.rollback()
+
+                    total_s = encode_s + (copy_s or 0)
+                    results.append({
+                        'table': table, 'rows': n_rows, 'format': fmt,
+                        'encode_s': round(encode_s, 2),
+                        'copy_s': round(copy_s, 2) if copy_s is not None else None,
+                        'payload_mb': round(payload_mb, 1),
+                        'rows_per_s': int(n_rows / total_s),
+                    })
+                    copy_label = f'{copy_s:.2f}s' if copy_s is not None else '-'
+                    print(f"📊 {table:<5} | {n_rows:>9} linhas | {fmt:<6} | encode {encode_s:.2f}s | COPY {copy_label}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+    print()
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+# benchmarks/synthetic_series.py
+"""
+Gerador de séries diárias sintéticas de supermercado no formato de
+load_active_series: perfis estável, sazonal (semana + ano) e intermitente,
+com picos nos feriados (mesma semântica de sales_calendar: só os feriados têm
+linha, is_holiday/holiday_name por data).
+
+Os últimos `horizon` dias são gerados mas ficam fora do histórico: são a
+verdade contra a qual a acurácia das previsões é medida. Mesma semente =
+mesmas séries.
+
+Também grava o conjunto num banco Postgres DEDICADO ao benchmark (tabelas
+mínimas lidas pelo pipeline), para rodar main_forecast_pipeline offline.
+"""
+import io
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+# Feriados fixos do Paraguai (mês, dia) -> nome, como em load_paraguay_holidays
+HOLIDAYS = {
+    (1, 1): 'Año Nuevo', (3, 1): 'Día de los Héroes', (5, 1): 'Día del Trabajador',
+    (5, 14): 'Independencia Nacional', (5, 15): 'Independencia Nacional', (6, 12): 'Paz del Chaco',
+    (8, 15): 'Fundación de Asunción', (9, 29): 'Victoria de Boquerón', (12, 8): 'Virgen de Caacupé',
+    (12, 25): 'Navidad',
+}
+
+# Proporção de cada perfil entre os itens
+PROFILE_MIX = {'stable': 0.4, 'seasonal': 0.35, 'intermittent': 0.25}
+
+# Peso de cada dia da semana (segunda..domingo) nas vendas de supermercado
+WEEKDAY_PATTERN = np.array([0.85, 0.85, 0.9, 0.95, 1.1, 1.35, 1.0])
+
+# Multiplicador das vendas no feriado (sorteado por data) e na véspera
+HOLIDAY_UPLIFT = (1.5, 2.5)
+EVE_UPLIFT = 1.3
+
+# Itens gerados por bloco (limita a memória das matrizes de taxa)
+CHUNK_ITEMS = 250
+
+N_CATEGORIES = 40
+N_BRANDS = 200
+
+# Tabelas mínimas do banco de benchmark (só as colunas lidas/gravadas pelo pipeline)
+BENCHMARK_MARKER_TABLE = 'forecast_benchmark_marker'
+BENCHMARK_DDL = f"""
+CREATE TABLE IF NOT EXISTS {BENCHMARK_MARKER_TABLE} (created_at TIMESTAMP DEFAULT NOW());
+CREATE TABLE IF NOT EXISTS items_item (
+    code VARCHAR(14) PRIMARY KEY, nivel3 VARCHAR(35), brand VARCHAR(35),
+    is_disabled_purchase BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE TABLE IF NOT EXISTS sales_calendar (
+    date DATE PRIMARY KEY, is_holiday BOOLEAN NOT NULL DEFAULT FALSE, holiday_name VARCHAR(100)
+);
+CREATE TABLE IF NOT EXISTS sales_sale (
+    id BIGSERIAL PRIMARY KEY, ticket_number VARCHAR(30), store_id INTEGER NOT NULL, date DATE NOT NULL,
+    time INTEGER, item_id BIGINT NOT NULL, quantity NUMERIC(14, 2), price NUMERIC(14, 2), created_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS sales_salesforecast (
+    id BIGSERIAL PRIMARY KEY, item_id INTEGER NOT NULL, store_id INTEGER, forecast_date DATE NOT NULL,
+    category VARCHAR(100), brand VARCHAR(100),
+    prophet_prediction DOUBLE PRECISION, arima_prediction DOUBLE PRECISION,
+    holt_winters_prediction DOUBLE PRECISION, xgboost_prediction DOUBLE PRECISION,
+    linear_regression_prediction DOUBLE PRECISION, random_forest_prediction DOUBLE PRECISION,
+    croston_prediction DOUBLE PRECISION, sba_prediction DOUBLE PRECISION, tsb_prediction DOUBLE PRECISION,
+    best_model VARCHAR(50) NOT NULL, best_prediction DOUBLE PRECISION NOT NULL,
+    model_mae DOUBLE PRECISION NOT NULL, model_rmse DOUBLE PRECISION, model_mape DOUBLE PRECISION,
+    confidence_score DOUBLE PRECISION, actual_sales DOUBLE PRECISION, forecast_error DOUBLE PRECISION,
+    model_version VARCHAR(20) NOT NULL, is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (store_id, item_id, forecast_date)
+);
+"""
+
+# Estado persistente do pipeline entre execuções (zerado entre cenários do benchmark)
+FORECAST_STATE_TABLES = [
+    'forecast_series_ledger', 'forecast_run_state', 'forecast_arima_order_cache', 'forecast_series_cost',
+    'forecast_model_win_rates', 'forecast_product_classification', 'forecast_run_metrics',
+]
+
+
+class SyntheticDataset:
+    """Séries geradas, perfil e vendas futuras (verdade) de cada série"""
+
+    def __init__(self, series, profiles, future, calendar, end_date, horizon):
+        self.series = series          # {(item_id, store_id): arrays} no formato de load_active_series
+        self.profiles = profiles      # {(item_id, store_id): 'stable' | 'seasonal' | 'intermittent'}
+        self.future = future          # {(item_id, store_id): array (horizon,)} vendas após end_date
+        self.calendar = calendar      # DataFrame date, is_holiday, holiday_name (só feriados)
+        self.end_date = end_date      # último dia do histórico
+        self.horizon = horizon
+
+    def __len__(self):
+        return len(self.series)
+
+
+def synthetic_calendar(start, end):
+    """Feriados entre start e end no formato de sales_calendar"""
+    days = pd.date_range(start=start, end=end, freq='D')
+    names = [HOLIDAYS.get((day.month, day.day)) for day in days]
+    calendar = pd.DataFrame({'date': days, 'holiday_name': names})
+    calendar = calendar[calendar['holiday_name'].notna()].reset_index(drop=True)
+    calendar.insert(1, 'is_holiday', True)
+    return calendar
+
+
+def _holiday_multiplier(days, rng):
+    """Multiplicador diário comum a todas as séries: pico no feriado e na véspera"""
+    holiday = np.array([(day.month, day.day) in HOLIDAYS for day in days])
+    multiplier = np.ones(len(days))
+    multiplier[:-1][holiday[1:]] = EVE_UPLIFT
+    multiplier[holiday] = rng.uniform(*HOLIDAY_UPLIFT, holiday.sum())
+    names = np.array([HOLIDAYS.get((day.month, day.day)) for day in days], dtype=object)
+    return multiplier, holiday, names
+
+
+def _chunk_quantities(rng, profiles, n_stores, days, holiday_multiplier):
+    """Vendas diárias (n_itens x n_lojas, dias) de um bloco de itens"""
+    n_items = len(profiles)
+    n_days = len(days)
+    t = np.arange(n_days)
+    dow = days.dayofweek.to_numpy()
+    doy = days.dayofyear.to_numpy()
+    series_profiles = np.repeat(profiles, n_stores)
+    n_series = len(series_profiles)
+
+    # Nível do item e fator da loja
+    level = np.where(profiles == 'seasonal', rng.lognormal(2.0, 0.7, n_items), rng.lognormal(1.5, 0.7, n_items))
+    level = np.repeat(level, n_stores) * rng.lognormal(0.0, 0.3, n_series)
+
+    weekly_amplitude = np.where(series_profiles == 'seasonal', 1.0, 0.3)
+    weekly = 1 + weekly_amplitude[:, None] * (WEEKDAY_PATTERN[dow] - 1)[None, :]
+
+    yearly_amplitude = np.where(series_profiles == 'seasonal', rng.uniform(0.2, 0.5, n_series), 0.0)
+    phase = rng.uniform(0, 365.25, n_series)
+    yearly = 1 + yearly_amplitude[:, None] * np.sin(2 * np.pi * (doy[None, :] - phase[:, None]) / 365.25)
+
+    trend = 1 + rng.normal(0, 0.05, n_series)[:, None] * t[None, :] / 365.25
+    rate = level[:, None] * weekly * yearly * np.maximum(trend, 0.1) * holiday_multiplier[None, :]
+    quantity = rng.poisson(rate).astype(np.float64)
+
+    # Intermitente: ocorrência de demanda (probabilidade diária) x tamanho geométrico
+    intermittent = np.flatnonzero(series_profiles == 'intermittent')
+    if len(intermittent):
+        probability = rng.uniform(0.15, 0.6, len(intermittent))[:, None] * weekly[intermittent] * holiday_multiplier
+        occurs = rng.random((len(intermittent), n_days)) < np.minimum(probability, 1.0)
+        mean_size = rng.uniform(1.0, 4.0, len(intermittent))[:, None]
+        sizes = rng.geometric(1.0 / mean_size, (len(intermittent), n_days))
+        quantity[intermittent] = occurs * sizes
+
+    return quantity, series_profiles
+
+
+def generate_series(n_series, days=730, horizon=60, n_stores=10, mix=None, seed=42, end_date=None):
+    """
+    Gera n_series séries (item, loja) com `days` dias de histórico terminando em
+    end_date (padrão: ontem) e `horizon` dias de vendas futuras como verdade.
+
+    Args:
+        n_series: total de séries (itens x lojas)
+        mix: dict {perfil: proporção} (padrão PROFILE_MIX)
+        seed: semente do gerador (mesma semente = mesmas séries)
+
+    Returns:
+        SyntheticDataset
+    """
+    mix = mix or PROFILE_MIX
+    rng = np.random.default_rng(seed)
+    end_date = end_date or date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=days - 1)
+    all_days = pd.date_range(start=start_date, periods=days + horizon, freq='D')
+    history_days = all_days[:days].to_numpy()
+    multiplier, holiday, names = _holiday_multiplier(all_days, rng)
+
+    n_items = -(-n_series // n_stores)
+    item_profiles = rng.choice(list(mix), n_items, p=np.array(list(mix.values())) / sum(mix.values()))
+    base_prices = np.round(rng.lognormal(np.log(12000), 0.9, n_items), -2)
+    categories = rng.integers(1, N_CATEGORIES + 1, n_items)
+    brands = rng.integers(1, N_BRANDS + 1, n_items)
+
+    series, profiles, future = {}, {}, {}
+    for first in range(0, n_items, CHUNK_ITEMS):
+        chunk = np.arange(first, min(first + CHUNK_ITEMS, n_items))
+        quantity, series_profiles = _chunk_quantities(rng, item_profiles[chunk], n_stores, all_days, multiplier)
+        price_noise = 1 + 0.03 * rng.standard_normal(quantity.shape)
+
+        for row in range(quantity.shape[0]):
+            item = chunk[row // n_stores]
+            key = (int(item) + 1, row % n_stores + 1)
+            if item * n_stores + row % n_stores >= n_series:
+                break
+            sold = np.flatnonzero(quantity[row, :days] > 0)
+            if len(sold) == 0:
+                continue
+            series[key] = {
+                'date': history_days[sold],
+                'quantity': quantity[row, sold],
+                'unit_price': np.round(base_prices[item] * price_noise[row, sold]),
+                'is_holiday': holiday[sold],
+                'holiday_name': names[sold],
+                'category': f"CATEGORIA {categories[item]:02d}",
+                'brand': f"MARCA {brands[item]:03d}",
+            }
+            profiles[key] = str(series_profiles[row])
+            future[key] = quantity[row, days:]
+
+    calendar = synthetic_calendar(all_days[0], all_days[-1])
+    return SyntheticDataset(series, profiles, future, calendar, end_date, horizon)
+
+
+def prepare_benchmark_database(pg_conn_str):
+    """
+    Cria as tabelas mínimas no banco de benchmark e zera vendas, itens,
+    calendário, previsões e estado do pipeline.
+
+    Recusa bancos que já têm sales_sale sem a tabela marcadora do benchmark
+    (proteção contra apontar --dsn para o banco de produção).
+    """
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('public.sales_sale'), to_regclass(%s)", (f"public.{BENCHMARK_MARKER_TABLE}",))
+        has_sales, has_marker = cur.fetchone()
+        if has_sales and not has_marker:
+            raise RuntimeError(
+                "O banco já tem sales_sale e não foi criado pelo benchmark - use um banco dedicado "
+                "(ex: createdb forecast_bench)"
+            )
+        cur.execute(BENCHMARK_DDL)
+        cur.execute(f"INSERT INTO {BENCHMARK_MARKER_TABLE} DEFAULT VALUES")
+        cur.execute("TRUNCATE sales_sale, items_item, sales_calendar, sales_salesforecast")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    reset_forecast_state(pg_conn_str)
+
+
+def reset_forecast_state(pg_conn_str):
+    """Remove previsões e estado entre execuções (ledger, checkpoints, caches, custos, métricas)"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    cur.execute("TRUNCATE sales_salesforecast")
+    cur.execute(f"DROP TABLE IF EXISTS {', '.join(FORECAST_STATE_TABLES)}")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def _copy(cur, table, columns, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, sep='|', header=False, index=False)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT CSV, DELIMITER '|')", buffer)
+
+
+def load_into_postgres(pg_conn_str, dataset, chunk_series=2000):
+    """Grava itens, feriados e vendas do conjunto (uma venda por série e dia com venda)"""
+    conn = psycopg2.connect(pg_conn_str)
+    cur = conn.cursor()
+    try:
+        items = {}
+        for (item_id, _), series in dataset.series.items():
+            items.setdefault(item_id, (series['category'], series['brand']))
+        _copy(cur, 'items_item', ['code', 'nivel3', 'brand', 'is_disabled_purchase'], pd.DataFrame(
+            [(str(item_id), category, brand, False) for item_id, (category, brand) in items.items()]
+        ))
+        calendar = dataset.calendar.assign(date=dataset.calendar['date'].dt.date)
+        _copy(cur, 'sales_calendar', ['date', 'is_holiday', 'holiday_name'], calendar)
+
+        keys = list(dataset.series)
+        created_at = datetime.now()
+        for start in range(0, len(keys), chunk_series):
+            block = [(key, dataset.series[key]) for key in keys[start:start + chunk_series]]
+            lengths = [len(series['date']) for _, series in block]
+            sales = pd.DataFrame({
+                'ticket_number': 'BENCH',
+                'store_id': np.repeat([key[1] for key, _ in block], lengths),
+                'date': pd.to_datetime(np.concatenate([series['date'] for _, series in block])).date,
+                'time': 0,
+                'item_id': np.repeat([key[0] for key, _ in block], lengths),
+                'quantity': np.concatenate([series['quantity'] for _, series in block]),
+                'price': np.concatenate([series['unit_price'] for _, series in block]),
+                'created_at': created_at,
+            })
+            _copy(cur, 'sales_sale', list(sales.columns), sales)
+        conn.commit()
+        cur.execute("ANALYZE sales_sale")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
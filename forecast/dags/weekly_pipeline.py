@@ -18,7 +18,7 @@ from app.transfer import (
     transfer_stock,
     transfer_sales
 )
-from app.forecasting_service import main_forecast_pipeline, save_forecasts_to_db
+from app.forecasting_service import main_forecast_pipeline
 from app.utils.performance_tracker import (
     compare_forecast_vs_actual,
     detect_model_drift,
@@ -107,17 +107,19 @@ def task_generate_forecast(**context):
         mlflow.log_param("execution_date", context['ds'])
         mlflow.log_param("dag_run_id", context['run_id'])
         
-        forecast_df, _ = main_forecast_pipeline(
+        # Forecasts são gravados no banco pelo writer do pipeline conforme os batches terminam.
+        # run_id fixo por DAG run: um retry retoma do checkpoint em vez de recomeçar.
+        _, summary_df = main_forecast_pipeline(
             Config.POSTGRES_CONNECTION_STRING,
-            forecast_periods=60
+            forecast_periods=60,
+            source='airflow',
+            keep_results=False,
+            run_id=f"airflow_{context['run_id']}"
         )
         
-        total_forecasts = len(forecast_df)
+        total_forecasts = int(summary_df['forecast_rows'].sum()) if not summary_df.empty else 0
         logger.info(f"✅ Forecast gerado: {total_forecasts} previsões")
         
-        # Salvar no banco
-        save_forecasts_to_db(forecast_df, Config.POSTGRES_CONNECTION_STRING)
-        
         context['ti'].xcom_push(key='total_forecasts', value=total_forecasts)
         
         return total_forecasts
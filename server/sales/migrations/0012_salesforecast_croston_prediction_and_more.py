@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:12
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_alter_salesforecast_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesforecast',
+            name='croston_prediction',
+            field=models.FloatField(blank=True, help_text='Previsão gerada pelo modelo Croston (demanda intermitente)', null=True, validators=[django.core.validators.MinValueValidator(0.0)], verbose_name='Previsão Croston'),
+        ),
+        migrations.AddField(
+            model_name='salesforecast',
+            name='sba_prediction',
+            field=models.FloatField(blank=True, help_text='Previsão gerada pelo modelo Syntetos-Boylan (Croston com correção de viés)', null=True, validators=[django.core.validators.MinValueValidator(0.0)], verbose_name='Previsão SBA'),
+        ),
+        migrations.AddField(
+            model_name='salesforecast',
+            name='tsb_prediction',
+            field=models.FloatField(blank=True, help_text='Previsão gerada pelo modelo Teunter-Syntetos-Babai (demanda intermitente)', null=True, validators=[django.core.validators.MinValueValidator(0.0)], verbose_name='Previsão TSB'),
+        ),
+        migrations.AlterField(
+            model_name='salesforecast',
+            name='best_model',
+            field=models.CharField(choices=[('arima', 'ARIMA'), ('holt_winters', 'Holt-Winters'), ('linear_regression', 'Linear Regression'), ('prophet', 'Prophet'), ('random_forest', 'Random Forest'), ('xgboost', 'XGBoost'), ('croston', 'Croston'), ('sba', 'SBA'), ('tsb', 'TSB'), ('moving_average', 'Moving Average'), ('zero', 'Zero')], help_text='Modelo que apresentou melhor performance (menor MAE)', max_length=50, verbose_name='Melhor Modelo'),
+        ),
+    ]
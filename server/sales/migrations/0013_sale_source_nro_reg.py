@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_salesforecast_croston_prediction_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='source_nro_reg',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+    ]
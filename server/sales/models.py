@@ -14,6 +14,8 @@ class Sale(models.Model):
     quantity = models.DecimalField(max_digits=14, decimal_places=2)
     price = models.DecimalField(max_digits=14, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    # nro_reg de bi_compra_venta: chave da carga idempotente (transfer_sales)
+    source_nro_reg = models.BigIntegerField(null=True, unique=True)
 
 class Calendar(models.Model):
     date = models.DateField(primary_key=True)
@@ -127,6 +129,31 @@ class SalesForecast(models.Model):
         help_text="Previsão gerada pelo modelo XGBoost"
     )
     
+    # === MODELOS DE DEMANDA INTERMITENTE ===
+    croston_prediction = models.FloatField(
+        null=True, 
+        blank=True,
+        validators=[MinValueValidator(0.0)],
+        verbose_name="Previsão Croston",
+        help_text="Previsão gerada pelo modelo Croston (demanda intermitente)"
+    )
+    
+    sba_prediction = models.FloatField(
+        null=True, 
+        blank=True,
+        validators=[MinValueValidator(0.0)],
+        verbose_name="Previsão SBA",
+        help_text="Previsão gerada pelo modelo Syntetos-Boylan (Croston com correção de viés)"
+    )
+    
+    tsb_prediction = models.FloatField(
+        null=True, 
+        blank=True,
+        validators=[MinValueValidator(0.0)],
+        verbose_name="Previsão TSB",
+        help_text="Previsão gerada pelo modelo Teunter-Syntetos-Babai (demanda intermitente)"
+    )
+    
     # === MELHOR MODELO E PREVISÃO FINAL ===
     best_model = models.CharField(
         max_length=50,
@@ -137,6 +164,11 @@ class SalesForecast(models.Model):
             ('prophet', 'Prophet'),
             ('random_forest', 'Random Forest'),
             ('xgboost', 'XGBoost'),
+            ('croston', 'Croston'),
+            ('sba', 'SBA'),
+            ('tsb', 'TSB'),
+            ('moving_average', 'Moving Average'),
+            ('zero', 'Zero'),
         ],
         verbose_name="Melhor Modelo",
         help_text="Modelo que apresentou melhor performance (menor MAE)"
@@ -293,6 +325,9 @@ class SalesForecast(models.Model):
             'prophet': self.prophet_prediction,
             'random_forest': self.random_forest_prediction,
             'xgboost': self.xgboost_prediction,
+            'croston': self.croston_prediction,
+            'sba': self.sba_prediction,
+            'tsb': self.tsb_prediction,
         }
     
     @property
@@ -396,6 +431,9 @@ class SalesForecast(models.Model):
                     prophet_prediction=row['prophet_prediction'] if pd.notna(row['prophet_prediction']) else None,
                     random_forest_prediction=row['random_forest_prediction'] if pd.notna(row['random_forest_prediction']) else None,
                     xgboost_prediction=row['xgboost_prediction'] if pd.notna(row['xgboost_prediction']) else None,
+                    croston_prediction=row['croston_prediction'] if pd.notna(row.get('croston_prediction')) else None,
+                    sba_prediction=row['sba_prediction'] if pd.notna(row.get('sba_prediction')) else None,
+                    tsb_prediction=row['tsb_prediction'] if pd.notna(row.get('tsb_prediction')) else None,
                     
                     model_version=model_version
                 )
@@ -98,7 +98,8 @@ class SalesForecastSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'store_id', 'item_id', 'forecast_date', 'forecast_date_formatted',
             'prophet_prediction', 'arima_prediction', 'holt_winters_prediction', 
-            'xgboost_prediction', 'best_model', 'best_prediction', 'confidence_score',
+            'xgboost_prediction', 'croston_prediction', 'sba_prediction', 'tsb_prediction',
+            'best_model', 'best_prediction', 'confidence_score',
             'model_rmse', 'model_mape', 'created_at', 'updated_at', 'model_version',
             'is_active', 'actual_sales', 'forecast_error', 'accuracy_percentage',
             'forecast_age_days'